@@ -8,6 +8,7 @@ from datetime import datetime
 router = APIRouter()
 
 from config import MYSQL_CONFIG, get_db_connection, get_admin_system_settings_cached, invalidate_admin_system_settings_cache
+from db_schema import schema_once
 from auth import create_access_token
 def _password_strong_enough(pw: str) -> bool:
     try:
@@ -25,6 +26,7 @@ from auth import require_role
 from notifications_helper import ensure_notifications_table, create_notification, migrate_notifications_schema
 from typing import Dict, Any
 
+@schema_once
 def ensure_admins_table(cursor):
         """Create minimal admins table if missing to avoid 1146 errors during login.
         This keeps schema consistent without requiring full migrations here.
@@ -42,6 +44,7 @@ def ensure_admins_table(cursor):
                 '''
         )
 
+@schema_once
 def ensure_lobby_tables(cursor):
         """Create minimal lobby tables if missing to avoid 1146 errors.
         Mirrors the schema used by lobby_ws for cross-device persistence.
@@ -76,9 +79,10 @@ def ensure_lobby_tables(cursor):
                         """
                 )
         except Exception:
-                # Best-effort: leave to other code paths if creation fails here
-                pass
+                # Best-effort: leave to other code paths if creation fails here (retried next call)
+                return False
 
+@schema_once
 def ensure_simulation_rooms_tables(cursor):
     """Ensure simulation_rooms and simulation_room_members exist for admin visibility/actions."""
     try:
@@ -96,15 +100,9 @@ def ensure_simulation_rooms_tables(cursor):
             '''
         )
         # idempotent ensure of last_run_code
-        try:
-            cursor.execute("SHOW COLUMNS FROM simulation_rooms LIKE 'last_run_code'")
-            if cursor.fetchone() is None:
-                try:
-                    cursor.execute("ALTER TABLE simulation_rooms ADD COLUMN last_run_code VARCHAR(64) DEFAULT NULL")
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        cursor.execute("SHOW COLUMNS FROM simulation_rooms LIKE 'last_run_code'")
+        if cursor.fetchone() is None:
+            cursor.execute("ALTER TABLE simulation_rooms ADD COLUMN last_run_code VARCHAR(64) DEFAULT NULL")
         cursor.execute(
             '''
             CREATE TABLE IF NOT EXISTS simulation_room_members (
@@ -119,7 +117,7 @@ def ensure_simulation_rooms_tables(cursor):
             '''
         )
     except Exception:
-        pass
+        return False
 
 class AdminLoginRequest(BaseModel):
     email: str
@@ -160,6 +158,7 @@ class AdminUserUpdateRequest(BaseModel):
 class AdminResetPasswordRequest(BaseModel):
     new_password: str
 
+@schema_once
 def ensure_users_table(cursor):
     """Ensure users table exists and password_hash allows long hashes (TEXT)."""
     cursor.execute(
@@ -184,7 +183,7 @@ def ensure_users_table(cursor):
             if 'varchar' in col_type:
                 cursor.execute('ALTER TABLE users MODIFY COLUMN password_hash TEXT NOT NULL')
     except Exception:
-        pass
+        return False
 
 # -------- Module Request Models (admin side) ---------
 class ModuleRequestAdminView(BaseModel):
@@ -430,34 +429,49 @@ def update_admin_profile(request: Request, req: AdminProfileUpdateRequest):
         print(f"[DEBUG] Error updating admin profile: {e}")
         raise HTTPException(status_code=400, detail='Failed to update profile.')
 
+@schema_once
+def ensure_admin_system_settings_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS admin_system_settings (
+            id INT NOT NULL PRIMARY KEY,
+            enableUserRegistration TINYINT(1) DEFAULT 1,
+            autoApproveInstructors TINYINT(1) DEFAULT 0,
+            sessionTimeoutMinutes INT DEFAULT 60,
+            requireStrongPasswords TINYINT(1) DEFAULT 1
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    # Idempotent adds for columns
+    for col_def in [
+        ("sessionTimeoutMinutes", "INT DEFAULT 60"),
+        ("requireStrongPasswords", "TINYINT(1) DEFAULT 1"),
+    ]:
+        try:
+            cursor.execute(f"ALTER TABLE admin_system_settings ADD COLUMN {col_def[0]} {col_def[1]}")
+        except Exception:
+            pass
+
+@schema_once
+def ensure_admin_audit_logs_table(cursor):
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS admin_audit_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            admin_id INT NOT NULL,
+            action VARCHAR(512) NOT NULL,
+            timestamp DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+
 @router.get("/admin/system-settings")
 def get_system_settings():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     # Ensure table and columns exist
     try:
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS admin_system_settings (
-                id INT NOT NULL PRIMARY KEY,
-                enableUserRegistration TINYINT(1) DEFAULT 1,
-                autoApproveInstructors TINYINT(1) DEFAULT 0,
-                
-                sessionTimeoutMinutes INT DEFAULT 60,
-                requireStrongPasswords TINYINT(1) DEFAULT 1,
-                
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-        )
-        # Attempt to add new columns if missing (idempotent)
-        for col_def in [
-            ("sessionTimeoutMinutes", "INT DEFAULT 60"),
-            ("requireStrongPasswords", "TINYINT(1) DEFAULT 1"),
-        ]:
-            try:
-                cursor.execute(f"ALTER TABLE admin_system_settings ADD COLUMN {col_def[0]} {col_def[1]}")
-            except Exception:
-                pass
+        ensure_admin_system_settings_table(cursor)
     except Exception:
         pass
     cursor.execute("SELECT * FROM admin_system_settings LIMIT 1")
@@ -495,26 +509,7 @@ def update_system_settings(settings: AdminSystemSettings):
         conn = get_db_connection()
         cursor = conn.cursor()
         # Ensure table exists with required columns
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS admin_system_settings (
-                id INT NOT NULL PRIMARY KEY,
-                enableUserRegistration TINYINT(1) DEFAULT 1,
-                autoApproveInstructors TINYINT(1) DEFAULT 0,
-                sessionTimeoutMinutes INT DEFAULT 60,
-                requireStrongPasswords TINYINT(1) DEFAULT 1
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-        )
-        # Idempotent adds for columns
-        for col_def in [
-            ("sessionTimeoutMinutes", "INT DEFAULT 60"),
-            ("requireStrongPasswords", "TINYINT(1) DEFAULT 1"),
-        ]:
-            try:
-                cursor.execute(f"ALTER TABLE admin_system_settings ADD COLUMN {col_def[0]} {col_def[1]}")
-            except Exception:
-                pass
+        ensure_admin_system_settings_table(cursor)
         cursor.execute(
             "REPLACE INTO admin_system_settings (id, enableUserRegistration, autoApproveInstructors, sessionTimeoutMinutes, requireStrongPasswords) VALUES (1, %s, %s, %s, %s)",
             (
@@ -614,16 +609,7 @@ def get_audit_logs(admin_id: int):
         cursor = conn.cursor(dictionary=True)
         # Ensure audit table exists to avoid insert/select failures on fresh DBs
         try:
-            cursor.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS admin_audit_logs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    admin_id INT NOT NULL,
-                    action VARCHAR(512) NOT NULL,
-                    timestamp DATETIME NOT NULL
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                '''
-            )
+            ensure_admin_audit_logs_table(cursor)
         except Exception:
             pass
         cursor.execute("SELECT id, admin_id, action, timestamp FROM admin_audit_logs WHERE admin_id=%s ORDER BY timestamp DESC LIMIT 50", (admin_id,))
@@ -665,16 +651,7 @@ def log_admin_action(admin_id: int, action: str):
         conn = get_db_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS admin_audit_logs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    admin_id INT NOT NULL,
-                    action VARCHAR(512) NOT NULL,
-                    timestamp DATETIME NOT NULL
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                '''
-            )
+            ensure_admin_audit_logs_table(cursor)
         except Exception:
             pass
         # Use MySQL DATETIME-friendly format (no T, no timezone)
@@ -1036,6 +1013,7 @@ def admin_mark_all_notifications_read(request: Request, admin_id: Optional[int]
 
 # ---------------- Module Requests (Admin) -----------------
 
+@schema_once
 def _ensure_module_requests_table(cursor):
     """Replicate instructor-side ensure (kept separate to avoid cross-module import)."""
     cursor.execute(
@@ -1058,30 +1036,36 @@ def _ensure_module_requests_table(cursor):
             cursor.execute("ALTER TABLE module_requests ADD COLUMN content_json LONGTEXT NULL")
     except Exception as me:
         print(f"[WARN] Could not ensure content_json column (admin ensure): {me}")
+        return False
 
+@schema_once
 def _ensure_admin_columns(cursor):
     """Ensure admin_comment and decided_at columns exist (compatible with MySQL < 8)."""
     def column_exists(col: str) -> bool:
         cursor.execute("SHOW COLUMNS FROM module_requests LIKE %s", (col,))
         return cursor.fetchone() is not None
     mutated = False
+    ok = True
     try:
         if not column_exists('admin_comment'):
             cursor.execute("ALTER TABLE module_requests ADD COLUMN admin_comment TEXT NULL")
             mutated = True
     except Exception as e:
         print(f"[WARN] Failed adding admin_comment column: {e}")
+        ok = False
     try:
         if not column_exists('decided_at'):
             cursor.execute("ALTER TABLE module_requests ADD COLUMN decided_at DATETIME NULL")
             mutated = True
     except Exception as e:
         print(f"[WARN] Failed adding decided_at column: {e}")
+        ok = False
     if mutated:
         try:
             cursor.connection.commit()
         except Exception:
             pass
+    return ok
 
 @router.get('/admin/module-requests', response_model=List[ModuleRequestAdminView])
 def list_module_requests(request: Request, status: Optional[str] = None):
@@ -0,0 +1,116 @@
+"""Micro-batching for concurrent anomaly scoring requests.
+
+Each request scored on its own pays for a full ``decision_function`` call
+(input validation plus a walk over every tree) for a single row. The
+``ScoreBatcher`` parks concurrent requests for at most ``max_latency_ms`` or
+until ``max_batch_size`` commands are waiting, scores them together with one
+vectorized call on a worker thread, and resolves every waiting request with
+its own result.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds of the batch-size histogram buckets reported by stats()
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class ScoreBatcher:
+    """Coalesce awaiting ``score(command)`` calls into ``score_many(commands)`` batches.
+
+    ``score_many`` must return one result per command, in order. Batches run on
+    a single worker thread, so while one batch is being scored the next one
+    keeps filling up instead of competing for the model.
+    """
+
+    def __init__(
+        self,
+        score_many: Callable[[Sequence[str]], List[Any]],
+        max_batch_size: int = 64,
+        max_latency_ms: float = 5.0,
+    ):
+        self.score_many = score_many
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anomaly-batch")
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches = 0
+        self._items = 0
+        self._failed_batches = 0
+        self._max_seen = 0
+        self._size_buckets = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._score_total = 0.0
+
+    async def score(self, command: str) -> Any:
+        """Queue ``command`` for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((command, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            loop.create_task(self._run(loop, batch))
+
+    async def _run(self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        commands = [command for command, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._executor, self.score_many, commands)
+            if len(results) != len(batch):
+                raise RuntimeError(f"score_many returned {len(results)} results for {len(batch)} commands")
+        except Exception as e:
+            self._failed_batches += 1
+            logging.error(f"[anomaly.batch] scoring batch of {len(batch)} failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        self._record(batch, started, finished)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():  # the awaiting request may have been cancelled
+                future.set_result(result)
+
+    def _record(self, batch, started: float, finished: float) -> None:
+        size = len(batch)
+        self._batches += 1
+        self._items += size
+        self._max_seen = max(self._max_seen, size)
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))
+        self._size_buckets[bucket] += 1
+        self._wait_total += sum(started - queued for _, _, queued in batch)
+        self._score_total += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "failed_batches": self._failed_batches,
+            "pending": len(self._pending),
+            "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0.0,
+            "max_batch_seen": self._max_seen,
+            "batch_size_histogram": dict(zip(labels, self._size_buckets)),
+            "avg_queue_wait_ms": round(self._wait_total / self._items * 1000.0, 3) if self._items else 0.0,
+            "avg_batch_score_ms": round(self._score_total / self._batches * 1000.0, 3) if self._batches else 0.0,
+        }
+
+
+__all__ = ["ScoreBatcher", "BATCH_SIZE_BUCKETS"]
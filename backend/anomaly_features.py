@@ -7,7 +7,15 @@ increment model version hash.
 from __future__ import annotations
 import math
 import re
-from typing import Dict, List, Tuple
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover
+    ahocorasick = None
 
 SUSPICIOUS_KEYWORDS = [
     "nc", "netcat", "ncat", "wget", "curl", "base64", "ssh", "scp",
@@ -16,6 +24,74 @@ SUSPICIOUS_KEYWORDS = [
 
 SPECIAL_CHARS = set("|&;><")
 
+FEATURE_NAMES = [
+    "command_length",
+    "arg_count",
+    "special_chars_count",
+    "path_separators_count",
+    "digit_ratio",
+    "entropy",
+    "uppercase_ratio",
+    "suspicious_keyword_flag",
+]
+
+# Optional per-keyword count columns ("kw_<keyword>") appended after FEATURE_NAMES
+KEYWORD_FEATURE_PREFIX = "kw_"
+KEYWORD_FEATURE_NAMES = [
+    KEYWORD_FEATURE_PREFIX + re.sub(r"[^0-9a-zA-Z]+", "_", k).strip("_") for k in SUSPICIOUS_KEYWORDS
+]
+
+# Character class bits used by the single-pass extractor
+_SPECIAL, _SLASH, _DIGIT, _UPPER = 1, 2, 4, 8
+
+# Byte-level lookup masks for the vectorized path (ASCII only; str.split() whitespace)
+_SPECIAL_CODES = np.array(sorted(ord(c) for c in SPECIAL_CHARS))
+_WHITESPACE_BYTES = np.array([chr(i).isspace() for i in range(256)])
+# Rows per histogram block: bounds the (rows x 256) count matrix to a few MB
+_MATRIX_CHUNK = 1024
+
+
+def build_keyword_automaton(keywords: Sequence[str]):
+    """Aho–Corasick automaton whose values are keyword indexes; None without pyahocorasick."""
+    if ahocorasick is None or not keywords:
+        return None
+    automaton = ahocorasick.Automaton()
+    for idx, keyword in enumerate(keywords):
+        automaton.add_word(keyword, idx)
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = build_keyword_automaton(SUSPICIOUS_KEYWORDS)
+
+
+def has_suspicious_keyword(cmd: str) -> bool:
+    """True if any SUSPICIOUS_KEYWORDS occurs in ``cmd``; one pass regardless of keyword count."""
+    if _KEYWORD_AUTOMATON is None:
+        return any(k in cmd for k in SUSPICIOUS_KEYWORDS)
+    for _ in _KEYWORD_AUTOMATON.iter(cmd):
+        return True
+    return False
+
+
+def keyword_counts(cmd: str) -> List[int]:
+    """Occurrences of each SUSPICIOUS_KEYWORDS entry in ``cmd`` (overlaps counted), in list order."""
+    counts = [0] * len(SUSPICIOUS_KEYWORDS)
+    if _KEYWORD_AUTOMATON is None:
+        for idx, keyword in enumerate(SUSPICIOUS_KEYWORDS):
+            start = cmd.find(keyword)
+            while start != -1:
+                counts[idx] += 1
+                start = cmd.find(keyword, start + 1)
+        return counts
+    for _, idx in _KEYWORD_AUTOMATON.iter(cmd):
+        counts[idx] += 1
+    return counts
+
+
+def feature_names(include_keyword_counts: bool = False) -> List[str]:
+    return FEATURE_NAMES + KEYWORD_FEATURE_NAMES if include_keyword_counts else list(FEATURE_NAMES)
+
 
 def shannon_entropy(s: str) -> float:
     if not s:
@@ -31,26 +107,62 @@ def shannon_entropy(s: str) -> float:
     return ent
 
 
-def extract_features(command: str) -> Dict[str, float]:
+def _char_class(ch: str) -> int:
+    cls = 0
+    if ch in SPECIAL_CHARS:
+        cls |= _SPECIAL
+    if ch == "/":
+        cls |= _SLASH
+    if ch.isdigit():
+        cls |= _DIGIT
+    if ch.isupper():
+        cls |= _UPPER
+    return cls
+
+
+# Class bits for every code point below 256; wider characters are classified on the fly.
+_CHAR_CLASS = tuple(_char_class(chr(i)) for i in range(256))
+
+
+def extract_features(command: str, include_keyword_counts: bool = False) -> Dict[str, float]:
     """Extract a stable ordered dict (in insertion order) of numeric features.
 
     All features scaled or left raw; scaling/normalization handled downstream if needed.
+    Single pass: one C-level character histogram, then one loop over the distinct
+    characters that reads class bits from ``_CHAR_CLASS`` and accumulates entropy.
+    ``include_keyword_counts`` appends the KEYWORD_FEATURE_NAMES columns (a newer
+    feature set; models trained without them must be scored without them).
     """
     cmd = command or ""
     command_length = len(cmd)
-    tokens = cmd.split()
-    arg_count = max(0, len(tokens) - 1)
-    special_chars_count = sum(1 for c in cmd if c in SPECIAL_CHARS)
-    path_separators_count = cmd.count('/')
-    digits = sum(1 for c in cmd if c.isdigit())
+    arg_count = max(0, len(cmd.split()) - 1)
+    special_chars_count = path_separators_count = digits = uppercase = 0
+    entropy = 0.0
+    table = _CHAR_CLASS
+    for ch, count in Counter(cmd).items():
+        code = ord(ch)
+        cls = table[code] if code < 256 else _char_class(ch)
+        if cls:
+            if cls & _SPECIAL:
+                special_chars_count += count
+            if cls & _SLASH:
+                path_separators_count += count
+            if cls & _DIGIT:
+                digits += count
+            if cls & _UPPER:
+                uppercase += count
+        p = count / command_length
+        entropy -= p * math.log2(p)
     digit_ratio = digits / command_length if command_length else 0.0
-    entropy = shannon_entropy(cmd)
-    uppercase = sum(1 for c in cmd if c.isupper())
     uppercase_ratio = uppercase / command_length if command_length else 0.0
-    suspicious_keyword_flag = 1.0 if any(k in cmd for k in SUSPICIOUS_KEYWORDS) else 0.0
+    if include_keyword_counts:
+        counts = keyword_counts(cmd)
+        suspicious_keyword_flag = 1.0 if any(counts) else 0.0
+    else:
+        suspicious_keyword_flag = 1.0 if has_suspicious_keyword(cmd) else 0.0
 
     # Ordered insertion (Python 3.7+ dict preserves order)
-    return {
+    features = {
         "command_length": float(command_length),
         "arg_count": float(arg_count),
         "special_chars_count": float(special_chars_count),
@@ -60,6 +172,9 @@ def extract_features(command: str) -> Dict[str, float]:
         "uppercase_ratio": uppercase_ratio,
         "suspicious_keyword_flag": suspicious_keyword_flag,
     }
+    if include_keyword_counts:
+        features.update(zip(KEYWORD_FEATURE_NAMES, map(float, counts)))
+    return features
 
 
 def feature_vector(command: str) -> Tuple[List[str], List[float]]:
@@ -67,4 +182,80 @@ def feature_vector(command: str) -> Tuple[List[str], List[float]]:
     return list(fdict.keys()), list(fdict.values())
 
 
-__all__ = ["extract_features", "feature_vector", "SUSPICIOUS_KEYWORDS"]
+def extract_features_matrix(commands: Sequence[str], include_keyword_counts: bool = False) -> np.ndarray:
+    """Vectorized ``extract_features`` for many commands: an (n, k) float64 array.
+
+    Columns follow ``feature_names(include_keyword_counts)``. ASCII commands are
+    concatenated into one byte buffer and character classes / entropy come from
+    per-row byte histograms; the rare non-ASCII command goes through
+    ``extract_features`` so Unicode digit/case/whitespace semantics stay identical.
+    """
+    cmds = [c or "" for c in commands]
+    out = np.zeros((len(cmds), len(feature_names(include_keyword_counts))), dtype=np.float64)
+    ascii_rows = [i for i, c in enumerate(cmds) if c.isascii()]
+    ascii_set = set(ascii_rows)
+    for i, c in enumerate(cmds):
+        if i not in ascii_set:
+            out[i] = list(extract_features(c, include_keyword_counts).values())
+    for lo in range(0, len(ascii_rows), _MATRIX_CHUNK):
+        rows = ascii_rows[lo:lo + _MATRIX_CHUNK]
+        out[rows] = _ascii_feature_block([cmds[i] for i in rows], include_keyword_counts)
+    return out
+
+
+def _ascii_feature_block(cmds: List[str], include_keyword_counts: bool) -> np.ndarray:
+    n = len(cmds)
+    block = np.zeros((n, len(feature_names(include_keyword_counts))), dtype=np.float64)
+    encoded = [c.encode("ascii") for c in cmds]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=n)
+    total = int(lengths.sum())
+    if include_keyword_counts:
+        counts = np.array([keyword_counts(c) for c in cmds], dtype=np.float64).reshape(n, len(SUSPICIOUS_KEYWORDS))
+        block[:, len(FEATURE_NAMES):] = counts
+        block[:, 7] = counts.any(axis=1)
+    else:
+        block[:, 7] = [1.0 if has_suspicious_keyword(c) else 0.0 for c in cmds]
+    if total == 0:
+        return block
+
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    row_ids = np.repeat(np.arange(n), lengths)
+    hist = np.bincount(row_ids * 256 + buf, minlength=n * 256).reshape(n, 256)
+
+    # Token starts: a non-space byte whose predecessor (within the row) is space
+    is_space = _WHITESPACE_BYTES[buf]
+    prev_space = np.empty(total, dtype=bool)
+    prev_space[0] = True
+    prev_space[1:] = is_space[:-1]
+    row_starts = np.cumsum(lengths) - lengths
+    prev_space[row_starts[lengths > 0]] = True
+    tokens = np.bincount(row_ids, weights=(~is_space & prev_space), minlength=n)
+
+    safe_len = np.where(lengths > 0, lengths, 1).astype(np.float64)
+    # Entropy only over the (few) non-zero histogram cells of each row
+    nz_rows, nz_cols = np.nonzero(hist)
+    p = hist[nz_rows, nz_cols] / safe_len[nz_rows]
+    entropy = np.bincount(nz_rows, weights=p * np.log2(p), minlength=n)
+
+    block[:, 0] = lengths
+    block[:, 1] = np.maximum(tokens - 1, 0)
+    block[:, 2] = hist[:, _SPECIAL_CODES].sum(axis=1)
+    block[:, 3] = hist[:, ord("/")]
+    block[:, 4] = hist[:, ord("0"):ord("9") + 1].sum(axis=1) / safe_len
+    block[:, 5] = -entropy
+    block[:, 6] = hist[:, ord("A"):ord("Z") + 1].sum(axis=1) / safe_len
+    return block
+
+
+__all__ = [
+    "extract_features",
+    "extract_features_matrix",
+    "feature_names",
+    "feature_vector",
+    "has_suspicious_keyword",
+    "keyword_counts",
+    "FEATURE_NAMES",
+    "KEYWORD_FEATURE_NAMES",
+    "KEYWORD_FEATURE_PREFIX",
+    "SUSPICIOUS_KEYWORDS",
+]
@@ -0,0 +1,134 @@
+"""Async access to MySQL for FastAPI handlers and websockets.
+
+``mysql.connector`` is blocking, and a query issued directly from an ``async``
+handler stalls the event loop, freezing every other websocket in the process
+until it returns. Async code paths hand their database work to ``run_db`` /
+``db_execute`` instead, which run it on a dedicated, bounded thread pool
+(``DB_ASYNC_WORKERS``, defaulting to the connection pool size) and record
+per-label timing so slow queries are visible.
+
+Environment variables:
+  DB_ASYNC_WORKERS (default: DB_POOL_SIZE or 10)
+  DB_SLOW_QUERY_MS (default 500) queries slower than this are logged
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from config import get_db_connection
+from db_pool import POOL_SIZE
+
+# One worker per pooled connection by default, so workers never queue on the pool
+DB_ASYNC_WORKERS = int(os.getenv("DB_ASYNC_WORKERS", "0")) or (POOL_SIZE if POOL_SIZE > 0 else 10)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, DB_ASYNC_WORKERS), thread_name_prefix="db")
+_STATS: Dict[str, Dict[str, float]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _record(label: str, queued: float, started: float, finished: float, failed: bool) -> None:
+    run_ms = (finished - started) * 1000.0
+    wait_ms = (started - queued) * 1000.0
+    with _STATS_LOCK:
+        s = _STATS.setdefault(label, {
+            "calls": 0, "errors": 0, "slow": 0,
+            "total_ms": 0.0, "max_ms": 0.0, "wait_total_ms": 0.0, "max_wait_ms": 0.0,
+        })
+        s["calls"] += 1
+        s["errors"] += 1 if failed else 0
+        s["total_ms"] += run_ms
+        s["max_ms"] = max(s["max_ms"], run_ms)
+        s["wait_total_ms"] += wait_ms
+        s["max_wait_ms"] = max(s["max_wait_ms"], wait_ms)
+        if run_ms >= DB_SLOW_QUERY_MS:
+            s["slow"] += 1
+    if run_ms >= DB_SLOW_QUERY_MS:
+        logging.warning(f"[async_db] slow query {label}: {run_ms:.1f} ms (waited {wait_ms:.1f} ms for a worker)")
+
+
+async def run_db(fn: Callable[..., Any], *args, label: Optional[str] = None) -> Any:
+    """Run blocking database code ``fn(*args)`` on the DB thread pool.
+
+    Keyword arguments are not forwarded, so a caller's ``label`` can never
+    collide with the wrapped function's own; bind them with ``functools.partial``.
+    """
+    label = label or getattr(fn, "__qualname__", None) or getattr(getattr(fn, "func", None), "__qualname__", "db")
+    queued = time.perf_counter()
+
+    def call():
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args)
+            failed = False
+            return result
+        finally:
+            _record(label, queued, started, time.perf_counter(), failed)
+
+    return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, call)
+
+
+def _execute(sql: str, params: Optional[Sequence[Any]], fetch: Optional[str], dictionary: bool, commit: bool):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(dictionary=dictionary)
+        try:
+            cur.execute(sql, params or ())
+            if fetch == "one":
+                result = cur.fetchone()
+            elif fetch == "all":
+                result = cur.fetchall()
+            else:
+                result = cur.rowcount
+            if commit:
+                conn.commit()
+            return result
+        finally:
+            cur.close()
+    finally:
+        conn.close()
+
+
+async def db_execute(
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    *,
+    fetch: Optional[str] = None,
+    dictionary: bool = False,
+    commit: bool = False,
+    label: Optional[str] = None,
+) -> Any:
+    """Execute one statement off the event loop.
+
+    ``fetch`` is "one", "all" or None (returns the affected row count).
+    """
+    return await run_db(_execute, sql, params, fetch, dictionary, commit, label=label or sql.split(None, 1)[0].upper())
+
+
+def query_stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        stats = {label: dict(s) for label, s in _STATS.items()}
+    return {
+        "workers": max(1, DB_ASYNC_WORKERS),
+        "slow_query_ms": DB_SLOW_QUERY_MS,
+        "queries": {
+            label: {
+                "calls": int(s["calls"]),
+                "errors": int(s["errors"]),
+                "slow": int(s["slow"]),
+                "avg_ms": round(s["total_ms"] / s["calls"], 3) if s["calls"] else 0.0,
+                "max_ms": round(s["max_ms"], 3),
+                "avg_wait_ms": round(s["wait_total_ms"] / s["calls"], 3) if s["calls"] else 0.0,
+                "max_wait_ms": round(s["max_wait_ms"], 3),
+            }
+            for label, s in sorted(stats.items())
+        },
+    }
+
+
+__all__ = ["run_db", "db_execute", "query_stats"]
@@ -11,6 +11,7 @@ Set DB_NAME=exustunh (and create that database) to redirect all persistence ther
 import os
 import mysql.connector
 from functools import lru_cache
+from db_pool import get_pool
 from typing import Dict, Any
 
 MYSQL_CONFIG = {
@@ -21,7 +22,14 @@ MYSQL_CONFIG = {
 }
 
 def get_db_connection():
-    return mysql.connector.connect(**MYSQL_CONFIG)
+    """A MySQL connection from the process-wide pool (a fresh connection if DB_POOL_SIZE=0).
+
+    Callers use it like a plain mysql.connector connection; close() returns it to the pool.
+    """
+    pool = get_pool(MYSQL_CONFIG)
+    if pool is None:
+        return mysql.connector.connect(**MYSQL_CONFIG)
+    return pool.connect()
 
 # Development mode flag: when True, some endpoints may return softer behavior
 # (e.g., allow missing auth by returning empty results). Default is False.
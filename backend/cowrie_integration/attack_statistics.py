@@ -0,0 +1,151 @@
+"""Attack statistics maintained incrementally as Cowrie events arrive.
+
+``CowrieLogParser.get_attack_statistics`` recounts severities, event types and
+source IPs over every stored event and sorts them for the recent-attacks list
+on each request. ``AttackStatistics.record`` instead updates the counters once
+per parsed event, keeps the newest medium/high severity events in a bounded
+heap, and adds each event to per-minute buckets from which running totals for
+the last 5 minutes, hour and day are maintained. ``snapshot`` then only
+copies the counters, so its cost does not grow with the number of events seen.
+
+Source IPs are unbounded on an internet-facing honeypot, so only the busiest
+ones are counted: once more than twice ``max_source_ips`` addresses are
+tracked, the counter is trimmed back to the top ``max_source_ips``. Counts of
+addresses that stay in the top set are exact; an address that was trimmed
+starts again from zero if it returns. ``snapshot`` reports the top
+``max_source_ips`` only.
+
+Environment variables:
+  COWRIE_STATS_RECENT_ATTACKS (default 10) attacks kept for ``recent_attacks``
+  COWRIE_STATS_MAX_SOURCE_IPS (default 100) source IPs reported in ``by_source_ip``
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from .event_store import ATTACK_SEVERITIES
+
+RECENT_ATTACKS = int(os.getenv("COWRIE_STATS_RECENT_ATTACKS", "10"))
+MAX_SOURCE_IPS = int(os.getenv("COWRIE_STATS_MAX_SOURCE_IPS", "100"))
+# Window label -> length in minutes
+WINDOWS = {"5m": 5, "1h": 60, "24h": 24 * 60}
+
+
+def _empty_counts() -> Dict[str, Any]:
+    return {"total": 0, "by_severity": Counter(), "by_type": Counter()}
+
+
+class AttackStatistics:
+    """Running counters, top-K recent attacks and 5m/1h/24h windows over parsed Cowrie events."""
+
+    def __init__(
+        self,
+        recent_attacks: int = RECENT_ATTACKS,
+        clock: Callable[[], float] = time.time,
+        max_source_ips: int = MAX_SOURCE_IPS,
+    ):
+        self.recent_k = max(1, int(recent_attacks))
+        self.max_source_ips = max(1, int(max_source_ips))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._total = 0
+            self._by_severity: Counter = Counter()
+            self._by_type: Counter = Counter()
+            self._by_source_ip: Counter = Counter()
+            self.source_ips_pruned = 0
+            # Min-heap on (timestamp, seq): the oldest of the kept attacks is popped first
+            self._recent: List = []
+            # (minute, counts) buckets; each window keeps the buckets still inside it
+            self._buckets: Dict[str, deque] = {label: deque() for label in WINDOWS}
+            self._window_counts: Dict[str, Dict[str, Any]] = {label: _empty_counts() for label in WINDOWS}
+            self._current: Optional[tuple] = None
+
+    def _advance(self, minute: int) -> None:
+        """Drop buckets that fell out of each window as of ``minute``."""
+        for label, length in WINDOWS.items():
+            buckets = self._buckets[label]
+            counts = self._window_counts[label]
+            while buckets and buckets[0][0] <= minute - length:
+                _, old = buckets.popleft()
+                counts["total"] -= old["total"]
+                counts["by_severity"].subtract(old["by_severity"])
+                counts["by_type"].subtract(old["by_type"])
+                counts["by_severity"] += Counter()  # drop zero entries
+                counts["by_type"] += Counter()
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Count one parsed event (as returned by ``CowrieLogParser.parse_event``)."""
+        severity = event.get("severity") or "low"
+        event_type = event.get("event_type") or ""
+        source_ip = event.get("source_ip")
+        minute = int(self._clock() // 60)
+        with self._lock:
+            self._total += 1
+            self._by_severity[severity] += 1
+            self._by_type[event_type] += 1
+            if source_ip:
+                self._by_source_ip[source_ip] += 1
+                if len(self._by_source_ip) > 2 * self.max_source_ips:
+                    # Amortized: one O(n log n) trim per max_source_ips new addresses
+                    self.source_ips_pruned += len(self._by_source_ip) - self.max_source_ips
+                    self._by_source_ip = Counter(dict(self._by_source_ip.most_common(self.max_source_ips)))
+
+            if severity in ATTACK_SEVERITIES:
+                entry = (str(event.get("timestamp", "")), next(self._seq), event)
+                if len(self._recent) < self.recent_k:
+                    heapq.heappush(self._recent, entry)
+                elif entry[:2] > self._recent[0][:2]:
+                    heapq.heapreplace(self._recent, entry)
+
+            self._advance(minute)
+            if self._current is None or self._current[0] != minute:
+                self._current = (minute, _empty_counts())
+                for buckets in self._buckets.values():
+                    buckets.append(self._current)
+            bucket = self._current[1]
+            bucket["total"] += 1
+            bucket["by_severity"][severity] += 1
+            bucket["by_type"][event_type] += 1
+            for counts in self._window_counts.values():
+                counts["total"] += 1
+                counts["by_severity"][severity] += 1
+                counts["by_type"][event_type] += 1
+
+    def recent_attacks(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest medium/high severity events by timestamp, newest first."""
+        with self._lock:
+            entries = sorted(self._recent, key=lambda e: e[:2], reverse=True)
+        return [e[2] for e in entries[: limit if limit is not None else self.recent_k]]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Same shape as ``CowrieLogParser.get_attack_statistics`` plus ``windows``."""
+        with self._lock:
+            self._advance(int(self._clock() // 60))
+            stats = {
+                "total_events": self._total,
+                "by_severity": {"high": 0, "medium": 0, "low": 0, **self._by_severity},
+                "by_type": dict(self._by_type),
+                "by_source_ip": dict(self._by_source_ip.most_common(self.max_source_ips)),
+                "windows": {
+                    label: {
+                        "total_events": counts["total"],
+                        "by_severity": {"high": 0, "medium": 0, "low": 0, **counts["by_severity"]},
+                        "by_type": dict(counts["by_type"]),
+                    }
+                    for label, counts in self._window_counts.items()
+                },
+            }
+        stats["recent_attacks"] = self.recent_attacks()
+        return stats
+
+
+__all__ = ["AttackStatistics", "WINDOWS", "MAX_SOURCE_IPS"]
@@ -0,0 +1,192 @@
+"""Bounded in-memory store for Cowrie events.
+
+The monitor thread used to append every raw event to a module-level list that
+was never trimmed, and every statistics request re-parsed the whole list. The
+store parses each event once on arrival and keeps the newest ``capacity``
+events in a ring buffer, with a second ring holding only medium/high severity
+events so "recent attacks" reads at most ``limit`` items. Events pushed out of
+the buffer can optionally be appended to an on-disk JSON-lines segment file.
+Once it exceeds the size limit it is rotated to ``<path>.1`` (older segments
+shift to ``.2``, ``.3``, ...). Only the newest ``COWRIE_EVENT_SPILL_SEGMENTS``
+rotated segments are kept, so the spill is bounded to roughly
+``(segments + 1) * max size`` on disk and the oldest events are eventually
+deleted.
+
+Environment variables:
+  COWRIE_EVENT_BUFFER_SIZE (default 10000) events kept in memory
+  COWRIE_EVENT_SPILL_PATH (default empty = disabled) segment file for evicted events
+  COWRIE_EVENT_SPILL_MAX_MB (default 64) size at which the segment is rotated
+  COWRIE_EVENT_SPILL_SEGMENTS (default 8) rotated segments kept besides the current one
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+
+from .log_parser import CowrieLogParser
+
+EVENT_BUFFER_SIZE = int(os.getenv("COWRIE_EVENT_BUFFER_SIZE", "10000"))
+EVENT_SPILL_PATH = os.getenv("COWRIE_EVENT_SPILL_PATH", "")
+EVENT_SPILL_MAX_BYTES = int(float(os.getenv("COWRIE_EVENT_SPILL_MAX_MB", "64")) * 1024 * 1024)
+EVENT_SPILL_SEGMENTS = int(os.getenv("COWRIE_EVENT_SPILL_SEGMENTS", "8"))
+
+ATTACK_SEVERITIES = ("medium", "high")
+
+
+class SpillSegment:
+    """Append-only JSON-lines file for events evicted from memory."""
+
+    def __init__(self, path: str, max_bytes: int = EVENT_SPILL_MAX_BYTES, max_segments: int = EVENT_SPILL_SEGMENTS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_segments = max(1, int(max_segments))
+        self._lock = threading.Lock()
+        self._file = None
+        self.written = 0
+        self.rotations = 0
+        self.dropped_segments = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        with self._lock:
+            if self._file is None:
+                self._open()
+            for event in events:
+                self._file.write(json.dumps(event, default=str) + "\n")
+            self._file.flush()
+            self.written += len(events)
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _segment(self, index: int) -> str:
+        return f"{self.path}.{index}" if index else self.path
+
+    def _rotate(self) -> None:
+        self._file.close()
+        oldest = self._segment(self.max_segments)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+            self.dropped_segments += 1
+        for index in range(self.max_segments - 1, -1, -1):
+            if os.path.exists(self._segment(index)):
+                os.replace(self._segment(index), self._segment(index + 1))
+        self.rotations += 1
+        self._open()
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        """Spilled events, oldest first (``.N`` down to ``.1``, then the current segment)."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        for path in [self._segment(i) for i in range(self.max_segments, -1, -1)]:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+            except FileNotFoundError:
+                continue
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class EventStore:
+    """Ring buffer of parsed Cowrie events with an attack-only index and optional disk spill."""
+
+    def __init__(
+        self,
+        capacity: int = EVENT_BUFFER_SIZE,
+        spill_path: Optional[str] = EVENT_SPILL_PATH,
+        parser: Optional[CowrieLogParser] = None,
+        spill_max_bytes: int = EVENT_SPILL_MAX_BYTES,
+        spill_segments: int = EVENT_SPILL_SEGMENTS,
+    ):
+        self.capacity = max(1, int(capacity))
+        self.parser = parser or CowrieLogParser()
+        self.spill = SpillSegment(spill_path, spill_max_bytes, spill_segments) if spill_path else None
+        self._lock = threading.Lock()
+        self._events: deque = deque()
+        self._attacks: deque = deque(maxlen=self.capacity)
+        self._last_raw: Optional[Dict[str, Any]] = None
+        self.total = 0
+        self.evicted = 0
+
+    def append(self, raw_event: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse and store one raw Cowrie event; returns the parsed event."""
+        parsed = self.parser.parse_event(raw_event)
+        evicted = None
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                evicted = self._events.popleft()
+                self.evicted += 1
+            self._events.append(parsed)
+            if parsed.get("severity") in ATTACK_SEVERITIES:
+                self._attacks.append(parsed)
+            self._last_raw = raw_event
+            self.total += 1
+        if evicted is not None and self.spill is not None:
+            try:
+                self.spill.write([evicted])
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Cowrie event spill failed: {e}")
+        return parsed
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest ``limit`` parsed events, newest first."""
+        with self._lock:
+            return list(islice(reversed(self._events), max(0, limit)))
+
+    def recent_attacks(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest ``limit`` medium/high severity events, newest first."""
+        with self._lock:
+            return list(islice(reversed(self._attacks), max(0, limit)))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """All buffered parsed events, oldest first."""
+        with self._lock:
+            return list(self._events)
+
+    @property
+    def last_event(self) -> Optional[Dict[str, Any]]:
+        return self._last_raw
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._attacks.clear()
+            self._last_raw = None
+            self.total = 0
+            self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "buffered": len(self._events),
+            "buffered_attacks": len(self._attacks),
+            "total": self.total,
+            "evicted": self.evicted,
+            "spill_path": self.spill.path if self.spill else None,
+            "spilled": self.spill.written if self.spill else 0,
+            "spill_rotations": self.spill.rotations if self.spill else 0,
+            "spill_dropped_segments": self.spill.dropped_segments if self.spill else 0,
+        }
+
+
+__all__ = ["EventStore", "SpillSegment", "ATTACK_SEVERITIES"]
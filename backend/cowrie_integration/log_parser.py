@@ -105,21 +105,23 @@ class CowrieLogParser:
         """Get the most recent medium/high severity events.
         Accepts raw Cowrie events or already parsed events (with 'event_type').
         """
-        parsed_events: List[Dict[str, Any]] = []
-        for ev in events:
-            if isinstance(ev, dict) and 'event_type' in ev and 'severity' in ev:
-                parsed_events.append(ev)
-            else:
-                parsed_events.append(self.parse_event(ev))
+        parsed_events = self._as_parsed(events)
         return sorted(
             [e for e in parsed_events if e.get('severity') in ['medium', 'high']],
             key=lambda x: x.get('timestamp', ''),
             reverse=True
         )[:limit]
 
+    def _as_parsed(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Parse raw events; events that are already parsed (with 'event_type') pass through."""
+        return [
+            ev if isinstance(ev, dict) and 'event_type' in ev and 'severity' in ev else self.parse_event(ev)
+            for ev in events
+        ]
+
     def get_attack_statistics(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Generate statistics from a list of events."""
-        parsed_events = [self.parse_event(event) for event in events]
+        """Generate statistics from a list of raw or parsed events."""
+        parsed_events = self._as_parsed(events)
         
         stats = {
             'total_events': len(parsed_events),
@@ -0,0 +1,307 @@
+"""Process-wide MySQL connection pool used by ``config.get_db_connection``.
+
+Handlers open a connection per request (often several) and close it when they
+are done. With the pool, ``close()`` hands the connection back instead of
+tearing down the TCP session, so the next checkout skips the connect and auth
+handshake. Checked-out connections behave exactly like
+``mysql.connector`` connections; ``close()`` rolls back anything left
+uncommitted before the connection is reused. A connection garbage-collected
+without ``close()`` is queued without taking the pool lock and closed (not
+reused) by the pool's next checkout, return or ``stats()`` call.
+
+Environment variables:
+  DB_POOL_SIZE (default 10; 0 disables pooling)
+  DB_POOL_MAX_OVERFLOW (default 10) extra connections opened under load and
+      closed again when returned
+  DB_POOL_TIMEOUT (default 30) seconds to wait for a free connection
+  DB_POOL_RECYCLE (default 1800) idle seconds after which a pooled connection
+      is replaced rather than reused (stay below MySQL's wait_timeout)
+  DB_POOL_PRE_PING (default 5) ping connections idle longer than this on checkout
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import mysql.connector
+from mysql.connector import errors
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = float(os.getenv("DB_POOL_PRE_PING", "5"))
+# How often a waiting connect() re-checks for connections abandoned without close()
+ABANDONED_POLL_SECONDS = 0.5
+
+
+class PooledConnection:
+    """A checked-out connection; ``close()`` returns it to the pool."""
+
+    __slots__ = ("_pool", "_conn", "_checked_out_at", "__weakref__")
+
+    def __init__(self, pool: "ConnectionPool", conn, checked_out_at: float):
+        self._pool = pool
+        self._conn = conn
+        self._checked_out_at = checked_out_at
+
+    def __getattr__(self, name):
+        if name in PooledConnection.__slots__:  # slot not set yet (partially constructed)
+            raise AttributeError(name)
+        conn = self._conn
+        if conn is None:
+            raise errors.OperationalError("Connection has been returned to the pool")
+        return getattr(conn, name)
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(conn, self._checked_out_at)
+
+    # mysql.connector exposes disconnect() as an alias of close()
+    disconnect = close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Handlers that forget close() on an error path must not leak a pool slot.
+        # A finalizer can run while this thread holds the pool lock, so it only
+        # queues the connection; the pool reclaims it on its next operation.
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._abandoned.append(conn)
+
+
+class ConnectionPool:
+    """Bounded pool of mysql.connector connections with overflow, pre-ping and idle recycling."""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        size: int = POOL_SIZE,
+        max_overflow: int = POOL_MAX_OVERFLOW,
+        timeout: float = POOL_TIMEOUT,
+        recycle: float = POOL_RECYCLE,
+        pre_ping: float = POOL_PRE_PING,
+        connect=None,
+    ):
+        self.config = dict(config)
+        self.size = max(1, int(size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._connect = connect or (lambda: mysql.connector.connect(**self.config))
+        self._idle = deque()  # (conn, last_used); newest on the right
+        # Connections garbage-collected without close(); appended without the lock
+        self._abandoned = deque()
+        self._checked_out = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+            "hold_seconds": 0.0,
+            "max_hold_seconds": 0.0,
+            "returns": 0,
+            "abandoned": 0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.size + self.max_overflow
+
+    def connect(self) -> PooledConnection:
+        started = time.perf_counter()
+        waited = False
+        abandoned = []
+        try:
+            with self._cond:
+                abandoned += self._reclaim_locked()
+                while not self._idle and self._checked_out >= self.capacity:
+                    waited = True
+                    remaining = self.timeout - (time.perf_counter() - started)
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise errors.PoolError(
+                            f"No MySQL connection available within {self.timeout}s "
+                            f"({self._checked_out} checked out, capacity {self.capacity})"
+                        )
+                    # Wake up periodically: abandoned connections free a slot without notify()
+                    self._cond.wait(min(remaining, ABANDONED_POLL_SECONDS))
+                    abandoned += self._reclaim_locked()
+                self._checked_out += 1
+                idle = self._idle.pop() if self._idle else None
+                wait = time.perf_counter() - started
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                    self._stats["wait_seconds"] += wait
+                    self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        finally:
+            for conn in abandoned:
+                self._close_quietly(conn)
+        try:
+            conn = self._usable(idle) if idle is not None else None
+            if conn is None:
+                conn = self._connect()
+                self._count("created")
+        except BaseException:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn, time.perf_counter())
+
+    def _usable(self, idle):
+        """The idle connection if it is still good, else None (after closing it)."""
+        conn, last_used = idle
+        idle_for = time.time() - last_used
+        if self.recycle and idle_for > self.recycle:
+            self._count("recycled")
+            self._close_quietly(conn)
+            return None
+        if idle_for > self.pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._count("ping_failures")
+                self._close_quietly(conn)
+                return None
+        return conn
+
+    def _reclaim_locked(self) -> list:
+        """Free the slots of abandoned connections (caller holds the lock); returns them to close.
+
+        Their transaction state is unknown, so they are closed rather than reused.
+        """
+        reclaimed = []
+        while self._abandoned:
+            try:
+                reclaimed.append(self._abandoned.popleft())
+            except IndexError:
+                break
+        if reclaimed:
+            self._checked_out -= len(reclaimed)
+            self._stats["abandoned"] += len(reclaimed)
+            self._cond.notify(len(reclaimed))
+        return reclaimed
+
+    def _release(self, conn, checked_out_at: float) -> None:
+        held = time.perf_counter() - checked_out_at
+        keep = True
+        try:
+            # Never hand the next caller an open transaction or unread result set
+            if getattr(conn, "unread_result", False):
+                conn.consume_results()
+            # Also ends the implicit read snapshot so the next user sees fresh data
+            if getattr(conn, "in_transaction", True):
+                conn.rollback()
+        except Exception:
+            keep = False
+        with self._cond:
+            abandoned = self._reclaim_locked()
+            self._checked_out -= 1
+            self._stats["returns"] += 1
+            self._stats["hold_seconds"] += held
+            self._stats["max_hold_seconds"] = max(self._stats["max_hold_seconds"], held)
+            if keep and len(self._idle) < self.size:
+                self._idle.append((conn, time.time()))
+                conn = None
+            else:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+        if conn is not None:
+            abandoned.append(conn)
+        for conn in abandoned:
+            self._close_quietly(conn)
+
+    def _count(self, key: str) -> None:
+        with self._cond:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def dispose(self) -> None:
+        """Close every idle connection (checked-out ones close when returned)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            abandoned = self._reclaim_locked()
+        for conn in [c for c, _ in idle] + abandoned:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            abandoned = self._reclaim_locked()
+            s = dict(self._stats)
+            checked_out = self._checked_out
+            idle = len(self._idle)
+        for conn in abandoned:
+            self._close_quietly(conn)
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "checked_out": checked_out,
+            "idle": idle,
+            "overflow_in_use": max(0, checked_out + idle - self.size),
+            "checkouts": s["checkouts"],
+            "created": s["created"],
+            "recycled": s["recycled"],
+            "ping_failures": s["ping_failures"],
+            "discarded": s["discarded"],
+            "timeouts": s["timeouts"],
+            "waits": s["waits"],
+            "avg_wait_ms": round(s["wait_seconds"] / s["waits"] * 1000.0, 3) if s["waits"] else 0.0,
+            "max_wait_ms": round(s["max_wait_seconds"] * 1000.0, 3),
+            "avg_checkout_ms": round(s["hold_seconds"] / s["returns"] * 1000.0, 3) if s["returns"] else 0.0,
+            "max_checkout_ms": round(s["max_hold_seconds"] * 1000.0, 3),
+            "abandoned": s["abandoned"],
+        }
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_PID: Optional[int] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool(config: Dict[str, Any]) -> Optional[ConnectionPool]:
+    """The process-wide pool (rebuilt after fork), or None when DB_POOL_SIZE=0."""
+    global _POOL, _POOL_PID
+    if POOL_SIZE <= 0:
+        return None
+    pid = os.getpid()
+    if _POOL is None or _POOL_PID != pid:
+        with _POOL_LOCK:
+            if _POOL is None or _POOL_PID != pid:
+                # A forked worker must not share the parent's sockets
+                _POOL = ConnectionPool(config)
+                _POOL_PID = pid
+    return _POOL
+
+
+def pool_stats() -> Dict[str, Any]:
+    if POOL_SIZE <= 0:
+        return {"enabled": False}
+    pool = _POOL if _POOL_PID == os.getpid() else None
+    if pool is None:
+        return {"enabled": True, "initialized": False}
+    return {"enabled": True, "initialized": True, **pool.stats()}
+
+
+__all__ = ["ConnectionPool", "PooledConnection", "get_pool", "pool_stats"]
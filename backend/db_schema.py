@@ -0,0 +1,391 @@
+"""Versioned schema migrations and per-process schema caches.
+
+Dated migration scripts in ``backend/sql`` (``YYYYMMDD_<name>.sql``) are
+applied once each, in file-name order, when the backend starts, and recorded
+in the ``schema_version`` table. The other scripts in that folder (full
+schema dumps, seed/reset/wipe helpers, backups) are never run automatically.
+The dated scripts are written to be idempotent and independent, so a script
+that fails is logged and retried on the next start without blocking the ones
+after it.
+
+Databases that predate the runner already had the shipped scripts applied by
+hand, and ``20250927_normalize_module_names.sql`` rewrites data, so they must
+not run again. When ``schema_version`` does not exist yet and the database
+already holds application tables, the scripts up to ``DB_MIGRATIONS_BASELINE``
+are recorded as applied (``execution_ms`` NULL) without being run; later
+scripts are applied normally. A fresh, empty database runs every script.
+``python db_schema.py stamp [VERSION]`` records scripts by hand the same way.
+
+Request handlers used to run their ``ensure_*`` helpers (``CREATE TABLE IF NOT
+EXISTS``, ``ALTER TABLE ... ADD COLUMN``, ``SHOW COLUMNS``) on every call.
+Those helpers are wrapped with ``schema_once``, which runs the DDL until it
+first succeeds in a process and skips it afterwards (helpers that log and
+swallow their own errors return False, so they are retried), and
+column-capability checks go through ``table_columns`` / ``has_column``, which
+cache the column set of each table instead of querying information_schema per
+request.
+
+Environment variables:
+  DB_MIGRATIONS_ON_STARTUP (default 1) apply pending migrations at startup
+  DB_MIGRATIONS_DIR (default backend/sql)
+  DB_MIGRATIONS_LOCK_TIMEOUT (default 60) seconds to wait for another worker's run
+  DB_MIGRATIONS_BASELINE (default 20251029_create_simulation_rooms.sql) last script
+    assumed applied on a pre-existing database; "none" runs every script there too
+  DB_SCHEMA_CACHE (default 1) set to 0 to run ensure_* helpers on every call again
+"""
+import functools
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from config import MYSQL_CONFIG, get_db_connection
+
+MIGRATIONS_ON_STARTUP = os.getenv("DB_MIGRATIONS_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+MIGRATIONS_DIR = os.getenv("DB_MIGRATIONS_DIR", os.path.join(os.path.dirname(__file__), "sql"))
+MIGRATIONS_LOCK_TIMEOUT = int(os.getenv("DB_MIGRATIONS_LOCK_TIMEOUT", "60"))
+SCHEMA_CACHE = os.getenv("DB_SCHEMA_CACHE", "1").lower() not in ("0", "false", "no")
+# Last dated script that shipped before migrations were applied automatically
+MIGRATIONS_BASELINE: Optional[str] = os.getenv("DB_MIGRATIONS_BASELINE", "20251029_create_simulation_rooms.sql").strip()
+if MIGRATIONS_BASELINE.lower() in ("", "0", "none", "false", "no"):
+    MIGRATIONS_BASELINE = None
+
+_MIGRATION_RE = re.compile(r"^\d{8}_[A-Za-z0-9_\-]+\.sql$")
+_LOCK_NAME = "nidstoknow_schema_migrations"
+# Errors that only mean an idempotent DDL statement found its change already applied:
+# table exists, duplicate column, duplicate key name, can't drop missing column/key
+_ALREADY_APPLIED_ERRNOS = {1050, 1060, 1061, 1091}
+
+_MIGRATION_STATE: Dict[str, Any] = {"last_run": None, "applied": [], "baselined": [], "failed": [], "pending": []}
+
+
+# ---- SQL script handling ---------------------------------------------------
+
+def split_sql(script: str) -> List[str]:
+    """Split a SQL script into statements on ``;`` outside quotes and comments."""
+    statements: List[str] = []
+    buf: List[str] = []
+    i, n = 0, len(script)
+    quote: Optional[str] = None
+    while i < n:
+        ch = script[i]
+        if quote:
+            buf.append(ch)
+            if ch == "\\" and quote != "`" and i + 1 < n:
+                buf.append(script[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                if i + 1 < n and script[i + 1] == quote:  # doubled quote escapes itself
+                    buf.append(script[i + 1])
+                    i += 2
+                    continue
+                quote = None
+            i += 1
+            continue
+        if ch in ("'", '"', "`"):
+            quote = ch
+            buf.append(ch)
+        elif ch == "-" and script.startswith("--", i) and (i + 2 >= n or script[i + 2] in " \t\r\n"):
+            end = script.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif ch == "#":
+            end = script.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif ch == "/" and script.startswith("/*", i):
+            end = script.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            buf.append(" ")
+            continue
+        elif ch == ";":
+            stmt = "".join(buf).strip()
+            if stmt:
+                statements.append(stmt)
+            buf = []
+        else:
+            buf.append(ch)
+        i += 1
+    stmt = "".join(buf).strip()
+    if stmt:
+        statements.append(stmt)
+    return statements
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Dated migration file names in ``directory``, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(name for name in names if _MIGRATION_RE.match(name))
+
+
+def _ensure_version_table(cursor) -> None:
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version VARCHAR(255) NOT NULL PRIMARY KEY,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+            execution_ms INT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+
+
+def _applied_versions(cursor) -> Dict[str, str]:
+    cursor.execute("SELECT version, checksum FROM schema_version")
+    return {row[0]: row[1] for row in cursor.fetchall() or []}
+
+
+def _count_tables(cursor, exclude: Optional[str] = None, only: Optional[str] = None) -> int:
+    sql = "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=%s"
+    params: List[Any] = [MYSQL_CONFIG["database"]]
+    if only is not None:
+        sql += " AND table_name=%s"
+        params.append(only)
+    if exclude is not None:
+        sql += " AND table_name<>%s"
+        params.append(exclude)
+    cursor.execute(sql, tuple(params))
+    rows = cursor.fetchall()
+    return int(rows[0][0]) if rows else 0
+
+
+def _read_script(directory: str, name: str):
+    with open(os.path.join(directory, name), encoding="utf-8") as f:
+        script = f.read()
+    return script, hashlib.sha256(script.encode("utf-8")).hexdigest()
+
+
+def _up_to(name: str, version: str) -> bool:
+    # "20251029" covers every script dated that day; a full file name is inclusive
+    return name <= version or name.startswith(version)
+
+
+def _stamp(conn, cursor, directory: str, names: List[str]) -> List[str]:
+    for name in names:
+        _, checksum = _read_script(directory, name)
+        cursor.execute(
+            "INSERT INTO schema_version (version, checksum, execution_ms) VALUES (%s, %s, NULL)",
+            (name, checksum),
+        )
+    conn.commit()
+    return list(names)
+
+
+def _apply_script(conn, cursor, script: str) -> None:
+    for statement in split_sql(script):
+        try:
+            cursor.execute(statement)
+        except Exception as e:
+            if getattr(e, "errno", None) not in _ALREADY_APPLIED_ERRNOS:
+                raise
+        # Drain result sets (SELECT 1 branches of conditional DDL) before the next statement
+        if cursor.with_rows:
+            cursor.fetchall()
+    conn.commit()
+
+
+def run_migrations(directory: str = MIGRATIONS_DIR, conn=None) -> Dict[str, Any]:
+    """Apply every dated migration not yet recorded in ``schema_version``."""
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    cursor = conn.cursor()
+    applied: List[str] = []
+    baselined: List[str] = []
+    failed: List[Dict[str, str]] = []
+    locked = False
+    try:
+        # Several uvicorn workers start together; only one applies migrations
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, MIGRATIONS_LOCK_TIMEOUT))
+        rows = cursor.fetchall()
+        locked = bool(rows and rows[0][0] == 1)
+        if not locked:
+            print(f"[WARN] schema migrations skipped: could not acquire lock within {MIGRATIONS_LOCK_TIMEOUT}s")
+            return migration_status()
+        first_run = _count_tables(cursor, only="schema_version") == 0
+        _ensure_version_table(cursor)
+        done = _applied_versions(cursor)
+        names = discover_migrations(directory)
+        if first_run and MIGRATIONS_BASELINE and _count_tables(cursor, exclude="schema_version") > 0:
+            baselined = _stamp(conn, cursor, directory, [n for n in names if _up_to(n, MIGRATIONS_BASELINE)])
+            done = _applied_versions(cursor)
+            print(f"[INFO] existing database: recorded {len(baselined)} migration(s) up to {MIGRATIONS_BASELINE} without running them")
+        for name in names:
+            script, checksum = _read_script(directory, name)
+            if name in done:
+                if done[name] != checksum:
+                    print(f"[WARN] migration {name} changed after it was applied; not re-running it")
+                continue
+            started = time.perf_counter()
+            try:
+                _apply_script(conn, cursor, script)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, checksum, execution_ms) VALUES (%s, %s, %s)",
+                    (name, checksum, int((time.perf_counter() - started) * 1000)),
+                )
+                conn.commit()
+                applied.append(name)
+                print(f"[INFO] applied migration {name}")
+            except Exception as e:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                failed.append({"version": name, "error": str(e)})
+                print(f"[WARN] migration {name} failed (will retry on next start): {e}")
+        _MIGRATION_STATE["pending"] = [f["version"] for f in failed]
+    finally:
+        if locked:
+            try:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+                cursor.fetchall()
+            except Exception:
+                pass
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        if own_conn:
+            conn.close()
+    _MIGRATION_STATE.update(last_run=time.time(), applied=applied, baselined=baselined, failed=failed)
+    # Migrations may have added columns
+    invalidate_columns()
+    return migration_status()
+
+
+def stamp_migrations(up_to: Optional[str] = None, directory: str = MIGRATIONS_DIR, conn=None) -> List[str]:
+    """Record dated scripts (all, or those up to ``up_to``) as applied without running them."""
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    cursor = conn.cursor()
+    try:
+        _ensure_version_table(cursor)
+        done = _applied_versions(cursor)
+        names = [n for n in discover_migrations(directory) if n not in done and (up_to is None or _up_to(n, up_to))]
+        return _stamp(conn, cursor, directory, names)
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        if own_conn:
+            conn.close()
+
+
+def migration_status() -> Dict[str, Any]:
+    return {
+        "last_run": _MIGRATION_STATE["last_run"],
+        "applied": list(_MIGRATION_STATE["applied"]),
+        "baselined": list(_MIGRATION_STATE["baselined"]),
+        "failed": list(_MIGRATION_STATE["failed"]),
+        "pending": list(_MIGRATION_STATE["pending"]),
+    }
+
+
+# ---- per-process schema caches ---------------------------------------------
+
+_ENSURED: Dict[str, bool] = {}
+_COLUMNS: Dict[str, FrozenSet[str]] = {}
+_COLUMNS_LOCK = threading.Lock()
+
+
+def schema_once(fn: Callable) -> Callable:
+    """Run an ``ensure_*`` DDL helper until its first successful call in this process.
+
+    A call succeeds when the helper neither raises nor returns ``False``; helpers
+    that catch and log their own errors return ``False`` so the next call retries.
+    """
+    key = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if SCHEMA_CACHE and _ENSURED.get(key):
+            return None
+        result = fn(*args, **kwargs)
+        if result is not False:
+            _ENSURED[key] = True
+        # The helper may have added columns; re-read column sets on next use
+        invalidate_columns()
+        return result
+
+    wrapper.reset = lambda: _ENSURED.pop(key, None)
+    return wrapper
+
+
+def table_columns(cursor, table: str) -> FrozenSet[str]:
+    """Column names of ``table`` (lower-case), cached per process; empty if the table is missing."""
+    cached = _COLUMNS.get(table)
+    if cached is not None and SCHEMA_CACHE:
+        return cached
+    cursor.execute(
+        "SELECT column_name AS name FROM information_schema.columns WHERE table_schema=%s AND table_name=%s",
+        (MYSQL_CONFIG["database"], table),
+    )
+    rows = cursor.fetchall() or []
+    columns = frozenset(str(r["name"] if isinstance(r, dict) else r[0]).lower() for r in rows)
+    # A missing table may be created later; only remember tables that exist
+    if columns:
+        with _COLUMNS_LOCK:
+            _COLUMNS[table] = columns
+    return columns
+
+
+def has_column(cursor, table: str, column: str) -> bool:
+    return column.lower() in table_columns(cursor, table)
+
+
+def invalidate_columns(table: Optional[str] = None) -> None:
+    with _COLUMNS_LOCK:
+        if table is None:
+            _COLUMNS.clear()
+        else:
+            _COLUMNS.pop(table, None)
+
+
+def reset_schema_cache() -> None:
+    """Forget which ensure_* helpers ran and every cached column set."""
+    _ENSURED.clear()
+    invalidate_columns()
+
+
+def schema_cache_stats() -> Dict[str, Any]:
+    return {
+        "enabled": SCHEMA_CACHE,
+        "ensured_helpers": sorted(k for k, v in _ENSURED.items() if v),
+        "cached_tables": sorted(_COLUMNS),
+        "migrations": migration_status(),
+    }
+
+
+__all__ = [
+    "split_sql",
+    "discover_migrations",
+    "run_migrations",
+    "stamp_migrations",
+    "migration_status",
+    "schema_once",
+    "table_columns",
+    "has_column",
+    "invalidate_columns",
+    "reset_schema_cache",
+    "schema_cache_stats",
+]
+
+
+if __name__ == "__main__":
+    # python db_schema.py migrate | stamp [VERSION]
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "stamp":
+        for name in stamp_migrations(sys.argv[2] if len(sys.argv) > 2 else None):
+            print(f"stamped {name}")
+    elif command == "migrate":
+        print(run_migrations())
+    else:
+        sys.exit("usage: python db_schema.py migrate | stamp [VERSION]")
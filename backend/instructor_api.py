@@ -12,8 +12,10 @@ from notifications_helper import migrate_notifications_schema
 router = APIRouter()
 
 from config import MYSQL_CONFIG, get_db_connection
+from db_schema import schema_once, table_columns
 import os, uuid, re, logging
 
+@schema_once
 def ensure_instructor_profiles_table(cursor):
     """Ensure instructor_profiles exists to store join_date and avatar_url per instructor."""
     cursor.execute(
@@ -28,6 +30,7 @@ def ensure_instructor_profiles_table(cursor):
         '''
     )
 
+@schema_once
 def ensure_instructor_settings_table(cursor):
     """Ensure instructor_settings exists; stores notifications as JSON text for portability."""
     cursor.execute(
@@ -41,6 +44,7 @@ def ensure_instructor_settings_table(cursor):
         '''
     )
 
+@schema_once
 def ensure_users_table(cursor):
     """Create users table if it doesn't exist yet (minimal schema used across instructor APIs)."""
     cursor.execute(
@@ -77,9 +81,11 @@ def ensure_users_table(cursor):
             except Exception:
                 pass
     except Exception:
-        # If information_schema isn't accessible, silently continue; later queries will handle missing columns defensively
-        pass
+        # If information_schema isn't accessible, continue; later queries handle missing columns
+        # defensively, and the check is retried on the next call
+        return False
 
+@schema_once
 def ensure_assignments_table(cursor):
     """Create assignments table if it doesn't exist yet."""
     cursor.execute(
@@ -98,6 +104,7 @@ def ensure_assignments_table(cursor):
         '''
     )
 
+@schema_once
 def ensure_student_progress_table(cursor):
     """Create student_progress table if it doesn't exist (minimal columns used by instructor reports)."""
     cursor.execute(
@@ -119,6 +126,7 @@ def ensure_student_progress_table(cursor):
         '''
     )
 
+@schema_once
 def ensure_submissions_table(cursor):
     """Create submissions table if it doesn't exist so joins don't fail."""
     cursor.execute(
@@ -140,6 +148,7 @@ def ensure_submissions_table(cursor):
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
         '''
     )
+@schema_once
 def ensure_simulation_rooms_table(cursor):
     """Create simulation_rooms and simulation_room_members tables to persist instructor-created rooms and members."""
     cursor.execute(
@@ -156,15 +165,16 @@ def ensure_simulation_rooms_table(cursor):
         '''
     )
     # Backfill/ensure last_run_code column exists for older deployments
+    ok = True
     try:
         cursor.execute("SHOW COLUMNS FROM simulation_rooms LIKE 'last_run_code'")
         if cursor.fetchone() is None:
             try:
                 cursor.execute("ALTER TABLE simulation_rooms ADD COLUMN last_run_code VARCHAR(64) DEFAULT NULL")
             except Exception:
-                pass
+                ok = False
     except Exception:
-        pass
+        ok = False
     cursor.execute(
         '''
         CREATE TABLE IF NOT EXISTS simulation_room_members (
@@ -178,6 +188,25 @@ def ensure_simulation_rooms_table(cursor):
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
         '''
     )
+    return ok
+
+@schema_once
+def ensure_simulation_sessions_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS simulation_sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            student_name VARCHAR(255) NULL,
+            role ENUM('attacker','defender') NOT NULL,
+            score INT DEFAULT 0,
+            lobby_code VARCHAR(64) NULL,
+            created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_student_role_time (student_id, role, created_at),
+            INDEX idx_created_at (created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
 
 def _notify_once(cursor, recipient_role: str, recipient_id: Optional[int], message: str, ntype: str = 'info') -> None:
     """Insert a notification if an identical unread message doesn't already exist for that recipient."""
@@ -195,6 +224,7 @@ def _notify_once(cursor, recipient_role: str, recipient_id: Optional[int], messa
     except Exception as e:
         print(f"[WARN] _notify_once failed: {e}")
 
+@schema_once
 def ensure_notifications_table(cursor):
     """Create notifications table if it doesn't exist yet. Supports per-recipient targeting and read flags."""
     cursor.execute(
@@ -443,6 +473,7 @@ class FeedbackCreate(BaseModel):
     submission_id: Optional[int] = None
     assignment_id: Optional[int] = None
 
+@schema_once
 def ensure_feedback_table(cursor):
     """Create feedback table if missing and auto-migrate missing columns for legacy installs."""
     cursor.execute(
@@ -459,6 +490,7 @@ def ensure_feedback_table(cursor):
         '''
     )
     # Ensure required columns exist (avoid NOT NULL to not break existing rows)
+    ok = True
     try:
         cursor.execute(
             """
@@ -483,8 +515,10 @@ def ensure_feedback_table(cursor):
                     cursor.execute(f"ALTER TABLE feedback ADD COLUMN {col} {sql_type}")
                 except Exception as ae:
                     print(f"[WARN] Could not add missing column {col} to feedback: {ae}")
+                    ok = False
     except Exception as e:
         print(f"[WARN] Could not verify/alter feedback schema: {e}")
+        ok = False
     # Unconditional safety attempts (ignore duplicate column errors)
     for col, sql_type in (
         ('instructor_id', 'INT NULL'),
@@ -496,6 +530,7 @@ def ensure_feedback_table(cursor):
         except Exception as ae:
             # Duplicate column error (1060) or others we can safely ignore
             pass
+    return ok
 
 @router.post('/instructor/signup')
 def instructor_signup(req: InstructorSignupRequest):
@@ -1418,8 +1453,7 @@ def instructor_students_summary(request: Request):
         has_created_at = False
         has_last_active = False
         try:
-            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema=%s AND table_name='users'", (MYSQL_CONFIG['database'],))
-            cols = {r[0] for r in cursor.fetchall() or []}
+            cols = table_columns(cursor, 'users')
             has_created_at = 'created_at' in cols
             has_last_active = 'last_active' in cols
         except Exception:
@@ -1979,21 +2013,7 @@ def list_submissions(request: Request):
     cursor = conn.cursor(dictionary=True)
     # Best-effort ensure simulation_sessions exists for subqueries
     try:
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS simulation_sessions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT NOT NULL,
-                student_name VARCHAR(255) NULL,
-                role ENUM('attacker','defender') NOT NULL,
-                score INT DEFAULT 0,
-                lobby_code VARCHAR(64) NULL,
-                created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_student_role_time (student_id, role, created_at),
-                INDEX idx_created_at (created_at)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-        )
+        ensure_simulation_sessions_table(cursor)
     except Exception:
         pass
     try:
@@ -2338,6 +2358,7 @@ class ModuleRequestCreate(BaseModel):
 # Accept any category (frontend controlled); could later restrict if needed
 ALLOWED_MODULE_REQUEST_CATEGORIES: Optional[set] = None
 
+@schema_once
 def ensure_module_requests_table(cursor):
     cursor.execute(
         '''CREATE TABLE IF NOT EXISTS module_requests (
@@ -2360,6 +2381,7 @@ def ensure_module_requests_table(cursor):
             cursor.execute("ALTER TABLE module_requests ADD COLUMN content_json LONGTEXT NULL")
     except Exception as me:
         print(f"[WARN] Could not ensure content_json column: {me}")
+        return False
 
 @router.post('/instructor/module-request')
 def create_module_request(request: Request, req: ModuleRequestCreate):
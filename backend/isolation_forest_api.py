@@ -3,26 +3,42 @@ import mysql.connector
 from mysql.connector import Error
 import json
 import os
+import threading
 from datetime import datetime
 
-from config import MYSQL_CONFIG as DB_CONFIG
+from config import get_db_connection
 from isolation_forest_runtime import score_command  # New runtime scoring
 
 class IsolationForestDB:
     def __init__(self):
-        self.connection = None
+        # One shared instance serves concurrent requests from worker threads,
+        # so each thread keeps its own current connection.
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        return getattr(self._local, "connection", None)
+
+    @connection.setter
+    def connection(self, value):
+        self._local.connection = value
     
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
+            self.connection = get_db_connection()
             return True
         except Error as e:
             print(f"Error connecting to MySQL: {e}")
             return False
     
     def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        # Pooled connection: close() hands it back to the pool
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Error:
+                pass
+            self.connection = None
     
     def get_model_config(self, model_name='hybrid_detection'):
         """Get Isolation Forest model configuration"""
@@ -256,7 +272,7 @@ class IsolationForestDB:
             values = []
             
             for field, value in kwargs.items():
-                if field in ['n_trees', 'max_depth', 'contamination', 'sample_size', 'threshold']:
+                if field in ['n_trees', 'max_depth', 'contamination', 'sample_size', 'threshold', 'percentile_threshold']:
                     update_fields.append(f"{field} = %s")
                     values.append(value)
             
@@ -0,0 +1,158 @@
+"""Flat-array inference for a fitted sklearn IsolationForest.
+
+``IsolationForest.decision_function`` validates its input and dispatches into
+each tree separately on every call, which dominates latency when scoring one
+command at a time. ``CompiledForest`` copies the fitted trees into a handful of
+contiguous NumPy arrays (feature, threshold, children, leaf path length) and
+walks all trees for all rows at once, one tree level per step. Scores match
+``decision_function`` to floating point rounding.
+
+The same arrays are the on-disk model format: ``save`` writes one ``.npy`` per
+array plus a small JSON header, and ``load`` memory-maps them, so uvicorn
+workers share the pages instead of each unpickling its own copy of the forest.
+"""
+
+import json
+import os
+from typing import Any, List
+
+import numpy as np
+
+ARRAY_FORMAT = 1
+_ARRAYS = ("feature", "threshold", "left", "right", "leaf_value", "roots")
+_HEADER = "forest.json"
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected path length of an unsuccessful BST search over ``n_samples`` items.
+
+    Same definition sklearn uses to correct leaves that hold more than one
+    training sample and to normalise the forest's mean depth.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros(n.shape, dtype=np.float64)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+class CompiledForest:
+    """All trees of an IsolationForest packed into shared node arrays.
+
+    Node ``i`` splits on column ``feature[i]`` of the full input matrix (the
+    per-estimator feature subset is already applied) and sends a row to
+    ``left[i]`` when its value is ``<= threshold[i]``. Leaves point to
+    themselves with an infinite threshold, so the level-wise walk can run a
+    fixed ``max_depth`` steps without masking finished rows. ``leaf_value``
+    holds the leaf's depth plus the average path length correction.
+    """
+
+    __slots__ = ("feature", "threshold", "left", "right", "leaf_value", "roots",
+                 "max_depth", "n_features", "denominator", "offset")
+
+    def __init__(self, model: Any):
+        features: List[np.ndarray] = []
+        thresholds: List[np.ndarray] = []
+        lefts: List[np.ndarray] = []
+        rights: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        roots: List[int] = []
+        max_depth = 0
+        base = 0
+        for estimator, columns in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            local = np.arange(n_nodes, dtype=np.intp)
+
+            depth = np.zeros(n_nodes, dtype=np.float64)
+            for node in range(n_nodes):  # children always follow their parent
+                if not is_leaf[node]:
+                    depth[tree.children_left[node]] = depth[node] + 1.0
+                    depth[tree.children_right[node]] = depth[node] + 1.0
+            max_depth = max(max_depth, int(depth.max()))
+
+            columns = np.asarray(columns, dtype=np.intp)
+            features.append(np.where(is_leaf, 0, columns[np.maximum(tree.feature, 0)]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(base + np.where(is_leaf, local, tree.children_left))
+            rights.append(base + np.where(is_leaf, local, tree.children_right))
+            values.append(depth + average_path_length(tree.n_node_samples))
+            roots.append(base)
+            base += n_nodes
+
+        self.feature = np.concatenate(features).astype(np.int32)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.left = np.concatenate(lefts).astype(np.int32)
+        self.right = np.concatenate(rights).astype(np.int32)
+        self.leaf_value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = max_depth
+        self.n_features = int(model.n_features_in_)
+        max_samples = getattr(model, "_max_samples", model.max_samples_)
+        self.denominator = len(roots) * float(average_path_length(np.array([max_samples]))[0])
+        self.offset = float(model.offset_)
+
+    def save(self, directory: str) -> None:
+        """Write the arrays and header into ``directory`` (created if missing)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        header = {
+            "format": ARRAY_FORMAT,
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "denominator": self.denominator,
+            "offset": self.offset,
+        }
+        with open(os.path.join(directory, _HEADER), "w") as f:
+            json.dump(header, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "CompiledForest":
+        with open(os.path.join(directory, _HEADER)) as f:
+            header = json.load(f)
+        if header.get("format") != ARRAY_FORMAT:
+            raise ValueError(f"unsupported forest array format {header.get('format')!r}")
+        forest = cls.__new__(cls)
+        for name in _ARRAYS:
+            setattr(forest, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None))
+        forest.max_depth = int(header["max_depth"])
+        forest.n_features = int(header["n_features"])
+        forest.denominator = float(header["denominator"])
+        forest.offset = float(header["offset"])
+        return forest
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.size))
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(X, self.feature[nodes], axis=1)
+            nodes = np.where(values <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+        return nodes
+
+    def score_samples(self, X) -> np.ndarray:
+        # sklearn compares float32 inputs against the stored thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected input of shape (n, {self.n_features}), got {X.shape}")
+        if X.shape[0] == 0:
+            return np.zeros(0, dtype=np.float64)
+        depths = self.leaf_value[self._leaves(X)].sum(axis=1)
+        if self.denominator == 0:
+            return -np.ones(X.shape[0], dtype=np.float64)
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset
+
+
+def compile_forest(model: Any) -> CompiledForest:
+    return CompiledForest(model)
+
+
+__all__ = ["CompiledForest", "compile_forest", "average_path_length", "ARRAY_FORMAT"]
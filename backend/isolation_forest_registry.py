@@ -0,0 +1,288 @@
+"""Multi-model registry for Isolation Forest scoring.
+
+``isolation_forest_runtime`` owns the default model. Every other
+``isolation_forest_config.model_name`` can be trained into its own directory
+(``models/registry/<model_name>/``) and scored here. Only names that have an
+``isolation_forest_config`` row or a trained artifact are served; anything
+else raises UnknownModel, and scoring never starts a training job. Loaded
+models stay resident until the total size of their tree arrays exceeds the
+memory budget (``ANOMALY_MODEL_CACHE_MB``), at which point the least recently
+used named model is dropped; the default model is never evicted.
+
+A candidate model can shadow a primary one: a sample of the primary's scoring
+calls is re-scored with the candidate on a background thread, and latency and
+label agreement are recorded so the candidate can be compared before it is
+promoted. At most ``ANOMALY_SHADOW_MAX_PENDING`` sampled calls wait for the
+shadow worker; further samples are dropped rather than queued.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import isolation_forest_runtime as runtime
+from isolation_forest_runtime import ModelNotReady
+
+DEFAULT_MODEL = "default"
+MODEL_CACHE_BYTES = int(float(os.getenv("ANOMALY_MODEL_CACHE_MB", "256")) * 1024 * 1024)
+# How long the isolation_forest_config model names are cached
+MODEL_NAMES_TTL = float(os.getenv("ANOMALY_MODEL_NAMES_TTL", "60"))
+SHADOW_MAX_PENDING = int(os.getenv("ANOMALY_SHADOW_MAX_PENDING", "32"))
+
+
+class UnknownModel(LookupError):
+    """Raised for a model name with no isolation_forest_config row and no trained artifact."""
+
+
+def _normalize_name(model_name: Optional[str]) -> Optional[str]:
+    if not model_name or model_name == DEFAULT_MODEL:
+        return None
+    return model_name
+
+
+def validate_model_name(model_name: Optional[str]) -> Optional[str]:
+    """Normalised name (None for the default model); ValueError if it cannot be used as a directory."""
+    name = _normalize_name(model_name)
+    runtime._model_paths(name)
+    return name
+
+
+def _model_nbytes(entry: Dict[str, Any]) -> int:
+    compiled = entry.get("compiled")
+    return int(getattr(compiled, "nbytes", 0) or 0)
+
+
+class ModelRegistry:
+    """Resident named models with LRU eviction, default-model routing and shadow scoring."""
+
+    def __init__(self, memory_budget: int = MODEL_CACHE_BYTES, default_model: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self.default_model = _normalize_name(default_model)
+        self._lock = threading.RLock()
+        self._models: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._evictions = 0
+        self._shadow: Optional[Dict[str, Any]] = None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="if-shadow")
+        self._shadow_pending = 0
+        self._config_names: frozenset = frozenset()
+        self._config_names_expires = 0.0
+        runtime.add_trained_listener(self.reload)
+
+    # ---- model lookup -------------------------------------------------
+
+    def _configured_names(self) -> frozenset:
+        now = time.monotonic()
+        if now >= self._config_names_expires:
+            names = runtime._get_config_model_names()
+            # On a failed read keep the previous names and retry after a short backoff
+            self._config_names_expires = now + (MODEL_NAMES_TTL if names is not None else min(MODEL_NAMES_TTL, 5.0))
+            if names is not None:
+                self._config_names = frozenset(names)
+        return self._config_names
+
+    def require_known(self, model_name: Optional[str]) -> str:
+        """Resolved name of a servable model; UnknownModel unless it is configured or already trained."""
+        name = self.resolve(model_name)
+        normalized = _normalize_name(name)
+        if normalized is None or normalized in self._models:
+            return name
+        _, meta_path, _ = runtime._model_paths(normalized)  # ValueError for unusable names
+        if normalized in self._configured_names() or os.path.exists(meta_path):
+            return name
+        raise UnknownModel(f"Unknown anomaly model '{normalized}'")
+
+    def _entry(self, model_name: Optional[str]) -> Dict[str, Any]:
+        name = _normalize_name(model_name)
+        if name is None:
+            model, meta = runtime.ensure_model_loaded()
+            # compiled=None lets the runtime pick the default model's compiled trees
+            return {"model_name": DEFAULT_MODEL, "model": model, "meta": meta, "compiled": None}
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                entry["last_used"] = time.time()
+                return entry
+        self.require_known(name)
+        model, meta = runtime._load_if_exists(name)
+        if model is None:
+            raise ModelNotReady(f"Model '{name}' is not trained yet; train it via /api/anomaly/models/{name}/train")
+        return self._put(name, model, meta)
+
+    def _put(self, name: str, model, meta: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {
+            "model_name": name,
+            "model": model,
+            "meta": meta,
+            "compiled": runtime._compile(model),
+            "loaded_at": time.time(),
+            "last_used": time.time(),
+        }
+        entry["nbytes"] = _model_nbytes(entry)
+        with self._lock:
+            self._models[name] = entry
+            self._models.move_to_end(name)
+            self._evict(keep=name)
+        return entry
+
+    def _evict(self, keep: str) -> None:
+        total = sum(e["nbytes"] for e in self._models.values())
+        for name in list(self._models):
+            if total <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            total -= self._models.pop(name)["nbytes"]
+            self._evictions += 1
+
+    def reload(self, model_name: str) -> None:
+        """Replace a resident model with its latest artifact (called after training)."""
+        name = _normalize_name(model_name)
+        if name is None:
+            return
+        model, meta = runtime._load_if_exists(name)
+        if model is not None:
+            self._put(name, model, meta)
+
+    def resolve(self, model_name: Optional[str] = None) -> str:
+        """Model name actually used for a request: explicit name, else the promoted default."""
+        return _normalize_name(model_name) or self.default_model or DEFAULT_MODEL
+
+    def promote(self, model_name: str) -> None:
+        """Make ``model_name`` the model used when a request does not pick one."""
+        name = _normalize_name(model_name)
+        if name is not None:
+            self._entry(name)  # must be loadable before it can serve traffic
+        with self._lock:
+            self.default_model = name
+            if self._shadow and _normalize_name(self._shadow["candidate"]) == name:
+                self._shadow = None
+
+    # ---- scoring -------------------------------------------------------
+
+    def score_commands(self, commands: Sequence[str], model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        name = self.resolve(model_name)
+        entry = self._entry(name)
+        started = time.perf_counter()
+        results = runtime.score_with_model(commands, entry["model"], entry["meta"], entry["compiled"])
+        elapsed = time.perf_counter() - started
+        for result in results:
+            result["model_name"] = name
+        shadow = self._shadow
+        if shadow and shadow["primary"] == name and results and random.random() < shadow["sample_rate"]:
+            self._submit_shadow(shadow, list(commands), [r["label"] for r in results], elapsed)
+        return results
+
+    def score_command(self, command: str, model_name: Optional[str] = None) -> Dict[str, Any]:
+        return self.score_commands([command], model_name)[0]
+
+    # ---- shadow scoring -----------------------------------------------
+
+    def set_shadow(self, candidate: str, primary: Optional[str] = None, sample_rate: float = 0.1) -> Dict[str, Any]:
+        candidate = self.resolve(candidate)
+        primary = self.resolve(primary)
+        if candidate == primary:
+            raise ValueError("candidate and primary must be different models")
+        self._entry(candidate)  # fail early if the candidate is unknown or untrained
+        with self._lock:
+            self._shadow = {
+                "candidate": candidate,
+                "primary": primary,
+                "sample_rate": max(0.0, min(1.0, float(sample_rate))),
+                "started_at": time.time(),
+                "calls": 0,
+                "commands": 0,
+                "agreements": 0,
+                "errors": 0,
+                "dropped": 0,
+                "primary_seconds": 0.0,
+                "candidate_seconds": 0.0,
+            }
+        return self.shadow_stats()
+
+    def clear_shadow(self) -> None:
+        with self._lock:
+            self._shadow = None
+
+    def _submit_shadow(self, shadow: Dict[str, Any], commands: List[str], labels: List[str],
+                       primary_elapsed: float) -> None:
+        with self._lock:
+            if self._shadow_pending >= SHADOW_MAX_PENDING:
+                shadow["dropped"] += 1
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._shadow_score, shadow, commands, labels, primary_elapsed)
+
+    def _shadow_score(self, shadow: Dict[str, Any], commands, labels, primary_elapsed: float) -> None:
+        # Runs on the shadow worker; never let the candidate affect the primary result
+        try:
+            entry = self._entry(shadow["candidate"])
+            started = time.perf_counter()
+            candidate = runtime.score_with_model(commands, entry["model"], entry["meta"], entry["compiled"])
+            elapsed = time.perf_counter() - started
+        except Exception:
+            with self._lock:
+                shadow["errors"] += 1
+            return
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+        agreements = sum(1 for label, b in zip(labels, candidate) if label == b["label"])
+        with self._lock:
+            shadow["calls"] += 1
+            shadow["commands"] += len(labels)
+            shadow["agreements"] += agreements
+            shadow["primary_seconds"] += primary_elapsed
+            shadow["candidate_seconds"] += elapsed
+
+    def shadow_stats(self) -> Optional[Dict[str, Any]]:
+        shadow = self._shadow
+        if shadow is None:
+            return None
+        calls = shadow["calls"]
+        return {
+            "candidate": shadow["candidate"],
+            "primary": shadow["primary"],
+            "sample_rate": shadow["sample_rate"],
+            "calls": calls,
+            "commands": shadow["commands"],
+            "errors": shadow["errors"],
+            "dropped": shadow["dropped"],
+            "pending": self._shadow_pending,
+            "label_agreement": round(shadow["agreements"] / shadow["commands"], 4) if shadow["commands"] else None,
+            "primary_avg_ms": round(shadow["primary_seconds"] / calls * 1000.0, 3) if calls else None,
+            "candidate_avg_ms": round(shadow["candidate_seconds"] / calls * 1000.0, 3) if calls else None,
+        }
+
+    # ---- introspection --------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = [
+                {
+                    "model_name": name,
+                    "version": e["meta"].get("version"),
+                    "trained_at": e["meta"].get("trained_at"),
+                    "nbytes": e["nbytes"],
+                    "last_used": e["last_used"],
+                }
+                for name, e in reversed(self._models.items())
+            ]
+        return {
+            "default_model": self.default_model or DEFAULT_MODEL,
+            "active_default_version": runtime._RUNTIME_CACHE.get("version"),
+            "memory_budget_bytes": self.memory_budget,
+            "resident_bytes": sum(m["nbytes"] for m in resident),
+            "resident": resident,
+            "evictions": self._evictions,
+            "shadow": self.shadow_stats(),
+        }
+
+
+model_registry = ModelRegistry(default_model=os.getenv("ANOMALY_DEFAULT_MODEL"))
+
+__all__ = ["DEFAULT_MODEL", "ModelNotReady", "ModelRegistry", "UnknownModel", "model_registry", "validate_model_name"]
@@ -0,0 +1,135 @@
+"""Retraining policy for the Isolation Forest runtime.
+
+Training samples added through the API are recorded here. The policy compares
+them against the active model (whose ``model_meta.json`` stores the last
+training row id and the decision-value distribution of its training set) and
+starts a background retrain when either
+
+* ``ANOMALY_RETRAIN_MIN_SAMPLES`` rows were added since the model was trained, or
+* at least ``ANOMALY_RETRAIN_DRIFT_MIN_SAMPLES`` new rows were seen and their
+  mean decision value moved more than ``ANOMALY_RETRAIN_DRIFT`` training
+  standard deviations away from the training mean.
+
+Automatic retrains are spaced at least ``ANOMALY_RETRAIN_COOLDOWN_SECONDS`` apart.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+import isolation_forest_runtime as runtime
+from anomaly_features import extract_features_matrix
+
+RETRAIN_MIN_SAMPLES = int(os.getenv("ANOMALY_RETRAIN_MIN_SAMPLES", "500"))
+RETRAIN_DRIFT = float(os.getenv("ANOMALY_RETRAIN_DRIFT", "1.0"))
+RETRAIN_DRIFT_MIN_SAMPLES = int(os.getenv("ANOMALY_RETRAIN_DRIFT_MIN_SAMPLES", "50"))
+RETRAIN_COOLDOWN_SECONDS = float(os.getenv("ANOMALY_RETRAIN_COOLDOWN_SECONDS", "300"))
+# Most recent new samples kept for the drift estimate
+DRIFT_WINDOW = int(os.getenv("ANOMALY_RETRAIN_DRIFT_WINDOW", "1000"))
+
+
+class RetrainPolicy:
+    """Track samples added since the active model was trained and decide when to retrain."""
+
+    def __init__(
+        self,
+        min_samples: int = RETRAIN_MIN_SAMPLES,
+        drift_threshold: float = RETRAIN_DRIFT,
+        drift_min_samples: int = RETRAIN_DRIFT_MIN_SAMPLES,
+        cooldown_seconds: float = RETRAIN_COOLDOWN_SECONDS,
+        window: int = DRIFT_WINDOW,
+    ):
+        self.min_samples = min_samples
+        self.drift_threshold = drift_threshold
+        self.drift_min_samples = drift_min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self._model_version: Optional[str] = None
+        self._new_samples = 0
+        self._last_triggered = 0.0
+        self._last_decision: Dict[str, Any] = {}
+
+    def _sync_with_model(self, meta: Dict[str, Any]) -> None:
+        # A new model absorbed everything up to its training_max_id: recount from the database
+        version = meta.get("version")
+        if version == self._model_version:
+            return
+        self._model_version = version
+        self._recent.clear()
+        counted = runtime.count_training_samples_since(meta.get("training_max_id") or 0)
+        self._new_samples = counted if counted is not None else 0
+
+    def drift(self, meta: Dict[str, Any]) -> Optional[float]:
+        """Shift of the recent samples' mean decision value, in training standard deviations."""
+        if not self._recent or meta.get("df_mean") is None:
+            return None
+        model = runtime._RUNTIME_CACHE.get("model")
+        if model is None:
+            return None
+        keyword_counts = runtime._uses_keyword_counts(meta["feature_names"])
+        matrix = extract_features_matrix(list(self._recent), include_keyword_counts=keyword_counts)
+        values = runtime._decision_values(model, matrix)
+        std = float(meta.get("df_std") or 0.0) or 1e-9
+        return abs(float(np.mean(values)) - float(meta["df_mean"])) / std
+
+    def record(self, commands: Iterable[str]) -> Dict[str, Any]:
+        """Record newly inserted training commands and start a retrain if the policy says so."""
+        meta = runtime._RUNTIME_CACHE.get("meta")
+        with self._lock:
+            commands = [c for c in commands if c]
+            if meta is not None:
+                self._sync_with_model(meta)
+            self._new_samples += len(commands)
+            self._recent.extend(commands)
+            decision = self._evaluate(meta)
+            self._last_decision = decision
+        if decision["retrain"]:
+            decision["started"] = runtime.start_training(f"policy: {decision['reason']}")
+        return decision
+
+    def _evaluate(self, meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        decision: Dict[str, Any] = {
+            "retrain": False,
+            "reason": None,
+            "new_samples": self._new_samples,
+            "drift": None,
+            "model_version": self._model_version,
+        }
+        if meta is None:
+            decision["reason"] = "no model loaded"
+            return decision
+        if time.time() - self._last_triggered < self.cooldown_seconds:
+            decision["reason"] = "cooldown"
+            return decision
+        if self._new_samples >= self.min_samples:
+            decision.update(retrain=True, reason=f"{self._new_samples} new samples")
+        elif len(self._recent) >= self.drift_min_samples:
+            drift = self.drift(meta)
+            decision["drift"] = None if drift is None else round(drift, 4)
+            if drift is not None and drift >= self.drift_threshold:
+                decision.update(retrain=True, reason=f"drift {drift:.2f} std")
+        if decision["retrain"]:
+            self._last_triggered = time.time()
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_version": self._model_version,
+            "new_samples": self._new_samples,
+            "recent_window": len(self._recent),
+            "min_samples": self.min_samples,
+            "drift_threshold": self.drift_threshold,
+            "drift_min_samples": self.drift_min_samples,
+            "cooldown_seconds": self.cooldown_seconds,
+            "last_decision": dict(self._last_decision),
+        }
+
+
+retrain_policy = RetrainPolicy()
+
+__all__ = ["RetrainPolicy", "retrain_policy"]
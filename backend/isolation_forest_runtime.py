@@ -7,46 +7,107 @@ main API file stays lean.
 from __future__ import annotations
 import json
 import os
+import re
+import time
 import pickle
+import shutil
 import hashlib
-from typing import Any, Dict, List
+import tempfile
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Sequence, Tuple
 from decimal import Decimal
 import numpy as np
 from datetime import datetime, timezone
 
-import mysql.connector
 from mysql.connector import Error
 
-from anomaly_features import feature_vector, extract_features
-from config import MYSQL_CONFIG as DB_CONFIG
+from anomaly_features import KEYWORD_FEATURE_PREFIX, extract_features, extract_features_matrix, feature_names as _feature_names
+from config import get_db_connection
+from isolation_forest_compiled import ARRAY_FORMAT, CompiledForest, compile_forest
 
 try:
     from sklearn.ensemble import IsolationForest
 except ImportError:  # pragma: no cover
     IsolationForest = None  # type: ignore
 
+# Train new models with the per-keyword count columns appended to the base features.
+# Scoring follows whatever feature set the loaded model was trained with.
+KEYWORD_FEATURES = os.getenv("ANOMALY_KEYWORD_FEATURES", "false").lower() in ("1", "true", "yes")
+
+# Score through flat-array tree traversal instead of sklearn's decision_function
+COMPILED_INFERENCE = os.getenv("ANOMALY_COMPILED_INFERENCE", "true").lower() in ("1", "true", "yes")
+
+# Points in the stored quantile sketch of training decision values
+SCORE_QUANTILES = int(os.getenv("ANOMALY_SCORE_QUANTILES", "101"))
+
+# ANOMALY cut-off for min/max scaled (legacy) models when isolation_forest_config has none
+DEFAULT_THRESHOLD = 0.7
+
+# After a failed training job, scoring requests wait this long before starting another one
+TRAINING_RETRY_BACKOFF = float(os.getenv("ANOMALY_TRAINING_RETRY_BACKOFF", "300"))
+
+# Automatic (startup/initial) training takes MODELS_DIR/TRAINING_LOCK_NAME so only one
+# uvicorn worker trains; a lock older than this, or whose process is gone, is taken over
+TRAINING_LOCK_NAME = "training.lock"
+TRAINING_LOCK_STALE_SECONDS = float(os.getenv("ANOMALY_TRAINING_LOCK_STALE_SECONDS", "3600"))
+
+# Rows per fetchmany() round trip when streaming training data
+TRAINING_FETCH_CHUNK = int(os.getenv("ANOMALY_TRAINING_FETCH_CHUNK", "5000"))
+
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+# Legacy pickle, only read (and migrated) when model_meta.json has no array artifact
 MODEL_PATH = os.path.join(MODELS_DIR, "isolation_forest.pkl")
 META_PATH = os.path.join(MODELS_DIR, "model_meta.json")
+# Tree arrays live in MODELS_DIR/forest-<version>-<suffix>/ and are memory-mapped on load
+FOREST_DIR_PREFIX = "forest-"
+
+# Named models (see isolation_forest_registry) each get MODELS_DIR/registry/<model_name>/
+NAMED_MODELS_SUBDIR = "registry"
+_MODEL_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
 
 _RUNTIME_CACHE: Dict[str, Any] = {
     "model": None,
     "meta": None,
     "version": None,
+    "compiled": None,
+}
+
+# Compiled boosting patterns; refreshed after the TTL or on explicit invalidation
+PATTERN_CACHE_TTL = float(os.getenv("ANOMALY_PATTERN_CACHE_TTL", "300"))
+_PATTERN_CACHE: Dict[str, Any] = {
+    "patterns": None,
+    "expires_at": 0.0,
 }
+_PATTERN_CACHE_LOCK = threading.Lock()
+
+
+def _model_paths(model_name: str = None) -> Tuple[str, str, str]:
+    """(models_dir, meta_path, legacy_pickle_path) for the default model or a named one."""
+    if not model_name:
+        return MODELS_DIR, META_PATH, MODEL_PATH
+    if not _MODEL_NAME_RE.match(model_name) or model_name.startswith("."):
+        raise ValueError(f"Invalid model name: {model_name!r}")
+    models_dir = os.path.join(MODELS_DIR, NAMED_MODELS_SUBDIR, model_name)
+    return models_dir, os.path.join(models_dir, "model_meta.json"), None
 
 
 def _connect():
-    return mysql.connector.connect(**DB_CONFIG)
+    return get_db_connection()
 
 
-def _get_active_config():
+def _get_active_config(model_name: str = None):
     try:
         conn = _connect()
         cur = conn.cursor(dictionary=True)
-        cur.execute(
-            "SELECT * FROM isolation_forest_config WHERE is_active = TRUE ORDER BY updated_at DESC LIMIT 1"
-        )
+        if model_name:
+            cur.execute(
+                "SELECT * FROM isolation_forest_config WHERE model_name = %s LIMIT 1", (model_name,)
+            )
+        else:
+            cur.execute(
+                "SELECT * FROM isolation_forest_config WHERE is_active = TRUE ORDER BY updated_at DESC LIMIT 1"
+            )
         row = cur.fetchone()
         cur.close()
         conn.close()
@@ -56,21 +117,65 @@ def _get_active_config():
         return {}
 
 
-def _get_training_rows():
+def _get_config_model_names():
+    """Every isolation_forest_config.model_name, or None if the database could not be read."""
     try:
         conn = _connect()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT command_pattern FROM isolation_forest_training_data")
-        rows = cur.fetchall()
+        cur = conn.cursor()
+        cur.execute("SELECT model_name FROM isolation_forest_config")
+        names = {row[0] for row in cur.fetchall() if row[0]}
         cur.close()
         conn.close()
-        return rows
+        return names
+    except Error as e:  # pragma: no cover
+        print(f"[IF] Config names fetch error: {e}")
+        return None
+
+
+def _iter_training_rows(chunk_size: int = None):
+    """Yield training rows in chunks of (id, command_pattern) dicts.
+
+    Uses an unbuffered cursor so rows stream from the server instead of being
+    materialised with fetchall().
+    """
+    chunk_size = chunk_size or TRAINING_FETCH_CHUNK
+    try:
+        conn = _connect()
     except Error as e:  # pragma: no cover
         print(f"[IF] Training data fetch error: {e}")
-        return []
+        return
+    try:
+        cur = conn.cursor(dictionary=True, buffered=False)
+        cur.execute("SELECT id, command_pattern FROM isolation_forest_training_data ORDER BY id")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    except Error as e:  # pragma: no cover
+        print(f"[IF] Training data fetch error: {e}")
+    finally:
+        conn.close()
+
+
+def count_training_samples_since(last_id: int):
+    """Number of training rows with id > last_id, or None if the database could not be read."""
+    try:
+        conn = _connect()
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM isolation_forest_training_data WHERE id > %s", (int(last_id or 0),))
+        (count,) = cur.fetchone()
+        cur.close()
+        conn.close()
+        return int(count)
+    except Error as e:  # pragma: no cover
+        print(f"[IF] Training data count error: {e}")
+        return None
 
 
 def _get_feature_patterns():
+    """Active boosting patterns, or None if the database could not be read."""
     try:
         conn = _connect()
         cur = conn.cursor(dictionary=True)
@@ -88,7 +193,44 @@ def _get_feature_patterns():
         return rows
     except Error as e:  # pragma: no cover
         print(f"[IF] Pattern fetch error: {e}")
-        return []
+        return None
+
+
+def _compile_patterns(rows) -> List[Tuple[Any, Dict[str, Any]]]:
+    compiled = []
+    for p in rows:
+        try:
+            compiled.append((re.compile(p["pattern_regex"]), p))
+        except (re.error, TypeError) as e:
+            print(f"[IF] Skipping invalid pattern {p.get('pattern_name')!r}: {e}")
+    return compiled
+
+
+def get_compiled_patterns() -> List[Tuple[Any, Dict[str, Any]]]:
+    """Active boosting patterns as (compiled regex, row) pairs, cached for PATTERN_CACHE_TTL.
+
+    Scoring reads the cache without touching MySQL. After the TTL (or an explicit
+    ``invalidate_pattern_cache``) one caller reloads; if that read fails the
+    previous patterns stay in use until the next attempt.
+    """
+    now = time.monotonic()
+    if _PATTERN_CACHE["patterns"] is not None and now < _PATTERN_CACHE["expires_at"]:
+        return _PATTERN_CACHE["patterns"]
+    with _PATTERN_CACHE_LOCK:
+        if _PATTERN_CACHE["patterns"] is not None and now < _PATTERN_CACHE["expires_at"]:
+            return _PATTERN_CACHE["patterns"]
+        rows = _get_feature_patterns()
+        if rows is None:
+            # Keep serving what we have; retry after a short backoff instead of every call
+            _PATTERN_CACHE["expires_at"] = now + min(PATTERN_CACHE_TTL, 5.0)
+            return _PATTERN_CACHE["patterns"] or []
+        _PATTERN_CACHE.update({"patterns": _compile_patterns(rows), "expires_at": now + PATTERN_CACHE_TTL})
+        return _PATTERN_CACHE["patterns"]
+
+
+def invalidate_pattern_cache():
+    """Force the next scoring call to re-read anomaly_feature_patterns."""
+    _PATTERN_CACHE["expires_at"] = 0.0
 
 
 def _coerce_primitive(v: Any) -> Any:
@@ -104,7 +246,7 @@ def _coerce_primitive(v: Any) -> Any:
 
 def _hash_config(config: Dict[str, Any], feature_names: List[str], sample_count: int) -> str:
     h = hashlib.sha256()
-    cfg_subset = {k: _coerce_primitive(config.get(k)) for k in ["n_trees", "contamination", "sample_size", "max_depth", "threshold"]}
+    cfg_subset = {k: _coerce_primitive(config.get(k)) for k in ["n_trees", "contamination", "sample_size", "max_depth", "threshold", "percentile_threshold"]}
     payload = json.dumps({
         "config": cfg_subset,
         "features": feature_names,
@@ -114,31 +256,39 @@ def _hash_config(config: Dict[str, Any], feature_names: List[str], sample_count:
     return h.hexdigest()[:8]
 
 
-def _train_model():
+def _fit_model(progress=None, model_name: str = None):
+    """Fit a model from the database; returns (model, meta) without touching disk or the cache."""
     if IsolationForest is None:
         raise RuntimeError("scikit-learn not installed; cannot train model")
-
-    config = _get_active_config()
-    rows = _get_training_rows()
-
-    feature_rows: List[List[float]] = []
-    feature_names: List[str] = []
-    for r in rows:
-        names, vec = feature_vector(r["command_pattern"])
-        if not feature_names:
-            feature_names = names
-        feature_rows.append(vec)
-
-    if not feature_rows:
+    report = progress or (lambda stage, pct: None)
+
+    report("loading_data", 0.05)
+    config = _get_active_config(model_name)
+
+    # Rows stream in chunks and are featurised per chunk, so only the numeric
+    # matrix (not every command string) is held in memory.
+    report("extracting_features", 0.1)
+    feature_names = _feature_names(KEYWORD_FEATURES)
+    blocks = []
+    sample_count = 0
+    max_id = 0
+    for rows in _iter_training_rows():
+        blocks.append(extract_features_matrix(
+            [r["command_pattern"] for r in rows], include_keyword_counts=KEYWORD_FEATURES
+        ))
+        sample_count += len(rows)
+        max_id = max(max_id, max(int(r.get("id") or 0) for r in rows))
+    if not blocks:
         # Fallback: train on a trivial benign baseline of empty command to avoid crashes.
-        names, vec = feature_vector("")
-        feature_names = names
-        feature_rows.append(vec)
+        blocks.append(extract_features_matrix([""], include_keyword_counts=KEYWORD_FEATURES))
+    feature_rows = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+    del blocks
 
     contamination = float(config.get("contamination") or 0.1)
     n_estimators = int(config.get("n_trees") or 100)
     max_samples = config.get("sample_size") or min(256, len(feature_rows))
 
+    report("fitting", 0.45)
     model = IsolationForest(
         n_estimators=n_estimators,
         contamination=contamination,
@@ -148,9 +298,12 @@ def _train_model():
     model.fit(feature_rows)
 
     # Collect decision function distribution for normalization
+    report("calibrating", 0.8)
     decision_vals = model.decision_function(feature_rows)
-    min_df = float(min(decision_vals))
-    max_df = float(max(decision_vals))
+    min_df = float(decision_vals.min())
+    max_df = float(decision_vals.max())
+    # Quantile sketch of the training scores; scoring maps a decision value to its percentile
+    quantiles = np.quantile(decision_vals, np.linspace(0.0, 1.0, SCORE_QUANTILES))
 
     version = _hash_config(config, feature_names, len(feature_rows))
     meta = {
@@ -159,45 +312,430 @@ def _train_model():
         "max_df": max_df,
         "trained_at": datetime.now(timezone.utc).isoformat(),
         "version": version,
+        "model_name": model_name,
+        "training_samples": sample_count,
+        # Retraining policy baseline: rows after this id are new to the model
+        "training_max_id": max_id,
+        "df_mean": float(decision_vals.mean()),
+        "df_std": float(decision_vals.std()),
+        "df_quantiles": quantiles,
         "config": {k: _coerce_primitive(v) for k, v in (config or {}).items()},
     }
+    _calibrate_threshold(meta)
+    return model, meta
 
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    with open(MODEL_PATH, "wb") as f:
-        pickle.dump(model, f)
-    with open(META_PATH, "w") as f:
-        json.dump(meta, f, indent=2, default=str)
 
-    _RUNTIME_CACHE.update({"model": model, "meta": meta, "version": version})
+def _atomic_write(path: str, mode: str, write) -> None:
+    """Write through a temp file in the same directory and rename it into place."""
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_forest_arrays(forest: CompiledForest, version: str, models_dir: str) -> str:
+    """Save ``forest`` into a fresh directory under ``models_dir``; returns the directory name."""
+    directory = tempfile.mkdtemp(prefix=f"{FOREST_DIR_PREFIX}{version}-", dir=models_dir)
+    forest.save(directory)
+    return os.path.basename(directory)
+
+
+def _prune_forest_dirs(models_dir: str, keep: str) -> None:
+    # Keep the active artifact and the one before it (a worker may still be switching over)
+    try:
+        dirs = [
+            os.path.join(models_dir, d) for d in os.listdir(models_dir)
+            if d.startswith(FOREST_DIR_PREFIX) and d != keep
+        ]
+        dirs.sort(key=os.path.getmtime, reverse=True)
+        for stale in dirs[1:]:
+            shutil.rmtree(stale, ignore_errors=True)
+    except OSError as e:  # pragma: no cover
+        print(f"[WARN] Failed to prune old model artifacts: {e}")
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _write_artifacts(model, meta, model_name: str = None) -> None:
+    """Persist the model as memory-mappable tree arrays referenced from model_meta.json."""
+    models_dir, meta_path, _ = _model_paths(model_name)
+    os.makedirs(models_dir, exist_ok=True)
+    forest = model if isinstance(model, CompiledForest) else compile_forest(model)
+    directory = _write_forest_arrays(forest, meta.get("version") or "model", models_dir)
+    meta["artifact"] = {"format": ARRAY_FORMAT, "path": directory}
+    # Arrays first, meta last: a reader that sees the new meta also sees the new model
+    _atomic_write(meta_path, "w", lambda f: json.dump(meta, f, indent=2, default=_json_default))
+    _prune_forest_dirs(models_dir, keep=directory)
+
+
+def _install(model, meta) -> None:
+    compiled = _compile(model)
+    # Single update so scorers never see a model paired with another model's compiled trees
+    _RUNTIME_CACHE.update({
+        "model": model,
+        "meta": meta,
+        "version": meta.get("version"),
+        "compiled": compiled,
+    })
+
+
+def _train_model():
+    model, meta = _fit_model()
+    _write_artifacts(model, meta)
+    _install(model, meta)
     return model, meta
 
 
-def _load_if_exists():
-    if not (os.path.exists(MODEL_PATH) and os.path.exists(META_PATH)):
+def _load_legacy_pickle(meta):
+    """Load a pre-array pickle and rewrite it in the array format for the next start."""
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+    try:
+        _write_artifacts(model, meta)
+        print(f"[IF] Migrated pickled model {meta.get('version')} to {meta['artifact']['path']}")
+    except Exception as e:  # pragma: no cover
+        print(f"[WARN] Could not migrate pickled model to array format: {e}")
+    return model
+
+
+def _load_if_exists(model_name: str = None):
+    models_dir, meta_path, pickle_path = _model_paths(model_name)
+    if not os.path.exists(meta_path):
         return None, None
     try:
-        with open(MODEL_PATH, "rb") as f:
-            model = pickle.load(f)
-        with open(META_PATH) as f:
+        with open(meta_path) as f:
             meta = json.load(f)
+        if meta.get("df_quantiles"):
+            meta["df_quantiles"] = np.asarray(meta["df_quantiles"], dtype=np.float64)
+        # Recomputed from the stored config so older files pick up the current threshold semantics
+        _calibrate_threshold(meta)
+        artifact = meta.get("artifact") or {}
+        if artifact.get("path"):
+            model = CompiledForest.load(os.path.join(models_dir, artifact["path"]))
+        elif pickle_path and os.path.exists(pickle_path):
+            model = _load_legacy_pickle(meta)
+        else:
+            return None, None
         return model, meta
     except Exception as e:  # pragma: no cover
         print(f"[IF] Failed to load existing model: {e}")
         return None, None
 
 
+# ---------------------------------------------------------------------------
+# Background training
+# ---------------------------------------------------------------------------
+
+class ModelNotReady(RuntimeError):
+    """Raised instead of blocking when a model has no artifact yet and training has not finished."""
+
+
+_TRAINING_LOCK = threading.Lock()
+# Serializes automatic starts within this process; the lock file covers other workers
+_AUTO_TRAINING_LOCK = threading.Lock()
+_TRAINING_DONE = threading.Event()
+_TRAINING_DONE.set()
+_TRAINING_STATUS: Dict[str, Any] = {
+    "state": "idle",          # idle | running | succeeded | failed
+    "job_id": 0,
+    "reason": None,
+    "stage": None,
+    "progress": 0.0,
+    "started_at": None,
+    "finished_at": None,
+    "last_duration_seconds": None,
+    "last_error": None,
+    "model_version": None,
+    "model_name": None,
+}
+# Called with the model name after a named model finished training (the registry reloads it)
+_TRAINED_LISTENERS: List[Any] = []
+
+
+def add_trained_listener(callback) -> None:
+    _TRAINED_LISTENERS.append(callback)
+
+
+def _training_process(queue, models_dir: str, model_path: str, meta_path: str, model_name: str = None) -> None:
+    """Entry point of the training child process; reports over ``queue``."""
+    global MODELS_DIR, MODEL_PATH, META_PATH
+    MODELS_DIR, MODEL_PATH, META_PATH = models_dir, model_path, meta_path
+    try:
+        model, meta = _fit_model(lambda stage, pct: queue.put(("progress", stage, pct)), model_name)
+        queue.put(("progress", "writing", 0.95))
+        _write_artifacts(model, meta, model_name)
+        queue.put(("done", meta.get("version")))
+    except BaseException as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def _watch_training(proc, queue, job_id: int, model_name: str = None) -> None:
+    outcome = ("error", "training process exited without reporting a result")
+    while True:
+        try:
+            msg = queue.get(timeout=1.0)
+        except Exception:  # queue.Empty
+            if not proc.is_alive():
+                break
+            continue
+        if msg[0] == "progress":
+            _TRAINING_STATUS.update({"stage": msg[1], "progress": float(msg[2])})
+            continue
+        outcome = msg
+        break
+    proc.join(timeout=10)
+
+    if outcome[0] == "done":
+        model, meta = _load_if_exists(model_name)
+        if model is None:
+            outcome = ("error", "trained model could not be loaded")
+        elif model_name:
+            outcome = ("done", meta.get("version"))
+            for callback in _TRAINED_LISTENERS:
+                try:
+                    callback(model_name)
+                except Exception as e:  # pragma: no cover
+                    print(f"[WARN] trained-model listener failed: {e}")
+        else:
+            _install(model, meta)
+            outcome = ("done", meta.get("version"))
+    _finish_training(job_id, outcome)
+
+
+def _finish_training(job_id: int, outcome: Tuple[str, Any]) -> None:
+    finished = time.time()
+    started = _TRAINING_STATUS.get("_started_monotonic") or finished
+    ok = outcome[0] == "done"
+    _release_training_lock(_TRAINING_STATUS.pop("_lock_path", None))
+    _TRAINING_STATUS.update({
+        "_finished_monotonic": time.monotonic(),
+        "state": "succeeded" if ok else "failed",
+        "stage": None,
+        "progress": 1.0 if ok else _TRAINING_STATUS.get("progress", 0.0),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "last_duration_seconds": round(finished - started, 3),
+        "last_error": None if ok else outcome[1],
+        "model_version": outcome[1] if ok else _TRAINING_STATUS.get("model_version"),
+    })
+    if ok:
+        print(f"[IF] Training job {job_id} finished: model {outcome[1]}")
+    else:
+        print(f"[WARN] Training job {job_id} failed: {outcome[1]}")
+    _TRAINING_DONE.set()
+
+
+def start_training(reason: str = "manual", model_name: str = None) -> bool:
+    """Retrain in a separate process; the new model is swapped in when it finishes.
+
+    ``model_name`` selects a named ``isolation_forest_config`` row and trains
+    into that model's registry directory instead of the default model.
+    Returns False if a job is already running. Scoring keeps using the current
+    model until the swap.
+    """
+    _model_paths(model_name)  # validate the name before spawning anything
+    with _TRAINING_LOCK:
+        if _TRAINING_STATUS["state"] == "running":
+            return False
+        job_id = _TRAINING_STATUS["job_id"] + 1
+        _TRAINING_DONE.clear()
+        _TRAINING_STATUS.update({
+            "state": "running",
+            "job_id": job_id,
+            "reason": reason,
+            "model_name": model_name,
+            "stage": "starting",
+            "progress": 0.0,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "_started_monotonic": time.time(),
+        })
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        proc = ctx.Process(
+            target=_training_process,
+            args=(queue, MODELS_DIR, MODEL_PATH, META_PATH, model_name),
+            name=f"if-training-{job_id}",
+            daemon=True,
+        )
+        proc.start()
+    except Exception as e:  # pragma: no cover - platform without process support
+        _finish_training(job_id, ("error", f"could not start training process: {e}"))
+        return False
+    threading.Thread(
+        target=_watch_training, args=(proc, queue, job_id, model_name), name=f"if-training-watch-{job_id}", daemon=True
+    ).start()
+    return True
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # exists but owned by someone else
+        return True
+    return True
+
+
+def _acquire_training_lock():
+    """Path of the newly created lock file, or None if another live process holds it."""
+    path = os.path.join(MODELS_DIR, TRAINING_LOCK_NAME)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as f:
+                    pid = int(f.read().strip() or 0)
+                age = time.time() - os.path.getmtime(path)
+            except (OSError, ValueError):
+                pid, age = 0, 0.0
+            if pid and pid != os.getpid() and _pid_alive(pid) and age < TRAINING_LOCK_STALE_SECONDS:
+                return None
+            print(f"[IF] Taking over stale training lock (pid {pid or '?'})")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return path
+    return None
+
+
+def _release_training_lock(path) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _retry_backoff_remaining() -> float:
+    """Seconds until a failed job may be retried automatically (0 when not backing off)."""
+    if _TRAINING_STATUS["state"] != "failed":
+        return 0.0
+    finished = _TRAINING_STATUS.get("_finished_monotonic")
+    if finished is None:
+        return 0.0
+    return max(0.0, TRAINING_RETRY_BACKOFF - (time.monotonic() - finished))
+
+
+def _start_auto_training(reason: str) -> bool:
+    """Train the default model unless a recent failure, a running job or another worker says wait."""
+    with _AUTO_TRAINING_LOCK:
+        if _TRAINING_STATUS["state"] == "running" or _retry_backoff_remaining() > 0:
+            return False
+        lock_path = _acquire_training_lock()
+        if lock_path is None:
+            return False
+        # _finish_training removes the lock file when the job ends
+        _TRAINING_STATUS["_lock_path"] = lock_path
+        if not start_training(reason):
+            _release_training_lock(_TRAINING_STATUS.pop("_lock_path", None))
+            return False
+        return True
+
+
+def training_status() -> Dict[str, Any]:
+    status = {k: v for k, v in _TRAINING_STATUS.items() if not k.startswith("_")}
+    status["active_model_version"] = _RUNTIME_CACHE.get("version")
+    return status
+
+
+def wait_for_training(timeout: float = None) -> bool:
+    return _TRAINING_DONE.wait(timeout)
+
+
+def preload_model() -> None:
+    """Load the model from disk at startup, or start training it in the background."""
+    if _RUNTIME_CACHE["model"] is not None:
+        return
+    model, meta = _load_if_exists()
+    if model is not None:
+        _install(model, meta)
+    elif not _start_auto_training("startup"):
+        print("[IF] No model on disk; another worker is training it")
+
+
 def ensure_model_loaded():
+    """Default model and meta; raises ModelNotReady rather than waiting for a training job.
+
+    Callers (and the single-worker score batcher) return 503 straight away and
+    the watcher thread swaps the model in once training finishes. A failed job
+    is retried after ``TRAINING_RETRY_BACKOFF`` seconds, and only by the worker
+    holding the training lock file.
+    """
     if _RUNTIME_CACHE["model"] is not None:
         return _RUNTIME_CACHE["model"], _RUNTIME_CACHE["meta"]
     model, meta = _load_if_exists()
-    if model is None:
-        model, meta = _train_model()
-    _RUNTIME_CACHE.update({"model": model, "meta": meta, "version": meta.get("version")})
-    return model, meta
+    if model is not None:
+        _install(model, meta)
+        return model, meta
+    # No model on disk yet: start (or join) a background job and let the caller retry.
+    # After a failure, wait out the backoff instead of spawning a process per request.
+    _start_auto_training("initial")
+    if _TRAINING_STATUS["state"] == "running":
+        raise ModelNotReady(f"Anomaly model is being trained ({_TRAINING_STATUS.get('stage') or 'starting'}); retry shortly")
+    backoff = _retry_backoff_remaining()
+    if backoff > 0:
+        raise ModelNotReady(
+            f"Model not available: {_TRAINING_STATUS.get('last_error')}; training is retried in {int(backoff) + 1}s"
+        )
+    if os.path.exists(os.path.join(MODELS_DIR, TRAINING_LOCK_NAME)):
+        raise ModelNotReady("Anomaly model is being trained by another worker; retry shortly")
+    raise ModelNotReady(f"Model not available: {_TRAINING_STATUS.get('last_error') or 'training did not start'}")
+
+
+def _compile(model):
+    if isinstance(model, CompiledForest):
+        return model
+    if not COMPILED_INFERENCE:
+        return None
+    try:
+        return compile_forest(model)
+    except Exception as e:  # pragma: no cover - unexpected estimator layout
+        print(f"[WARN] Compiled inference unavailable, using sklearn: {e}")
+        return None
+
+
+def _decision_values(model, matrix, compiled=None) -> np.ndarray:
+    if compiled is None and _RUNTIME_CACHE.get("model") is model:
+        compiled = _RUNTIME_CACHE.get("compiled")
+    if compiled is not None:
+        return compiled.decision_function(matrix)
+    return model.decision_function(matrix)
 
 
 def _normalize_score(df_val: float, meta: Dict[str, Any]) -> float:
-    # Higher decision_function -> more normal; invert & normalize to [0,1]
+    """Anomaly score in [0, 1]: share of training rows that looked more normal than ``df_val``.
+
+    Uses the stored quantile sketch (binary search + linear interpolation), so
+    a threshold of 0.9 means "more anomalous than 90% of the training data"
+    whatever the spread of a particular retrain. Models trained before the
+    sketch existed fall back to min/max scaling.
+    """
+    quantiles = meta.get("df_quantiles")
+    if quantiles is not None and len(quantiles) > 1:
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        probs = _quantile_probs(len(quantiles))
+        # Higher decision_function -> more normal
+        return float(max(0.0, min(1.0, 1.0 - np.interp(df_val, quantiles, probs))))
     min_df = meta["min_df"]
     max_df = meta["max_df"]
     inverted = max_df - df_val
@@ -205,62 +743,83 @@ def _normalize_score(df_val: float, meta: Dict[str, Any]) -> float:
     return max(0.0, min(1.0, inverted / denom))
 
 
-def score_command(command: str) -> Dict[str, Any]:
-    model, meta = ensure_model_loaded()
-    feature_names = meta["feature_names"]
+def _calibrate_threshold(meta: Dict[str, Any]) -> None:
+    """Record in ``meta`` the score scale and the ANOMALY threshold expressed on it.
+
+    Quantile-scaled models compare against ``percentile_threshold``: 0.9 flags
+    commands more anomalous than 90% of the training data. Without one it
+    defaults to ``1 - contamination``, the share of training data the forest
+    was told is anomalous. Min/max scaled models keep the ``threshold`` column.
+    """
+    config = meta.get("config") or {}
+    quantiles = meta.get("df_quantiles")
+    if quantiles is None or len(quantiles) < 2:
+        meta.update({"score_scale": "minmax", "threshold": float(config.get("threshold") or DEFAULT_THRESHOLD)})
+        return
+    percentile = config.get("percentile_threshold")
+    if percentile is None:
+        percentile = 1.0 - float(config.get("contamination") or 0.1)
+    meta.update({"score_scale": "quantile", "threshold": max(0.0, min(1.0, float(percentile)))})
+
+
+_QUANTILE_PROBS: Dict[int, np.ndarray] = {}
+
+
+def _quantile_probs(n: int) -> np.ndarray:
+    probs = _QUANTILE_PROBS.get(n)
+    if probs is None:
+        probs = _QUANTILE_PROBS.setdefault(n, np.linspace(0.0, 1.0, n))
+    return probs
+
 
-    _, vec = feature_vector(command)
-    df_val = model.decision_function([vec])[0]
+def _pure(v):
+    if isinstance(v, (np.floating,)):
+        return float(v)
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+def _uses_keyword_counts(feature_names: List[str]) -> bool:
+    return any(name.startswith(KEYWORD_FEATURE_PREFIX) for name in feature_names)
+
+
+def _score_result(command: str, features: Dict[str, float], df_val: float, meta: Dict[str, Any],
+                  patterns: List[Tuple[Any, Dict[str, Any]]], timestamp: str) -> Dict[str, Any]:
+    """Turn a raw decision_function value into the API result (boosting, label, explanation)."""
     base_score = _normalize_score(df_val, meta)
 
     # Boosting patterns
-    patterns = _get_feature_patterns()
     matched = []
     total_boost = 0.0
-    for p in patterns:
-        try:
-            import re
-            if re.search(p["pattern_regex"], command):
-                matched.append({
-                    "name": p["pattern_name"],
-                    "severity": p["severity"],
-                    "boost_value": p["boost_value"],
-                })
-                total_boost += float(p["boost_value"] or 0.0)
-        except re.error:
-            continue
+    for regex, p in patterns:
+        if regex.search(command):
+            matched.append({
+                "name": p["pattern_name"],
+                "severity": p["severity"],
+                "boost_value": _pure(p["boost_value"]),
+            })
+            total_boost += float(p["boost_value"] or 0.0)
 
     boost_component = min(0.25, 0.02 * total_boost)
     boosted_score = min(1.0, base_score + boost_component)
 
-    threshold = float(meta.get("config", {}).get("threshold") or 0.7)
+    threshold = meta.get("threshold")
+    if threshold is None:
+        threshold = float(meta.get("config", {}).get("threshold") or DEFAULT_THRESHOLD)
     label = "ANOMALY" if boosted_score >= threshold else "NORMAL"
 
-    features = extract_features(command)
     explanation_parts = []
     if boost_component > 0 and matched:
         explanation_parts.append("patterns: " + ", ".join(m["name"] for m in matched))
-    if features["special_chars_count"] > 4:
+    if features.get("special_chars_count", 0) > 4:
         explanation_parts.append("high special char density")
-    if features["entropy"] > 4.0:
+    if features.get("entropy", 0) > 4.0:
         explanation_parts.append("elevated entropy")
     explanation = ", ".join(explanation_parts) or "baseline characteristics"
 
-    def _pure(v):
-        if isinstance(v, (np.floating,)):
-            return float(v)
-        if isinstance(v, (np.integer,)):
-            return int(v)
-        if isinstance(v, Decimal):
-            return float(v)
-        return v
-
-    # Clean matched pattern boost values
-    for m in matched:
-        m['boost_value'] = _pure(m.get('boost_value'))
-
-    clean_features = {k: _pure(v) for k, v in features.items()}
-
     return {
         "label": label,
         "base_score": _pure(base_score),
@@ -268,10 +827,70 @@ def score_command(command: str) -> Dict[str, Any]:
         "threshold": _pure(threshold),
         "model_version": meta.get("version"),
         "matched_patterns": matched,
-        "features": clean_features,
+        "features": {k: _pure(v) for k, v in features.items()},
         "explanation": explanation,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": timestamp,
     }
 
 
-__all__ = ["score_command", "ensure_model_loaded"]
+def score_command(command: str) -> Dict[str, Any]:
+    model, meta = ensure_model_loaded()
+    feature_names = meta["feature_names"]
+
+    # Features are extracted once and serve both the model input and the explanation
+    features = extract_features(command, include_keyword_counts=_uses_keyword_counts(feature_names))
+    vec = [features[name] for name in feature_names]
+    df_val = _decision_values(model, [vec])[0]
+    return _score_result(
+        command, features, df_val, meta, get_compiled_patterns(), datetime.now(timezone.utc).isoformat()
+    )
+
+
+def score_commands(commands: Sequence[str]) -> List[Dict[str, Any]]:
+    """Score many commands with one feature matrix and one model evaluation.
+
+    Results are in input order and have the same shape as ``score_command``.
+    sklearn's per-call validation and per-tree dispatch dominate single-row
+    scoring, so this is the path for replay and grading jobs.
+    """
+    commands = [c or "" for c in commands]
+    if not commands:
+        return []
+    model, meta = ensure_model_loaded()
+    return score_with_model(commands, model, meta)
+
+
+def score_with_model(commands: Sequence[str], model, meta: Dict[str, Any], compiled=None) -> List[Dict[str, Any]]:
+    """``score_commands`` against an explicit model (used by the multi-model registry)."""
+    commands = [c or "" for c in commands]
+    if not commands:
+        return []
+    feature_names = meta["feature_names"]
+    keyword_counts = _uses_keyword_counts(feature_names)
+    matrix = extract_features_matrix(commands, include_keyword_counts=keyword_counts)
+    column_names = _feature_names(keyword_counts)
+    if column_names != feature_names:
+        matrix = matrix[:, [column_names.index(name) for name in feature_names]]
+    df_vals = _decision_values(model, matrix, compiled)
+    patterns = get_compiled_patterns()
+    timestamp = datetime.now(timezone.utc).isoformat()
+    return [
+        _score_result(command, dict(zip(feature_names, row)), float(df_val), meta, patterns, timestamp)
+        for command, row, df_val in zip(commands, matrix.tolist(), df_vals)
+    ]
+
+
+__all__ = [
+    "ModelNotReady",
+    "score_command",
+    "score_commands",
+    "score_with_model",
+    "add_trained_listener",
+    "ensure_model_loaded",
+    "get_compiled_patterns",
+    "invalidate_pattern_cache",
+    "preload_model",
+    "start_training",
+    "training_status",
+    "wait_for_training",
+]
@@ -4,6 +4,8 @@ import asyncio
 import logging
 from auth import decode_token
 from config import get_db_connection
+from async_db import run_db, db_execute
+from db_schema import schema_once
 
 router = APIRouter()
 
@@ -12,42 +14,47 @@ lobbies: Dict[str, Dict] = {}
 lobby_connections: Dict[str, List[WebSocket]] = {}
 
 
+@schema_once
+def _create_tables():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS lobbies (
+          code VARCHAR(32) PRIMARY KEY,
+          difficulty VARCHAR(32) DEFAULT 'Beginner',
+          created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+          created_by INT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    # Backfill column on existing deployments (ignore if already present)
+    try:
+        cur.execute("ALTER TABLE lobbies ADD COLUMN created_by INT NULL")
+    except Exception:
+        pass
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS lobby_participants (
+          id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+          code VARCHAR(32) NOT NULL,
+          name VARCHAR(255) NOT NULL,
+          role VARCHAR(32) NOT NULL,
+          ready TINYINT(1) DEFAULT 0,
+          joined_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+          UNIQUE KEY uniq_code_name (code, name),
+          KEY idx_code (code)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    conn.commit()
+    cur.close(); conn.close()
+
+
 def ensure_tables():
     """Create minimal persistence so lobbies work across devices/instances."""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS lobbies (
-              code VARCHAR(32) PRIMARY KEY,
-              difficulty VARCHAR(32) DEFAULT 'Beginner',
-              created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
-              created_by INT NULL
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-        )
-        # Backfill column on existing deployments (ignore if already present)
-        try:
-            cur.execute("ALTER TABLE lobbies ADD COLUMN created_by INT NULL")
-        except Exception:
-            pass
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS lobby_participants (
-              id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
-              code VARCHAR(32) NOT NULL,
-              name VARCHAR(255) NOT NULL,
-              role VARCHAR(32) NOT NULL,
-              ready TINYINT(1) DEFAULT 0,
-              joined_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
-              UNIQUE KEY uniq_code_name (code, name),
-              KEY idx_code (code)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-        )
-        conn.commit()
-        cur.close(); conn.close()
+        _create_tables()
     except Exception as e:
         try:
             logging.error(f"[lobby_ws] ensure_tables error: {e}")
@@ -55,20 +62,32 @@ def ensure_tables():
             pass
 
 
-def hydrate_lobby_from_db(lobby_code: str) -> bool:
-    """Load a lobby definition and participants from DB into memory if present."""
+def _load_lobby_from_db(lobby_code: str):
+    """Blocking read of a lobby definition and its participants; None if the lobby is unknown."""
+    conn = get_db_connection(); cur = conn.cursor(dictionary=True)
     try:
-        conn = get_db_connection(); cur = conn.cursor(dictionary=True)
         cur.execute("SELECT code, difficulty, created_by FROM lobbies WHERE code=%s", (lobby_code,))
         row = cur.fetchone()
         if not row:
-            cur.close(); conn.close(); return False
-        # Create in-memory lobby
-        lobbies[lobby_code] = {"participants": [], "chat": [], "difficulty": row.get("difficulty") or "Beginner", "created_by": row.get("created_by")}
+            return None
+        lobby = {"participants": [], "chat": [], "difficulty": row.get("difficulty") or "Beginner", "created_by": row.get("created_by")}
         cur.execute("SELECT name, role, ready FROM lobby_participants WHERE code=%s ORDER BY joined_at ASC", (lobby_code,))
         for p in cur.fetchall() or []:
-            lobbies[lobby_code]["participants"].append({"name": p["name"], "role": p["role"], "ready": bool(p["ready"])})
-        cur.close(); conn.close(); return True
+            lobby["participants"].append({"name": p["name"], "role": p["role"], "ready": bool(p["ready"])})
+        return lobby
+    finally:
+        cur.close(); conn.close()
+
+
+async def hydrate_lobby_from_db(lobby_code: str) -> bool:
+    """Load a lobby definition and participants from DB into memory if present."""
+    try:
+        lobby = await run_db(_load_lobby_from_db, lobby_code, label="lobby.hydrate")
+        if lobby is None:
+            return False
+        # Assigned on the event loop so in-memory lobby state is only touched from one thread
+        lobbies.setdefault(lobby_code, lobby)
+        return True
     except Exception as e:
         try:
             logging.error(f"[lobby_ws] hydrate error for {lobby_code}: {e}")
@@ -76,6 +95,91 @@ def hydrate_lobby_from_db(lobby_code: str) -> bool:
             pass
         return False
 
+
+@schema_once
+def _ensure_simulation_room_tables(cursor):
+    # Defensive table creation (idempotent)
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS simulation_rooms (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            instructor_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            code VARCHAR(32) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS simulation_room_members (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            room_id INT NOT NULL,
+            student_id INT NOT NULL,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uniq_room_member (room_id, student_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+
+
+def _persist_participant_join(lobby_code: str, name: str, role: str, user_id):
+    """Blocking part of a lobby join (participant row + simulation room membership); runs on the DB pool."""
+    # Persist participant join
+    try:
+        ensure_tables()
+        conn = get_db_connection(); cur = conn.cursor()
+        cur.execute("INSERT INTO lobby_participants (code, name, role, ready) VALUES (%s,%s,%s,%s) ON DUPLICATE KEY UPDATE role=VALUES(role), ready=VALUES(ready)", (lobby_code, name, role, 0))
+        conn.commit(); cur.close(); conn.close()
+    except Exception as e:
+        try: logging.error(f"[lobby_ws] persist join failed: {e}")
+        except Exception: pass
+    # If the joining participant is a student, also add them to simulation_room_members
+    try:
+        if (role or '').lower() == 'student' and user_id:
+            conn2 = get_db_connection()
+            cur2 = conn2.cursor()
+            try:
+                _ensure_simulation_room_tables(cur2)
+            # Find room id; do NOT auto-create a canonical simulation_rooms row here.
+                # Creating simulation_rooms during lobby joins caused duplicate/extra
+                # room records when backends restarted or clients reconnected.
+                cur2.execute('SELECT id FROM simulation_rooms WHERE code=%s LIMIT 1', (lobby_code,))
+                rr = cur2.fetchone()
+                if not rr:
+                    try:
+                        # Best-effort info for operators; skip creating a simulation_rooms row.
+                        try:
+                            logging.warning(f"[lobby_ws] simulation_rooms row not found for code={lobby_code}; skipping member persistence")
+                        except Exception:
+                            pass
+                        rr = None
+                    except Exception:
+                        rr = None
+                if rr:
+                    try:
+                        room_id = int(rr[0])
+                    except Exception:
+                        try:
+                            room_id = int(rr.get('id'))
+                        except Exception:
+                            room_id = None
+                    if room_id:
+                        cur2.execute('INSERT IGNORE INTO simulation_room_members (room_id, student_id) VALUES (%s, %s)', (room_id, user_id))
+                        conn2.commit()
+            except Exception:
+                try:
+                    conn2.rollback()
+                except Exception:
+                    pass
+            finally:
+                try:
+                    cur2.close(); conn2.close()
+                except Exception:
+                    pass
+    except Exception:
+        pass
+
 @router.websocket("/ws/lobby/{lobby_code}")
 async def lobby_websocket(websocket: WebSocket, lobby_code: str):
     # Debug: log connection attempt
@@ -114,8 +218,8 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
     await websocket.accept()
     # Only allow joining if lobby exists (created by instructor). If not in memory, try DB.
     if lobby_code not in lobbies:
-        ensure_tables()
-        hydrated = hydrate_lobby_from_db(lobby_code)
+        await run_db(ensure_tables, label="lobby.ensure_tables")
+        hydrated = await hydrate_lobby_from_db(lobby_code)
         if not hydrated:
             try:
                 logging.warning(f"[lobby_ws] WS denied: lobby code not found: {lobby_code}")
@@ -140,87 +244,13 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
                 # Prevent duplicate participants
                 if not any(p["name"] == payload["name"] for p in lobby["participants"]):
                     lobby["participants"].append(participant)
-                    # Persist participant join
-                    try:
-                        ensure_tables()
-                        conn = get_db_connection(); cur = conn.cursor()
-                        cur.execute("INSERT INTO lobby_participants (code, name, role, ready) VALUES (%s,%s,%s,%s) ON DUPLICATE KEY UPDATE role=VALUES(role), ready=VALUES(ready)", (lobby_code, payload["name"], payload["role"], 0))
-                        conn.commit(); cur.close(); conn.close()
-                    except Exception as e:
-                        try: logging.error(f"[lobby_ws] persist join failed: {e}")
-                        except Exception: pass
-                    # If the joining participant is a student, also add them to simulation_room_members
+                    user_id = None
                     try:
-                        user_id = None
-                        try:
-                            user_id = int(auth_payload.get('sub')) if auth_payload and auth_payload.get('sub') else None
-                        except Exception:
-                            user_id = None
-                        if (payload.get('role') or '').lower() == 'student' and user_id:
-                            conn2 = get_db_connection()
-                            cur2 = conn2.cursor()
-                            try:
-                                        # Defensive table creation (idempotent)
-                                        cur2.execute(
-                                            '''
-                                            CREATE TABLE IF NOT EXISTS simulation_rooms (
-                                                id INT AUTO_INCREMENT PRIMARY KEY,
-                                                instructor_id INT NOT NULL,
-                                                name VARCHAR(255) NOT NULL,
-                                                code VARCHAR(32) NOT NULL UNIQUE,
-                                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                                            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                                            '''
-                                        )
-                                        cur2.execute(
-                                            '''
-                                            CREATE TABLE IF NOT EXISTS simulation_room_members (
-                                                id INT AUTO_INCREMENT PRIMARY KEY,
-                                                room_id INT NOT NULL,
-                                                student_id INT NOT NULL,
-                                                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                                UNIQUE KEY uniq_room_member (room_id, student_id)
-                                            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                                            '''
-                                        )
-                                        # Find room id; do NOT auto-create a canonical simulation_rooms row here.
-                                        # Creating simulation_rooms during lobby joins caused duplicate/extra
-                                        # room records when backends restarted or clients reconnected.
-                                        cur2.execute('SELECT id FROM simulation_rooms WHERE code=%s LIMIT 1', (lobby_code,))
-                                        rr = cur2.fetchone()
-                                        if not rr:
-                                            try:
-                                                # Best-effort info for operators; skip creating a simulation_rooms row.
-                                                try:
-                                                    logging.warning(f"[lobby_ws] simulation_rooms row not found for code={lobby_code}; skipping member persistence")
-                                                except Exception:
-                                                    pass
-                                                rr = None
-                                            except Exception:
-                                                rr = None
-                                        if rr:
-                                            try:
-                                                room_id = int(rr[0])
-                                            except Exception:
-                                                try:
-                                                    room_id = int(rr.get('id'))
-                                                except Exception:
-                                                    room_id = None
-                                            if room_id:
-                                                cur2.execute('INSERT IGNORE INTO simulation_room_members (room_id, student_id) VALUES (%s, %s)', (room_id, user_id))
-                                                conn2.commit()
-                            except Exception:
-                                try:
-                                    conn2.rollback()
-                                except Exception:
-                                    pass
-                            finally:
-                                try:
-                                    cur2.close(); conn2.close()
-                                except Exception:
-                                    pass
+                        user_id = int(auth_payload.get('sub')) if auth_payload and auth_payload.get('sub') else None
                     except Exception:
-                        pass
+                        user_id = None
+                    # Persist participant join without blocking the other lobby sockets
+                    await run_db(_persist_participant_join, lobby_code, payload["name"], payload["role"], user_id, label="lobby.join")
                 
                 # Send join success to the joining participant
                 is_instructor = payload["role"] == "Instructor"
@@ -237,9 +267,7 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
             elif action == "leave":
                 lobby["participants"] = [p for p in lobby["participants"] if p["name"] != payload["name"]]
                 try:
-                    conn = get_db_connection(); cur = conn.cursor()
-                    cur.execute("DELETE FROM lobby_participants WHERE code=%s AND name=%s", (lobby_code, payload["name"]))
-                    conn.commit(); cur.close(); conn.close()
+                    await db_execute("DELETE FROM lobby_participants WHERE code=%s AND name=%s", (lobby_code, payload["name"]), commit=True, label="lobby.leave")
                 except Exception: pass
                 await broadcast_participant_update(lobby_code)
                 
@@ -248,9 +276,7 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
                     if p["name"] == payload["name"]:
                         p["ready"] = payload["ready"]
                 try:
-                    conn = get_db_connection(); cur = conn.cursor()
-                    cur.execute("UPDATE lobby_participants SET ready=%s WHERE code=%s AND name=%s", (1 if payload.get("ready") else 0, lobby_code, payload["name"]))
-                    conn.commit(); cur.close(); conn.close()
+                    await db_execute("UPDATE lobby_participants SET ready=%s WHERE code=%s AND name=%s", (1 if payload.get("ready") else 0, lobby_code, payload["name"]), commit=True, label="lobby.ready")
                 except Exception: pass
                 await broadcast_participant_update(lobby_code)
                 
@@ -259,9 +285,7 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
                     if p["name"] == payload["name"]:
                         p["role"] = payload["role"]
                 try:
-                    conn = get_db_connection(); cur = conn.cursor()
-                    cur.execute("UPDATE lobby_participants SET role=%s WHERE code=%s AND name=%s", (payload.get("role"), lobby_code, payload["name"]))
-                    conn.commit(); cur.close(); conn.close()
+                    await db_execute("UPDATE lobby_participants SET role=%s WHERE code=%s AND name=%s", (payload.get("role"), lobby_code, payload["name"]), commit=True, label="lobby.role")
                 except Exception: pass
                 await broadcast_participant_update(lobby_code)
                 
@@ -275,9 +299,7 @@ async def lobby_websocket(websocket: WebSocket, lobby_code: str):
                 lobby["participants"] = [p for p in lobby["participants"] if p["role"] == "Instructor"]
                 lobby["chat"] = []
                 try:
-                    conn = get_db_connection(); cur = conn.cursor()
-                    cur.execute("DELETE FROM lobby_participants WHERE code=%s AND role<> 'Instructor'", (lobby_code,))
-                    conn.commit(); cur.close(); conn.close()
+                    await db_execute("DELETE FROM lobby_participants WHERE code=%s AND role<> 'Instructor'", (lobby_code,), commit=True, label="lobby.reset")
                 except Exception: pass
                 await broadcast_participant_update(lobby_code)
                 
@@ -340,20 +362,7 @@ async def broadcast_simulation_start(lobby_code: str):
     run_code = _gen_run()
     # Best-effort persist: set last_run_code on simulation_rooms where code matches this lobby
     try:
-        conn = get_db_connection(); cur = conn.cursor()
-        try:
-            # Try to update the canonical room row's last_run_code
-            cur.execute('UPDATE simulation_rooms SET last_run_code=%s WHERE code=%s', (run_code, lobby_code))
-            conn.commit()
-        except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        try:
-            cur.close(); conn.close()
-        except Exception:
-            pass
+        await run_db(_persist_run_code, lobby_code, run_code, label="lobby.simulation_start")
     except Exception:
         pass
 
@@ -371,6 +380,26 @@ async def broadcast_simulation_start(lobby_code: str):
             except Exception:
                 pass
 
+
+def _persist_run_code(lobby_code: str, run_code: str):
+    try:
+        conn = get_db_connection(); cur = conn.cursor()
+        try:
+            # Try to update the canonical room row's last_run_code
+            cur.execute('UPDATE simulation_rooms SET last_run_code=%s WHERE code=%s', (run_code, lobby_code))
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        try:
+            cur.close(); conn.close()
+        except Exception:
+            pass
+    except Exception:
+        pass
+
 async def broadcast_difficulty(lobby_code: str, difficulty: str):
     """Broadcast difficulty change to all lobby connections"""
     data = {"type": "difficulty_updated", "difficulty": difficulty}
@@ -387,29 +416,38 @@ async def broadcast_lobby(lobby_code: str):
     """Legacy function - keeping for compatibility"""
     await broadcast_participant_update(lobby_code)
 
+def _persist_lobby(lobby_code: str, created_by: int | None = None):
+    """Blocking write of the lobby row so other instances/devices recognize it."""
+    try:
+        ensure_tables()
+        conn = get_db_connection(); cur = conn.cursor()
+        if created_by is not None:
+            cur.execute("INSERT INTO lobbies (code, difficulty, created_by) VALUES (%s,%s,%s) ON DUPLICATE KEY UPDATE difficulty=VALUES(difficulty), created_by=VALUES(created_by)", (lobby_code, "Beginner", int(created_by)))
+        else:
+            cur.execute("INSERT IGNORE INTO lobbies (code, difficulty) VALUES (%s,%s)", (lobby_code, "Beginner"))
+        conn.commit(); cur.close(); conn.close()
+    except Exception as e:
+        try: logging.error(f"[lobby_ws] persist lobby failed: {e}")
+        except Exception: pass
+        # NOTE: Do not auto-create rows in `simulation_rooms` here. Creating
+        # simulation room rows on lobby creation caused duplicate/extra room
+        # records when the backend restarted (multiple instances or restart
+        # hooks could re-run this path). The simulation websocket has a
+        # defensive fallback that will create a simulation_rooms row when a
+        # simulation connection is established and a persisted `lobbies` row
+        # exists. Keeping that single creation point avoids repeated inserts.
+        pass
+
 def create_lobby(lobby_code: str, created_by: int | None = None):
     if lobby_code not in lobbies:
         lobbies[lobby_code] = {"participants": [], "chat": [], "difficulty": "Beginner", "created_by": created_by}
-        # Persist lobby row so other instances/devices recognize it
-        try:
-            ensure_tables()
-            conn = get_db_connection(); cur = conn.cursor()
-            if created_by is not None:
-                cur.execute("INSERT INTO lobbies (code, difficulty, created_by) VALUES (%s,%s,%s) ON DUPLICATE KEY UPDATE difficulty=VALUES(difficulty), created_by=VALUES(created_by)", (lobby_code, "Beginner", int(created_by)))
-            else:
-                cur.execute("INSERT IGNORE INTO lobbies (code, difficulty) VALUES (%s,%s)", (lobby_code, "Beginner"))
-            conn.commit(); cur.close(); conn.close()
-        except Exception as e:
-            try: logging.error(f"[lobby_ws] persist lobby failed: {e}")
-            except Exception: pass
-            # NOTE: Do not auto-create rows in `simulation_rooms` here. Creating
-            # simulation room rows on lobby creation caused duplicate/extra room
-            # records when the backend restarted (multiple instances or restart
-            # hooks could re-run this path). The simulation websocket has a
-            # defensive fallback that will create a simulation_rooms row when a
-            # simulation connection is established and a persisted `lobbies` row
-            # exists. Keeping that single creation point avoids repeated inserts.
-            pass
+        _persist_lobby(lobby_code, created_by)
+
+def _delete_lobby_rows(lobby_code: str):
+    conn = get_db_connection(); cur = conn.cursor()
+    cur.execute("DELETE FROM lobby_participants WHERE code=%s", (lobby_code,))
+    cur.execute("DELETE FROM lobbies WHERE code=%s", (lobby_code,))
+    conn.commit(); cur.close(); conn.close()
 
 from fastapi import Request, HTTPException
 from auth import require_role
@@ -424,14 +462,14 @@ async def api_create_lobby(lobby_code: str, request: Request):
     except Exception:
         raise HTTPException(status_code=401, detail="Unauthorized")
     if lobby_code not in lobbies:
-        create_lobby(lobby_code, created_by=instructor_id)
+        # In-memory state is only touched on the event loop; the pool thread does the DB write
+        lobbies[lobby_code] = {"participants": [], "chat": [], "difficulty": "Beginner", "created_by": instructor_id}
+        await run_db(_persist_lobby, lobby_code, instructor_id, label="lobby.create")
     else:
         # Ensure persistence row has creator set
         try:
-            ensure_tables()
-            conn = get_db_connection(); cur = conn.cursor()
-            cur.execute("UPDATE lobbies SET created_by=%s WHERE code=%s AND (created_by IS NULL OR created_by<>%s)", (instructor_id, lobby_code, instructor_id))
-            conn.commit(); cur.close(); conn.close()
+            await run_db(ensure_tables, label="lobby.ensure_tables")
+            await db_execute("UPDATE lobbies SET created_by=%s WHERE code=%s AND (created_by IS NULL OR created_by<>%s)", (instructor_id, lobby_code, instructor_id), commit=True, label="lobby.set_creator")
         except Exception:
             pass
     return {"success": True, "code": lobby_code, "created_by": instructor_id}
@@ -453,10 +491,7 @@ async def admin_close_lobby(lobby_code: str, request: Request):
     lobbies.pop(lobby_code, None)
     # Cleanup DB persistence
     try:
-        conn = get_db_connection(); cur = conn.cursor()
-        cur.execute("DELETE FROM lobby_participants WHERE code=%s", (lobby_code,))
-        cur.execute("DELETE FROM lobbies WHERE code=%s", (lobby_code,))
-        conn.commit(); cur.close(); conn.close()
+        await run_db(_delete_lobby_rows, lobby_code, label="lobby.close")
     except Exception:
         pass
     try:
@@ -476,9 +511,7 @@ async def admin_remove_participant(lobby_code: str, name: str, request: Request)
         lobby["participants"] = [p for p in lobby.get("participants", []) if p.get("name") != name]
     # Remove from DB
     try:
-        conn = get_db_connection(); cur = conn.cursor()
-        cur.execute("DELETE FROM lobby_participants WHERE code=%s AND name=%s", (lobby_code, name))
-        conn.commit(); cur.close(); conn.close()
+        await db_execute("DELETE FROM lobby_participants WHERE code=%s AND name=%s", (lobby_code, name), commit=True, label="lobby.remove_participant")
     except Exception:
         pass
     # Broadcast participant update
@@ -508,9 +541,6 @@ async def api_close_lobby(lobby_code: str):
     return {"success": True}
     # Best-effort cleanup persistence
     try:
-        conn = get_db_connection(); cur = conn.cursor()
-        cur.execute("DELETE FROM lobby_participants WHERE code=%s", (lobby_code,))
-        cur.execute("DELETE FROM lobbies WHERE code=%s", (lobby_code,))
-        conn.commit(); cur.close(); conn.close()
+        await run_db(_delete_lobby_rows, lobby_code, label="lobby.close")
     except Exception:
         pass
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
+import functools
 import json
 import os
 import time
@@ -24,12 +25,21 @@ import threading
 import logging
 from websocket_terminal_pty import websocket_terminal_with_pty
 from cowrie_terminal import websocket_cowrie_terminal
-from signature_matcher import SignatureMatcher
+from signature_matcher import MatcherRegistry, MatchCache
 import mysql.connector
 
 # Import Isolation Forest database class
 from isolation_forest_api import IsolationForestDB
-from isolation_forest_runtime import ensure_model_loaded
+from isolation_forest_runtime import (
+    ensure_model_loaded,
+    invalidate_pattern_cache,
+    preload_model,
+    start_training,
+    training_status,
+)
+from anomaly_batcher import ScoreBatcher
+from isolation_forest_registry import ModelNotReady, UnknownModel, model_registry, validate_model_name
+from isolation_forest_retrain import retrain_policy
 from fastapi.openapi.utils import get_openapi
 from fastapi.staticfiles import StaticFiles
 from fastapi import Body
@@ -132,6 +142,21 @@ ATTACK_TYPES = {
 }
 
 from config import MYSQL_CONFIG, get_db_connection
+from db_pool import pool_stats
+from async_db import run_db, query_stats as db_query_stats
+from db_schema import MIGRATIONS_ON_STARTUP, invalidate_columns, run_migrations, schema_cache_stats, schema_once, table_columns
+
+# --- Apply pending dated migrations (backend/sql/YYYYMMDD_*.sql) once, before anything queries ---
+@app.on_event("startup")
+def _startup_migrations():
+    if not MIGRATIONS_ON_STARTUP:
+        return
+    try:
+        status = run_migrations()
+        if status["failed"]:
+            print(f"[WARN] {len(status['failed'])} schema migration(s) failed: {[f['version'] for f in status['failed']]}")
+    except Exception as e:
+        print(f"[WARN] schema migrations could not run: {e}")
 
 # --- Startup schema guard: make sure new unit columns exist so summary endpoint won't 500 ---
 @app.on_event("startup")
@@ -155,6 +180,7 @@ def _startup_schema_guard():
         except Exception:
             pass
 
+@schema_once
 def _ensure_signatures_schema(cursor):
     """Ensure the signatures table exists with columns expected by the API.
     Also migrate older schema variants (rule_name/category/severity) to add missing columns.
@@ -203,6 +229,7 @@ def _ensure_signatures_schema(cursor):
                 pass
     except Exception as e:
         print(f"[WARN] signatures schema ensure/migrate skipped: {e}")
+        return False
 
 def _seed_default_signatures(cursor):
     """Insert a small default set of signatures if table is empty.
@@ -283,64 +310,83 @@ def _seed_default_signatures(cursor):
     except Exception as e:  # pragma: no cover
         print(f"[WARN] default signature seed skipped: {e}")
 
+@schema_once
+def _prepare_signatures_table(conn, cursor):
+    """Schema migration and first-run seeding; once per process until a signature write resets it."""
+    _ensure_signatures_schema(cursor)
+    _seed_default_signatures(cursor)
+    conn.commit()
+
+# (column set, SELECT) built for the signatures table as last seen
+_SIGNATURE_QUERY_CACHE: Dict[str, object] = {"columns": None, "query": None}
+
+def _build_signature_query(cols) -> str:
+    """SELECT over whichever of the current/legacy signature columns exist, with stable aliases."""
+    has_desc = 'description' in cols
+    has_rule_name = 'rule_name' in cols
+    has_type = 'type' in cols
+    has_category = 'category' in cols
+    has_regex = 'regex' in cols
+
+    # Build compatible expressions with aliases (so dict keys are stable)
+    if has_desc and has_rule_name:
+        description_expr = "COALESCE(description, rule_name, '') AS description"
+    elif has_desc:
+        description_expr = "COALESCE(description, '') AS description"
+    elif has_rule_name:
+        description_expr = "COALESCE(rule_name, '') AS description"
+    else:
+        description_expr = "'' AS description"
+
+    if has_type and has_category:
+        type_expr = "COALESCE(type, category, 'generic') AS type"
+    elif has_type:
+        type_expr = "COALESCE(type, 'generic') AS type"
+    elif has_category:
+        type_expr = "COALESCE(category, 'generic') AS type"
+    else:
+        type_expr = "'generic' AS type"
+
+    if has_regex:
+        regex_expr = "COALESCE(regex, 0) AS regex"
+    else:
+        regex_expr = "0 AS regex"
+
+    return f"SELECT id, pattern, {description_expr}, {type_expr}, {regex_expr} FROM signatures"
+
+def _signature_select_query(cursor) -> str:
+    # table_columns answers from the per-process column cache, which is dropped after
+    # migrations and schema changes, so the query is only rebuilt when columns change
+    try:
+        cols = table_columns(cursor, 'signatures')
+    except Exception:
+        cols = frozenset()
+    if _SIGNATURE_QUERY_CACHE["query"] is None or _SIGNATURE_QUERY_CACHE["columns"] != cols:
+        _SIGNATURE_QUERY_CACHE["query"] = _build_signature_query(cols)
+        _SIGNATURE_QUERY_CACHE["columns"] = cols
+    return _SIGNATURE_QUERY_CACHE["query"]
+
+def invalidate_signature_query_cache():
+    """Re-read the signatures columns and re-run the seed check on the next load (after CRUD writes)."""
+    _prepare_signatures_table.reset()
+    invalidate_columns('signatures')
+    _SIGNATURE_QUERY_CACHE.update(columns=None, query=None)
+
 def load_signatures_from_db():
     """Load signatures from DB while supporting both legacy and current schemas.
 
     Some deployments may have legacy columns (rule_name, category) while others
     only have the new columns (description, type, regex). Referencing a
-    non-existent column in SELECT causes MySQL to error, so we first introspect
-    available columns and build a compatible SELECT list.
+    non-existent column in SELECT causes MySQL to error, so the SELECT list is
+    built from the columns that exist. The column set, the generated query and
+    the schema/seed step are cached per process, so a steady-state load is a
+    single SELECT.
     """
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        _ensure_signatures_schema(cursor)
-        _seed_default_signatures(cursor)
-        conn.commit()
-
-        # Discover available columns
-        try:
-            cursor.execute("SHOW COLUMNS FROM signatures")
-            cols_raw = cursor.fetchall() or []
-            if cols_raw and isinstance(cols_raw[0], dict):
-                cols = {row.get('Field') for row in cols_raw if isinstance(row, dict)}
-            else:
-                cols = {row[0] for row in cols_raw}
-        except Exception:
-            cols = set()
-
-        has_desc = 'description' in cols
-        has_rule_name = 'rule_name' in cols
-        has_type = 'type' in cols
-        has_category = 'category' in cols
-        has_regex = 'regex' in cols
-
-        # Build compatible expressions with aliases (so dict keys are stable)
-        if has_desc and has_rule_name:
-            description_expr = "COALESCE(description, rule_name, '') AS description"
-        elif has_desc:
-            description_expr = "COALESCE(description, '') AS description"
-        elif has_rule_name:
-            description_expr = "COALESCE(rule_name, '') AS description"
-        else:
-            description_expr = "'' AS description"
-
-        if has_type and has_category:
-            type_expr = "COALESCE(type, category, 'generic') AS type"
-        elif has_type:
-            type_expr = "COALESCE(type, 'generic') AS type"
-        elif has_category:
-            type_expr = "COALESCE(category, 'generic') AS type"
-        else:
-            type_expr = "'generic' AS type"
-
-        if has_regex:
-            regex_expr = "COALESCE(regex, 0) AS regex"
-        else:
-            regex_expr = "0 AS regex"
-
-        query = f"SELECT id, pattern, {description_expr}, {type_expr}, {regex_expr} FROM signatures"
-        cursor.execute(query)
+        _prepare_signatures_table(conn, cursor)
+        cursor.execute(_signature_select_query(cursor))
         sigs = cursor.fetchall()
     finally:
         cursor.close()
@@ -442,22 +488,40 @@ def load_signatures_from_db():
             pass
     return sigs
 
+# Long-lived signature matcher. CRUD endpoints swap in a freshly compiled snapshot;
+# readers just take the current one. The max age lets other workers pick up edits.
+# Compiled matchers are cached on disk by signature-set digest (empty disables).
+SIGNATURE_REFRESH_SECONDS = float(os.getenv("SIGNATURE_REFRESH_SECONDS", "60"))
+SIGNATURE_ARTIFACT_DIR = os.getenv("SIGNATURE_ARTIFACT_DIR", os.path.join(os.path.dirname(__file__), "models", "signatures"))
+signature_registry = MatcherRegistry(
+    load_signatures_from_db,
+    max_age=SIGNATURE_REFRESH_SECONDS or None,
+    artifact_dir=SIGNATURE_ARTIFACT_DIR or None,
+)
+# Repeated attacker commands are answered from an LRU keyed by (matcher version, command).
+signature_match_cache = MatchCache(maxsize=int(os.getenv("SIGNATURE_MATCH_CACHE_SIZE", "4096")))
+
 # Load signatures from DB at startup (defensive: don't crash app if DB unreachable)
 try:
-    SIGNATURES = load_signatures_from_db()
+    signature_registry.reload()
 except Exception as e:
     print(f"[WARN] Failed to load signatures from DB at startup: {e}\n         Falling back to empty signature set.")
-    SIGNATURES = []
 
-try:
-    matcher = SignatureMatcher(SIGNATURES)
-except Exception as e:
-    # Absolute fallback – should never really happen
-    print(f"[WARN] Failed to initialize SignatureMatcher: {e}")
-    class _NoopMatcher:
-        def match(self, content):
-            return []
-    matcher = _NoopMatcher()
+
+def _reload_signature_registry():
+    """Publish a new matcher snapshot after the signatures table changed."""
+    invalidate_signature_query_cache()
+    try:
+        snapshot = signature_registry.reload()
+        logging.info(f"[signature.registry] v{snapshot.version} active ({len(snapshot.signatures)} signatures)")
+    except Exception as e:
+        logging.error(f"[signature.registry] reload failed, keeping v{signature_registry.version}: {e}")
+
+async def _signature_snapshot():
+    """Active matcher snapshot, reloaded on the DB pool once older than SIGNATURE_REFRESH_SECONDS."""
+    if signature_registry.is_stale():
+        return await run_db(signature_registry.refresh_if_stale, label="signature.refresh")
+    return signature_registry.current()
 
 # ===================== ANOMALY MODEL META =====================
 
@@ -479,13 +543,197 @@ def anomaly_model_meta():
             "config": meta.get("config", {}),
             "min_df": meta.get("min_df"),
             "max_df": meta.get("max_df"),
+            "score_calibration": meta.get("score_scale") or ("quantile" if meta.get("df_quantiles") is not None else "minmax"),
+            "threshold": meta.get("threshold"),
         }
         return {"success": True, "meta": safe}
     except HTTPException:
         raise
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"Failed to load model meta: {e}")
 
+ANOMALY_SCORE_BATCH_MAX = int(os.getenv("ANOMALY_SCORE_BATCH_MAX", "10000"))
+
+def _anomaly_model_for(payload: dict) -> str:
+    """Model for a scoring request: explicit model_name, else the lobby's selection, else the default."""
+    model_name = payload.get("model_name")
+    if not model_name and payload.get("lobby_code"):
+        room = simulation_rooms.get(str(payload.get("lobby_code")))
+        model_name = (room or {}).get("anomaly_model")
+    return model_registry.resolve(model_name)
+
+@app.post("/api/anomaly/score-batch")
+def anomaly_score_batch(payload: dict):
+    """Score a list of commands with the Isolation Forest model in one pass.
+
+    JSON body: {"commands": ["ls -la", ...], "model_name"?: str, "lobby_code"?: str}.
+    Results come back in input order with the same fields as the single-command scorer.
+    """
+    commands = payload.get("commands")
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        raise HTTPException(status_code=400, detail="commands must be a list of strings")
+    if len(commands) > ANOMALY_SCORE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ANOMALY_SCORE_BATCH_MAX} commands per batch")
+    try:
+        model_name = model_registry.require_known(_anomaly_model_for(payload))
+        results = model_registry.score_commands(commands, model_name)
+        return {
+            "success": True,
+            "count": len(results),
+            "model_name": model_name,
+            "model_version": results[0]["model_version"] if results else None,
+            "results": results,
+        }
+    except UnknownModel as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:  # pragma: no cover
+        raise HTTPException(status_code=500, detail=f"Batch scoring failed: {e}")
+
+# One micro-batcher per known model so a batch is always scored by a single model
+_anomaly_score_batchers: Dict[str, ScoreBatcher] = {}
+
+def _anomaly_score_batcher(model_name: str) -> ScoreBatcher:
+    batcher = _anomaly_score_batchers.get(model_name)
+    if batcher is None:
+        batcher = _anomaly_score_batchers.setdefault(model_name, ScoreBatcher(
+            lambda commands, name=model_name: model_registry.score_commands(commands, name),
+            max_batch_size=int(os.getenv("ANOMALY_BATCH_MAX_SIZE", "64")),
+            max_latency_ms=float(os.getenv("ANOMALY_BATCH_MAX_LATENCY_MS", "5")),
+        ))
+    return batcher
+
+@app.post("/api/anomaly/score")
+async def anomaly_score(payload: dict):
+    """Score one command; concurrent requests are coalesced into a single model call."""
+    command = payload.get("command")
+    if not isinstance(command, str):
+        raise HTTPException(status_code=400, detail="command must be a string")
+    try:
+        model_name = _anomaly_model_for(payload)
+        batcher = _anomaly_score_batchers.get(model_name)
+        if batcher is None:
+            # Only names the registry can serve get a batcher, so the map stays bounded
+            await run_db(model_registry.require_known, model_name, label="anomaly.model_lookup")
+            batcher = _anomaly_score_batcher(model_name)
+        result = await batcher.score(command)
+        return {"success": True, "result": result}
+    except UnknownModel as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:  # pragma: no cover
+        raise HTTPException(status_code=500, detail=f"Scoring failed: {e}")
+
+@app.get("/api/anomaly/score-stats")
+def anomaly_score_stats():
+    """Micro-batching metrics per model (achieved batch sizes, queue wait, per-batch scoring time)."""
+    return {"success": True, "stats": {name: b.stats() for name, b in _anomaly_score_batchers.items()}}
+
+@app.get("/api/anomaly/models")
+def anomaly_models():
+    """Resident models, memory use, promoted default and shadow-scoring comparison."""
+    return {"success": True, "registry": model_registry.stats()}
+
+@app.post("/api/anomaly/models/{model_name}/train")
+def anomaly_model_train(model_name: str):
+    """Train a named isolation_forest_config model in the background."""
+    try:
+        name = validate_model_name(model_registry.require_known(model_name))
+        started = start_training(f"manual: {model_name}", model_name=name)
+    except UnknownModel as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not started:
+        raise HTTPException(status_code=409, detail="A training job is already running")
+    return {"success": True, "status": training_status()}
+
+@app.post("/api/anomaly/models/{model_name}/promote")
+def anomaly_model_promote(model_name: str):
+    """Serve model_name to every request that does not pick a model explicitly."""
+    try:
+        model_registry.promote(model_name)
+    except UnknownModel as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "registry": model_registry.stats()}
+
+@app.get("/api/anomaly/shadow")
+def anomaly_shadow_stats():
+    return {"success": True, "shadow": model_registry.shadow_stats()}
+
+@app.post("/api/anomaly/shadow")
+def anomaly_shadow_start(payload: dict):
+    """Shadow-score a candidate model: {"candidate": str, "primary"?: str, "sample_rate"?: float}."""
+    candidate = payload.get("candidate")
+    if not candidate:
+        raise HTTPException(status_code=400, detail="candidate is required")
+    try:
+        shadow = model_registry.set_shadow(candidate, payload.get("primary"), float(payload.get("sample_rate", 0.1)))
+    except UnknownModel as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "shadow": shadow}
+
+@app.delete("/api/anomaly/shadow")
+def anomaly_shadow_stop():
+    model_registry.clear_shadow()
+    return {"success": True}
+
+@app.put("/api/simulation/{lobby_code}/anomaly-model")
+def set_lobby_anomaly_model(lobby_code: str, payload: dict):
+    """Pick the anomaly model used for scoring requests that carry this lobby_code."""
+    model_name = payload.get("model_name") or None
+    if model_name:
+        try:
+            model_registry.require_known(model_name)
+        except UnknownModel as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    init_room(lobby_code)
+    simulation_rooms[lobby_code]["anomaly_model"] = model_name
+    return {"success": True, "lobby_code": lobby_code, "model_name": model_registry.resolve(model_name)}
+
+@app.on_event("startup")
+def _anomaly_model_startup():
+    try:
+        preload_model()
+    except Exception as e:
+        print(f"[WARN] anomaly model preload failed: {e}")
+
+@app.get("/api/anomaly/training/status")
+def anomaly_training_status():
+    """Background training state, progress, last duration and active model version."""
+    return {"success": True, "status": training_status()}
+
+@app.get("/api/anomaly/training/policy")
+def anomaly_training_policy():
+    """Retraining policy state: samples since the active model, thresholds, last decision."""
+    return {"success": True, "policy": retrain_policy.stats()}
+
+@app.post("/api/anomaly/training/start")
+def anomaly_training_start(payload: Optional[dict] = None):
+    """Retrain from isolation_forest_training_data in a separate process and hot-swap the model."""
+    reason = (payload or {}).get("reason") or "manual"
+    if not start_training(str(reason)):
+        raise HTTPException(status_code=409, detail="A training job is already running")
+    return {"success": True, "status": training_status()}
+
 @app.get("/api/anomaly/patterns")
 def anomaly_patterns():
     """Return active anomaly feature boosting patterns (name, regex, type, boost, severity, description)."""
@@ -532,6 +780,7 @@ def anomaly_add_pattern(payload: dict):
     )
     if new_id is None:
         raise HTTPException(status_code=500, detail="Failed to insert pattern")
+    invalidate_pattern_cache()
     return {"success": True, "id": new_id}
 
 @app.post("/api/anomaly/patterns/bulk")
@@ -551,6 +800,8 @@ def anomaly_bulk_add(payload: dict):
         if missing:
             raise HTTPException(status_code=400, detail=f"Item {i} missing fields: {', '.join(missing)}")
     result = isolation_forest_db.bulk_add_feature_patterns(items)
+    if result.get("inserted"):
+        invalidate_pattern_cache()
     return {"success": True, **result}
 
 @app.patch("/api/anomaly/patterns/{pattern_id}/active")
@@ -561,6 +812,7 @@ def anomaly_toggle_pattern(pattern_id: int, payload: dict):
     ok = isolation_forest_db.set_feature_pattern_active(pattern_id, bool(payload["active"]))
     if not ok:
         raise HTTPException(status_code=404, detail="Pattern not found or not updated")
+    invalidate_pattern_cache()
     return {"success": True, "id": pattern_id, "active": bool(payload['active'])}
 
 # ===================== HYBRID DETECT (KEEP FRONTEND COMPATIBLE) =====================
@@ -572,8 +824,8 @@ async def hybrid_detect(payload: dict):
     timestamp = payload.get("timestamp")
     try:
         # Signature matches
-        sig_matches = matcher.match(content)
-        detected_threats = [m.get("description", m.get("pattern")) for m in sig_matches]
+        sig_matches = signature_match_cache.match_hits(await _signature_snapshot(), content)
+        detected_threats = [hit.label for hit in sig_matches]
 
         # Simple heuristic confidence: base + 0.15 per match, capped
         base_conf = 0.25
@@ -661,6 +913,7 @@ def init_room(lobby_code: str):
             # Hints tracking per attacker
             "hint_usage": {},          # name -> total count of hints returned
             "hint_progress": {},       # name -> {objective_id -> hint_index}
+            "anomaly_model": None,     # model_name picked for this lobby (None = registry default)
             "metrics": {               # simple counters for instructor dashboard
                 "totalEvents": 0,
                 "attacksLaunched": 0,
@@ -921,6 +1174,187 @@ def normalize_category_text(txt: str) -> List[str]:
 
 from auth import decode_token
 
+@schema_once
+def _ensure_simulation_room_tables(cursor):
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS simulation_rooms (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            instructor_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            code VARCHAR(32) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS simulation_room_members (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            room_id INT NOT NULL,
+            student_id INT NOT NULL,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uniq_room_member (room_id, student_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        '''
+    )
+
+def _authorize_simulation_connection(lobby_code: str, role: str, user_id):
+    """Blocking room/membership check for simulation_websocket.
+
+    Runs on the DB thread pool; returns a websocket close code when the
+    connection must be refused, else None.
+    """
+    # Ensure simulation room tables exist (defensive: create if missing)
+    try:
+        conn = get_db_connection(); cur = conn.cursor()
+        _ensure_simulation_room_tables(cur)
+        # Lookup room by code
+        cur.execute('SELECT id, instructor_id FROM simulation_rooms WHERE code=%s OR last_run_code=%s LIMIT 1', (lobby_code, lobby_code))
+        row = cur.fetchone()
+        if not row:
+            # First attempt: try to remap this incoming lobby_code to a persisted room
+            # based on the connecting user's membership (students) or ownership (instructors).
+            try:
+                # If student, see if they are a member of any persisted room and use that
+                if (role == 'student') and user_id:
+                    try:
+                        cur.execute('''
+                            SELECT r.id, r.instructor_id
+                            FROM simulation_room_members m
+                            JOIN simulation_rooms r ON r.id = m.room_id
+                            WHERE m.student_id=%s
+                            ORDER BY m.joined_at DESC
+                            LIMIT 1
+                        ''', (user_id,))
+                        member_row = cur.fetchone()
+                        if member_row:
+                            row = member_row
+                            try:
+                                logging.info(f"[simulation_ws] remapped lobby {lobby_code} -> room_id={row[0]} using student membership user_id={user_id}")
+                            except Exception:
+                                pass
+                    except Exception:
+                        pass
+
+                # If still not found and role is instructor, try to find a room owned by this instructor
+                if not row and (role == 'instructor') and user_id:
+                    try:
+                        cur.execute('SELECT id, instructor_id FROM simulation_rooms WHERE instructor_id=%s ORDER BY created_at DESC LIMIT 1', (user_id,))
+                        instr_row = cur.fetchone()
+                        if instr_row:
+                            row = instr_row
+                            try:
+                                logging.info(f"[simulation_ws] remapped lobby {lobby_code} -> room_id={row[0]} using instructor ownership user_id={user_id}")
+                            except Exception:
+                                pass
+                    except Exception:
+                        pass
+
+            except Exception:
+                # ignore remap failures and proceed with original fallback
+                pass
+
+            # Defensive fallback: try to find a persisted lobby definition in `lobbies` table
+            if not row:
+                try:
+                    logging.warning(f"[simulation_ws] simulation_rooms row not found for code={lobby_code}, attempting fallback to lobbies table")
+                except Exception:
+                    pass
+                try:
+                    cur.execute('SELECT created_by FROM lobbies WHERE code=%s LIMIT 1', (lobby_code,))
+                    lobby_row = cur.fetchone()
+                    if lobby_row:
+                        # DO NOT automatically create simulation_rooms from lobbies.
+                        # Creation must be performed explicitly by an instructor via the UI/API.
+                        try:
+                            logging.warning(f"[simulation_ws] found lobby definition in 'lobbies' for code={lobby_code} but automatic creation is disabled")
+                        except Exception:
+                            pass
+                        # leave `row` as None so we fall through to the not-found handling
+                except Exception:
+                    # If fallback attempt fails, proceed to close
+                    row = None
+                except Exception:
+                    # If fallback attempt fails, proceed to close
+                    row = None
+                if not row:
+                    try:
+                        logging.warning(f"[simulation_ws] lobby not found: {lobby_code}")
+                    except Exception:
+                        pass
+                    try:
+                        cur.close(); conn.close()
+                    except Exception:
+                        pass
+                    return 4404
+        room_id = int(row[0] if isinstance(row, tuple) else row[0])
+        instr_id = int(row[1] if isinstance(row, tuple) else row[1])
+        # Enforce role rules
+        if role == 'instructor':
+            if user_id is None or user_id != instr_id:
+                try:
+                    logging.warning(f"[simulation_ws] instructor token mismatch: token_sub={user_id} instr_id={instr_id} lobby={lobby_code}")
+                except Exception:
+                    pass
+                try:
+                    cur.close(); conn.close()
+                except Exception:
+                    pass
+                return 4403
+        elif role == 'student':
+            if user_id is None:
+                try:
+                    cur.close(); conn.close()
+                except Exception:
+                    pass
+                return 4403
+            cur.execute('SELECT id FROM simulation_room_members WHERE room_id=%s AND student_id=%s LIMIT 1', (room_id, user_id))
+            mem = cur.fetchone()
+            if not mem:
+                # Attempt to create membership atomically if the lobby join just persisted it
+                try:
+                    if user_id:
+                        try:
+                            cur.execute('INSERT IGNORE INTO simulation_room_members (room_id, student_id) VALUES (%s, %s)', (room_id, user_id))
+                            conn.commit()
+                        except Exception:
+                            try:
+                                conn.rollback()
+                            except Exception:
+                                pass
+                        # Re-query after attempted insert
+                        cur.execute('SELECT id FROM simulation_room_members WHERE room_id=%s AND student_id=%s LIMIT 1', (room_id, user_id))
+                        mem = cur.fetchone()
+                except Exception:
+                    mem = None
+            if not mem:
+                try:
+                    logging.warning(f"[simulation_ws] student not a member of room: student_id={user_id} lobby={lobby_code}")
+                except Exception:
+                    pass
+                try:
+                    cur.close(); conn.close()
+                except Exception:
+                    pass
+                return 4403
+        else:
+            # admins and other roles may connect for observation
+            pass
+    except Exception:
+        try:
+            cur.close(); conn.close()
+        except Exception:
+            pass
+        return 4403
+    finally:
+        try:
+            cur.close(); conn.close()
+        except Exception:
+            pass
+    return None
+
+
 @app.websocket("/simulation/{lobby_code}")
 async def simulation_websocket(websocket: WebSocket, lobby_code: str):
     # Enforce JWT similar to lobby_ws
@@ -950,179 +1384,12 @@ async def simulation_websocket(websocket: WebSocket, lobby_code: str):
             user_id = int(payload.get('sub')) if payload and payload.get('sub') else None
         except Exception:
             user_id = None
-        # Ensure simulation room tables exist (defensive: create if missing)
-        try:
-            conn = get_db_connection(); cur = conn.cursor()
-            cur.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS simulation_rooms (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    instructor_id INT NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    code VARCHAR(32) NOT NULL UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                '''
-            )
-            cur.execute(
-                '''
-                CREATE TABLE IF NOT EXISTS simulation_room_members (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    room_id INT NOT NULL,
-                    student_id INT NOT NULL,
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY uniq_room_member (room_id, student_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-                '''
-            )
-            # Lookup room by code
-            cur.execute('SELECT id, instructor_id FROM simulation_rooms WHERE code=%s OR last_run_code=%s LIMIT 1', (lobby_code, lobby_code))
-            row = cur.fetchone()
-            if not row:
-                # First attempt: try to remap this incoming lobby_code to a persisted room
-                # based on the connecting user's membership (students) or ownership (instructors).
-                try:
-                    # If student, see if they are a member of any persisted room and use that
-                    if (role == 'student') and user_id:
-                        try:
-                            cur.execute('''
-                                SELECT r.id, r.instructor_id
-                                FROM simulation_room_members m
-                                JOIN simulation_rooms r ON r.id = m.room_id
-                                WHERE m.student_id=%s
-                                ORDER BY m.joined_at DESC
-                                LIMIT 1
-                            ''', (user_id,))
-                            member_row = cur.fetchone()
-                            if member_row:
-                                row = member_row
-                                try:
-                                    logging.info(f"[simulation_ws] remapped lobby {lobby_code} -> room_id={row[0]} using student membership user_id={user_id}")
-                                except Exception:
-                                    pass
-                        except Exception:
-                            pass
-
-                    # If still not found and role is instructor, try to find a room owned by this instructor
-                    if not row and (role == 'instructor') and user_id:
-                        try:
-                            cur.execute('SELECT id, instructor_id FROM simulation_rooms WHERE instructor_id=%s ORDER BY created_at DESC LIMIT 1', (user_id,))
-                            instr_row = cur.fetchone()
-                            if instr_row:
-                                row = instr_row
-                                try:
-                                    logging.info(f"[simulation_ws] remapped lobby {lobby_code} -> room_id={row[0]} using instructor ownership user_id={user_id}")
-                                except Exception:
-                                    pass
-                        except Exception:
-                            pass
-
-                except Exception:
-                    # ignore remap failures and proceed with original fallback
-                    pass
-
-                # Defensive fallback: try to find a persisted lobby definition in `lobbies` table
-                if not row:
-                    try:
-                        logging.warning(f"[simulation_ws] simulation_rooms row not found for code={lobby_code}, attempting fallback to lobbies table")
-                    except Exception:
-                        pass
-                    try:
-                        cur.execute('SELECT created_by FROM lobbies WHERE code=%s LIMIT 1', (lobby_code,))
-                        lobby_row = cur.fetchone()
-                        if lobby_row:
-                            # DO NOT automatically create simulation_rooms from lobbies.
-                            # Creation must be performed explicitly by an instructor via the UI/API.
-                            try:
-                                logging.warning(f"[simulation_ws] found lobby definition in 'lobbies' for code={lobby_code} but automatic creation is disabled")
-                            except Exception:
-                                pass
-                            # leave `row` as None so we fall through to the not-found handling
-                    except Exception:
-                        # If fallback attempt fails, proceed to close
-                        row = None
-                    except Exception:
-                        # If fallback attempt fails, proceed to close
-                        row = None
-                    if not row:
-                        try:
-                            logging.warning(f"[simulation_ws] lobby not found: {lobby_code}")
-                        except Exception:
-                            pass
-                        try:
-                            cur.close(); conn.close()
-                        except Exception:
-                            pass
-                        await websocket.close(code=4404)
-                        return
-            room_id = int(row[0] if isinstance(row, tuple) else row[0])
-            instr_id = int(row[1] if isinstance(row, tuple) else row[1])
-            # Enforce role rules
-            if role == 'instructor':
-                if user_id is None or user_id != instr_id:
-                    try:
-                        logging.warning(f"[simulation_ws] instructor token mismatch: token_sub={user_id} instr_id={instr_id} lobby={lobby_code}")
-                    except Exception:
-                        pass
-                    try:
-                        cur.close(); conn.close()
-                    except Exception:
-                        pass
-                    await websocket.close(code=4403)
-                    return
-            elif role == 'student':
-                if user_id is None:
-                    try:
-                        cur.close(); conn.close()
-                    except Exception:
-                        pass
-                    await websocket.close(code=4403)
-                    return
-                cur.execute('SELECT id FROM simulation_room_members WHERE room_id=%s AND student_id=%s LIMIT 1', (room_id, user_id))
-                mem = cur.fetchone()
-                if not mem:
-                    # Attempt to create membership atomically if the lobby join just persisted it
-                    try:
-                        if user_id:
-                            try:
-                                cur.execute('INSERT IGNORE INTO simulation_room_members (room_id, student_id) VALUES (%s, %s)', (room_id, user_id))
-                                conn.commit()
-                            except Exception:
-                                try:
-                                    conn.rollback()
-                                except Exception:
-                                    pass
-                            # Re-query after attempted insert
-                            cur.execute('SELECT id FROM simulation_room_members WHERE room_id=%s AND student_id=%s LIMIT 1', (room_id, user_id))
-                            mem = cur.fetchone()
-                    except Exception:
-                        mem = None
-                if not mem:
-                    try:
-                        logging.warning(f"[simulation_ws] student not a member of room: student_id={user_id} lobby={lobby_code}")
-                    except Exception:
-                        pass
-                    try:
-                        cur.close(); conn.close()
-                    except Exception:
-                        pass
-                    await websocket.close(code=4403)
-                    return
-            else:
-                # admins and other roles may connect for observation
-                pass
-        except Exception:
-            try:
-                cur.close(); conn.close()
-            except Exception:
-                pass
-            await websocket.close(code=4403)
+        close_code = await run_db(
+            _authorize_simulation_connection, lobby_code, role, user_id, label="simulation_ws.authorize"
+        )
+        if close_code:
+            await websocket.close(code=close_code)
             return
-        finally:
-            try:
-                cur.close(); conn.close()
-            except Exception:
-                pass
     except Exception:
         await websocket.close(code=4403)
         return
@@ -1273,13 +1540,13 @@ async def simulation_websocket(websocket: WebSocket, lobby_code: str):
                             }, roles=["Defender", "Observer"])
 
                 # Simple command echo + signature detection
-                matches = matcher.match(command)
-                output = ".\n".join([f"Matched: {m.get('description', m.get('pattern'))}" for m in matches]) or "Command executed."
+                matches = signature_match_cache.match_hits(await _signature_snapshot(), command)
+                threats = [hit.label for hit in matches]
+                output = ".\n".join([f"Matched: {label}" for label in threats]) or "Command executed."
                 await websocket.send_json({"type": "command_result", "command": command, "output": output})
 
                 # Store recent attack context for defenders
                 try:
-                    threats = [m.get('description', m.get('pattern')) for m in matches]
                     cats = categorize_command(command)
                     room = simulation_rooms.get(lobby_code)
                     if room is not None:
@@ -1299,7 +1566,7 @@ async def simulation_websocket(websocket: WebSocket, lobby_code: str):
                     "type": "detection_event",
                     "method": "signature",
                     "detected": len(matches) > 0,
-                    "threats": [m.get('description', m.get('pattern')) for m in matches],
+                    "threats": threats,
                 }
                 room_broadcast(lobby_code, detection, roles=["Observer"])
                 # Defender legacy envelope
@@ -1342,7 +1609,7 @@ async def simulation_websocket(websocket: WebSocket, lobby_code: str):
                                 "type": "off_objective_threat",
                                 "attacker": actor,
                                 "command": command,
-                                "threats": [m.get('description', m.get('pattern')) for m in matches]
+                                "threats": threats
                             }, roles=["Defender", "Observer"])
                         # Penalize irrelevant/typo if enabled: no objective completion and no detection
                         if not completed and not matches and rules.get("penalize_irrelevant", False):
@@ -1879,35 +2146,17 @@ async def detect_signature(payload: dict):
     except Exception:
         pass
     
-    # Reload signatures and matcher to ensure we have the latest data
     try:
-        current_signatures = load_signatures_from_db()
-        try:
-            logging.info(f"[signature.detect] signatures loaded: {len(current_signatures)}")
-        except Exception:
-            pass
-        current_matcher = SignatureMatcher(current_signatures)
-        matches = current_matcher.match(command)
+        snapshot = await _signature_snapshot()
+        matches = signature_match_cache.match_hits(snapshot, command)
         try:
-            logging.info(f"[signature.detect] matches: {len(matches)}")
+            logging.info(f"[signature.detect] v{snapshot.version} matches: {len(matches)}")
         except Exception:
             pass
         
         # Format matches for frontend clarity with offsets & origin
-        formatted_matches = []
-        for m in matches:
-            formatted_matches.append({
-                "id": m.get("id") or m.get("pattern"),
-                "pattern": m.get("pattern"),
-                "description": m.get("description"),
-                "type": m.get("type"),
-                "regex": bool(m.get("regex")),
-                "origin": m.get("origin", 'aho' if not m.get('regex') else 'regex'),
-                "start": m.get("start"),
-                "end": m.get("end"),
-                "command": command
-            })
-        return {"matches": formatted_matches}
+        formatted_matches = [hit.to_dict(command) for hit in matches]
+        return {"matches": formatted_matches, "signature_version": snapshot.version}
     except Exception as e:
         # Log the error and return empty matches
         print(f"Error in signature detection: {e}")
@@ -1917,6 +2166,26 @@ async def detect_signature(payload: dict):
             pass
         return {"matches": [], "error": str(e)}
 
+@app.get("/api/signature/cache-stats")
+def signature_cache_stats():
+    """Hit/miss counters of the signature match cache plus the active matcher version."""
+    return {"success": True, "matcher_version": signature_registry.version, "cache": signature_match_cache.stats()}
+
+@app.get("/api/db/pool-stats")
+def db_pool_stats():
+    """MySQL pool usage: checked-out/idle connections, pool waits and checkout (hold) times."""
+    return {"success": True, "pool": pool_stats()}
+
+@app.get("/api/db/query-stats")
+def db_query_timings():
+    """Per-label timing of database work run off the event loop (calls, avg/max ms, pool-thread wait)."""
+    return {"success": True, "stats": db_query_stats()}
+
+@app.get("/api/db/schema-status")
+def db_schema_status():
+    """Applied/failed migrations from the last startup run and the per-process schema caches."""
+    return {"success": True, "schema": schema_cache_stats()}
+
 @app.websocket("/ws/terminal")
 async def websocket_terminal(websocket: WebSocket):
     await websocket_terminal_with_pty(websocket)
@@ -1974,10 +2243,7 @@ def add_signature(sig: SignatureIn):
     conn.commit()
     cursor.close()
     conn.close()
-    # Reload global matcher
-    global matcher, SIGNATURES
-    SIGNATURES = load_signatures_from_db()
-    matcher = SignatureMatcher(SIGNATURES)
+    _reload_signature_registry()
     return {"message": "Signature added"}
 
 @app.put("/api/signatures/{sig_id}")
@@ -1991,10 +2257,7 @@ def update_signature(sig_id: int, sig: SignatureIn):
     conn.commit()
     cursor.close()
     conn.close()
-    # Reload global matcher
-    global matcher, SIGNATURES
-    SIGNATURES = load_signatures_from_db()
-    matcher = SignatureMatcher(SIGNATURES)
+    _reload_signature_registry()
     return {"message": "Signature updated"}
 
 @app.delete("/api/signatures/{sig_id}")
@@ -2005,10 +2268,7 @@ def delete_signature(sig_id: int):
     conn.commit()
     cursor.close()
     conn.close()
-    # Reload global matcher
-    global matcher, SIGNATURES
-    SIGNATURES = load_signatures_from_db()
-    matcher = SignatureMatcher(SIGNATURES)
+    _reload_signature_registry()
     return {"message": "Signature deleted"}
 
 # ===================== HYBRID PATTERN AGGREGATION (UNIFIED LIST) =====================
@@ -2090,9 +2350,7 @@ def add_hybrid_pattern(p: HybridPatternIn):
         new_id = cursor.lastrowid
         cursor.close()
         conn.close()
-        global matcher, SIGNATURES
-        SIGNATURES = load_signatures_from_db()
-        matcher = SignatureMatcher(SIGNATURES)
+        _reload_signature_registry()
         return {"success": True, "id": new_id, "source": "signature"}
     else:
         if p.boost is None:
@@ -2102,6 +2360,7 @@ def add_hybrid_pattern(p: HybridPatternIn):
         )
         if new_id is None:
             raise HTTPException(status_code=500, detail="Failed to insert anomaly feature pattern")
+        invalidate_pattern_cache()
         return {"success": True, "id": new_id, "source": "anomaly"}
 
 # ===================== ISOLATION FOREST API ENDPOINTS =====================
@@ -2109,7 +2368,7 @@ def add_hybrid_pattern(p: HybridPatternIn):
 @app.get("/api/isolation-forest/config/{model_name}")
 async def get_isolation_forest_config(model_name: str):
     """Get Isolation Forest model configuration from database"""
-    config = isolation_forest_db.get_model_config(model_name)
+    config = await run_db(isolation_forest_db.get_model_config, model_name, label="isolation_forest.get_model_config")
     if config:
         return {"success": True, "config": config}
     else:
@@ -2118,19 +2377,19 @@ async def get_isolation_forest_config(model_name: str):
 @app.get("/api/isolation-forest/patterns")
 async def get_isolation_forest_patterns():
     """Get feature patterns for anomaly detection from database"""
-    patterns = isolation_forest_db.get_feature_patterns()
+    patterns = await run_db(isolation_forest_db.get_feature_patterns, label="isolation_forest.get_feature_patterns")
     return {"success": True, "patterns": patterns}
 
 @app.get("/api/isolation-forest/training-data")
 async def get_isolation_forest_training_data(label: str = None):
     """Get training data for Isolation Forest from database"""
-    data = isolation_forest_db.get_training_data(label)
+    data = await run_db(isolation_forest_db.get_training_data, label, label="isolation_forest.get_training_data")
     return {"success": True, "training_data": data}
 
 @app.get("/api/isolation-forest/boost-config/{config_name}")
 async def get_isolation_forest_boost_config(config_name: str):
     """Get educational boosting configuration from database"""
-    config = isolation_forest_db.get_boost_config(config_name)
+    config = await run_db(isolation_forest_db.get_boost_config, config_name, label="isolation_forest.get_boost_config")
     if config:
         return {"success": True, "config": config}
     else:
@@ -2147,17 +2406,25 @@ async def add_isolation_forest_training_sample(payload: dict):
     if not command_pattern or not label:
         raise HTTPException(status_code=400, detail="command_pattern and label are required")
     
-    success = isolation_forest_db.add_training_sample(command_pattern, label, features, description)
+    success = await run_db(isolation_forest_db.add_training_sample, command_pattern, label, features, description, label="isolation_forest.add_training_sample")
     
     if success:
-        return {"success": True, "message": "Training sample added successfully"}
+        try:
+            retrain = await run_db(retrain_policy.record, [command_pattern], label="isolation_forest.retrain_policy")
+        except Exception as e:
+            print(f"[WARN] retrain policy check failed: {e}")
+            retrain = None
+        return {"success": True, "message": "Training sample added successfully", "retrain": retrain}
     else:
         raise HTTPException(status_code=500, detail="Failed to add training sample")
 
 @app.put("/api/isolation-forest/config/{model_name}")
 async def update_isolation_forest_config(model_name: str, payload: dict):
     """Update Isolation Forest model configuration in database"""
-    success = isolation_forest_db.update_model_config(model_name, **payload)
+    success = await run_db(
+        functools.partial(isolation_forest_db.update_model_config, model_name, **payload),
+        label="isolation_forest.update_model_config",
+    )
     
     if success:
         return {"success": True, "message": "Model configuration updated successfully"}
@@ -2167,7 +2434,7 @@ async def update_isolation_forest_config(model_name: str, payload: dict):
 @app.get("/api/isolation-forest/statistics")
 async def get_isolation_forest_statistics():
     """Get Isolation Forest database statistics"""
-    stats = isolation_forest_db.get_statistics()
+    stats = await run_db(isolation_forest_db.get_statistics, label="isolation_forest.get_statistics")
     return {"success": True, "statistics": stats}
 
 @app.post("/api/isolation-forest/detect")
@@ -2180,8 +2447,8 @@ async def detect_isolation_forest_anomaly(payload: dict):
     
     try:
         # Get patterns and boost config from database
-        patterns = isolation_forest_db.get_feature_patterns()
-        boost_config = isolation_forest_db.get_boost_config("hybrid_conservative")
+        patterns = await run_db(isolation_forest_db.get_feature_patterns, label="isolation_forest.get_feature_patterns")
+        boost_config = await run_db(isolation_forest_db.get_boost_config, "hybrid_conservative", label="isolation_forest.get_boost_config")
         
         # Simple pattern-based anomaly detection using database patterns
         anomaly_score = 0.3  # Base score
@@ -1,6 +1,9 @@
 from typing import Optional
 
+from db_schema import schema_once
 
+
+@schema_once
 def ensure_notifications_table(cursor) -> None:
     """Ensure the shared notifications table exists.
 
@@ -39,7 +42,8 @@ def create_notification(cursor, recipient_role: str, message: str, ntype: str =
         return 0
 
 
-def migrate_notifications_schema(cursor) -> None:
+@schema_once
+def migrate_notifications_schema(cursor) -> bool:
     """Best-effort migration to ensure required columns exist on legacy installs.
 
     - Add `read` TINYINT(1) if missing
@@ -51,6 +55,7 @@ def migrate_notifications_schema(cursor) -> None:
 
     # Ensure table exists first
     ensure_notifications_table(cursor)
+    ok = True
 
     # Add `recipient_role` column if missing
     try:
@@ -61,8 +66,8 @@ def migrate_notifications_schema(cursor) -> None:
             except Exception:
                 pass
     except Exception:
-        # non-fatal
-        pass
+        # non-fatal, but retry on the next call
+        ok = False
 
     # Add `recipient_id` column if missing
     try:
@@ -73,8 +78,8 @@ def migrate_notifications_schema(cursor) -> None:
             except Exception:
                 pass
     except Exception:
-        # non-fatal
-        pass
+        # non-fatal, but retry on the next call
+        ok = False
 
     # Add `read` column if missing
     try:
@@ -85,8 +90,8 @@ def migrate_notifications_schema(cursor) -> None:
             except Exception:
                 pass
     except Exception:
-        # non-fatal
-        pass
+        # non-fatal, but retry on the next call
+        ok = False
 
     # Add `time` column if missing
     try:
@@ -97,8 +102,8 @@ def migrate_notifications_schema(cursor) -> None:
             except Exception:
                 pass
     except Exception:
-        # non-fatal
-        pass
+        # non-fatal, but retry on the next call
+        ok = False
 
     # Ensure indexes exist (best-effort; ignore errors if already exist)
     try:
@@ -109,3 +114,4 @@ def migrate_notifications_schema(cursor) -> None:
         cursor.execute("CREATE INDEX idx_time ON notifications (time)")
     except Exception:
         pass
+    return ok
@@ -1,45 +1,576 @@
+import os
 import re
+import sys
+import json
+import mmap
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+import threading
 import ahocorasick
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Mapping, Optional, Pattern, Tuple, Union
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+# Numbered/named backreferences and conditional group references ``(?(1)...)``
+# would point at the wrong group once a pattern is wrapped inside the combined
+# alternation, so such patterns are searched on their own.
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+REGEX_ENGINES = ("combined", "sequential")
+
+# Shorter atoms hit on almost every command and would not filter anything.
+MIN_ATOM_LENGTH = 2
+
+
+def required_literals(pattern: str) -> List[str]:
+    """Return literal substrings every match of ``pattern`` must contain.
+
+    Walks the parsed top-level sequence collecting runs of literal characters.
+    Anything optional or alternative (``?``/``*`` repeats, classes, top-level
+    ``|``) ends a run; a ``{n,}`` repeat with n >= 1 contributes its own atoms.
+    Case-insensitive patterns yield nothing. An empty list means "cannot
+    prefilter", never "cannot match".
+    """
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except re.error:
+        return []
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    atoms: List[str] = []
+    _collect_literals(list(parsed), atoms)
+    return list(dict.fromkeys(a for a in atoms if len(a) >= MIN_ATOM_LENGTH))
+
+
+def _freeze_signature(sig: Dict[str, Any]) -> Mapping[str, Any]:
+    frozen = {k: (sys.intern(v) if isinstance(v, str) else v) for k, v in sig.items() if k != "compiled"}
+    # Ensure 'type' is always present
+    frozen.setdefault("type", None)
+    return MappingProxyType(frozen)
+
+
+def _collect_literals(items, atoms: List[str]):
+    run: List[str] = []
+
+    def flush():
+        if run:
+            atoms.append("".join(run))
+            run.clear()
+
+    for op, av in items:
+        if op is _sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is _sre_parse.SUBPATTERN:
+            _group, add_flags, _del_flags, sub = av
+            if not add_flags & re.IGNORECASE:
+                _collect_literals(list(sub), atoms)
+        elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and av[0] >= 1:
+            _collect_literals(list(av[2]), atoms)
+    flush()
+
+
+class SignatureHit:
+    """One match: a signature index into an immutable table plus offsets.
+
+    ``end`` is inclusive, matching the offsets the API has always reported.
+    Hits are cheap to create and share the table of the matcher that produced
+    them; ``to_dict`` builds the JSON shape only when a response needs it.
+    """
+
+    __slots__ = ("sig_id", "start", "end", "origin", "table")
+
+    def __init__(self, sig_id: int, start: int, end: int, origin: str, table: Tuple[Mapping[str, Any], ...]):
+        self.sig_id = sig_id
+        self.start = start
+        self.end = end
+        self.origin = origin
+        self.table = table
+
+    @property
+    def signature(self) -> Mapping[str, Any]:
+        return self.table[self.sig_id]
+
+    @property
+    def label(self) -> str:
+        """Human readable name used in simulation output (description, else pattern)."""
+        sig = self.table[self.sig_id]
+        return sig.get("description", sig.get("pattern"))
+
+    def to_dict(self, command: Optional[str] = None) -> Dict[str, Any]:
+        sig = self.table[self.sig_id]
+        out = {
+            "id": sig.get("id") or sig.get("pattern"),
+            "pattern": sig.get("pattern"),
+            "description": sig.get("description"),
+            "type": sig.get("type"),
+            "regex": bool(sig.get("regex")),
+            "origin": self.origin,
+            "start": self.start,
+            "end": self.end,
+        }
+        if command is not None:
+            out["command"] = command
+        return out
+
+    def __repr__(self):
+        return f"SignatureHit({self.sig_id}, {self.start}, {self.end}, {self.origin!r})"
+
 
 class SignatureMatcher:
-    def __init__(self, signatures: List[Dict[str, Any]]):
+    """Aho–Corasick literal matching plus regex signatures.
+
+    Regexes with required literal atoms (see ``required_literals``) are gated
+    by the same automaton that matches literal signatures: they are only
+    evaluated when every one of their atoms occurred in the text. The rest are
+    always evaluated.
+
+    ``regex_engine="combined"`` (default) merges those always-evaluated regexes
+    into one alternation. A single ``search`` either rejects the command
+    outright (the common benign case) or yields the leftmost match position,
+    from which the remaining regexes are confirmed individually.
+    ``"sequential"`` searches them one by one. Both report identical
+    ``start``/``end`` offsets.
+
+    ``table`` is an immutable, per-matcher copy of the signatures that every
+    ``SignatureHit`` points into; the caller's dicts are never modified.
+    """
+
+    def __init__(self, signatures: List[Dict[str, Any]], regex_engine: str = "combined", prefilter: bool = True):
+        if regex_engine not in REGEX_ENGINES:
+            raise ValueError(f"Unknown regex engine '{regex_engine}', expected one of {REGEX_ENGINES}")
+        self.regex_engine = regex_engine
+        self.table: Tuple[Mapping[str, Any], ...] = tuple(_freeze_signature(sig) for sig in signatures)
         self.automaton = ahocorasick.Automaton()
-        self.regex_signatures = []
-        for idx, sig in enumerate(signatures):
-            # Ensure 'type' is always present
-            if 'type' not in sig:
-                sig['type'] = None
+        # Parallel lists over the regex signatures: table index and compiled pattern
+        self._regex_sig: List[int] = []
+        self._compiled: List[Pattern] = []
+        # word -> (signature indices matched literally, regex indices gated on it)
+        words: Dict[str, tuple] = {}
+        for idx, sig in enumerate(self.table):
             if sig.get("regex"):
-                sig["compiled"] = re.compile(sig["pattern"])
-                self.regex_signatures.append(sig)
+                self._regex_sig.append(idx)
+                self._compiled.append(re.compile(sig["pattern"]))
             else:
-                self.automaton.add_word(sig['pattern'], (idx, sig))
+                words.setdefault(sig['pattern'], ([], []))[0].append(idx)
+
+        # regex index -> number of distinct atoms that must be seen before evaluating it
+        self._gated: Dict[int, int] = {}
+        ungated: List[int] = []
+        for i, sig_id in enumerate(self._regex_sig):
+            atoms = required_literals(self.table[sig_id]["pattern"]) if prefilter else []
+            if not atoms:
+                ungated.append(i)
+                continue
+            self._gated[i] = len(atoms)
+            for atom in atoms:
+                words.setdefault(atom, ([], []))[1].append(i)
+
+        for word_id, (word, (literal_idxs, regex_idxs)) in enumerate(words.items()):
+            self.automaton.add_word(word, (len(word), tuple(literal_idxs), tuple(regex_idxs), word_id))
         self.automaton.make_automaton()
-        self.signatures = signatures
+
+        self._combined = None
+        self._combined_members: List[int] = []
+        self._standalone: List[int] = ungated
+        if regex_engine == "combined":
+            self._build_combined(ungated)
+
+    @property
+    def signatures(self) -> Tuple[Mapping[str, Any], ...]:
+        return self.table
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # MappingProxyType cannot be pickled; store plain dicts and re-freeze on load
+        state["table"] = [dict(sig) for sig in self.table]
+        return state
+
+    def __setstate__(self, state):
+        state["table"] = tuple(MappingProxyType(sig) for sig in state["table"])
+        self.__dict__.update(state)
+
+    def _build_combined(self, indices: List[int]):
+        members: List[int] = []
+        standalone: List[int] = []
+        for i in indices:
+            pattern = self.table[self._regex_sig[i]]["pattern"]
+            if _BACKREF_RE.search(pattern):
+                standalone.append(i)
+                continue
+            try:
+                re.compile(f"(?:{pattern})|x")
+            except re.error:
+                # e.g. global inline flags, which must lead the whole expression
+                standalone.append(i)
+                continue
+            members.append(i)
+        if not members:
+            return
+        # Non-capturing alternatives keep sre's first-character prefix scan available;
+        # named groups per alternative would disable it and make the gate slower
+        # than the sequential loop it replaces.
+        try:
+            combined = re.compile("|".join(f"(?:{self.table[self._regex_sig[i]]['pattern']})" for i in members))
+        except re.error as e:
+            logging.warning(f"[signature.matcher] combined regex build failed, using sequential search: {e}")
+            return
+        self._combined = combined
+        self._combined_members = members
+        self._standalone = standalone
+
+    def _regex_spans(self, text: str, candidates) -> Dict[int, tuple]:
+        """Map regex index -> (start, end_exclusive) of its first match.
+
+        ``candidates`` are the gated regexes whose atoms all occurred in ``text``.
+        """
+        spans: Dict[int, tuple] = {}
+        compiled = self._compiled
+        if self._combined is not None:
+            m = self._combined.search(text)
+            if m is not None:
+                # No member matches left of pos, so each member's first match is
+                # at or after it; the first member matching *at* pos is the
+                # alternative the combined search picked.
+                pos = m.start()
+                winner_found = False
+                for i in self._combined_members:
+                    mm = None
+                    if not winner_found:
+                        mm = compiled[i].match(text, pos)
+                        winner_found = mm is not None
+                    if mm is None:
+                        mm = compiled[i].search(text, pos)
+                    if mm:
+                        spans[i] = mm.span()
+        for i in self._standalone:
+            mm = compiled[i].search(text)
+            if mm:
+                spans[i] = mm.span()
+        for i in candidates:
+            mm = compiled[i].search(text)
+            if mm:
+                spans[i] = mm.span()
+        return spans
+
+    def _scan(self, text: str, hits) -> List[SignatureHit]:
+        """Collect the hits for ``text``.
+
+        ``hits`` is the automaton iterator positioned on ``text`` (or an empty tuple).
+        """
+        table = self.table
+        results: List[SignatureHit] = []
+        atoms_seen: Dict[int, int] = {}
+        seen_words = set()
+        for end_index, (length, literal_idxs, regex_idxs, word_id) in hits:
+            for idx in literal_idxs:
+                results.append(SignatureHit(idx, end_index - length + 1, end_index, 'aho', table))
+            if regex_idxs and word_id not in seen_words:
+                seen_words.add(word_id)
+                for i in regex_idxs:
+                    atoms_seen[i] = atoms_seen.get(i, 0) + 1
+        candidates = [i for i, n in atoms_seen.items() if n == self._gated[i]]
+        # Regex matches with first match offsets, reported in signature order
+        spans = self._regex_spans(text, candidates)
+        for i in sorted(spans):
+            begin, stop = spans[i]
+            results.append(SignatureHit(self._regex_sig[i], begin, stop - 1, 'regex', table))
+        return results
+
+    def match_hits(self, text: str) -> List[SignatureHit]:
+        # Aho–Corasick substring matches with offsets (an empty trie cannot be iterated)
+        hits = self.automaton.iter(text) if self.automaton.kind == ahocorasick.AHOCORASICK else ()
+        return self._scan(text, hits)
 
     def match(self, text: str) -> List[Dict[str, Any]]:
+        """Legacy dict results: a copy of each matched signature plus start/end/origin."""
         results: List[Dict[str, Any]] = []
-        # Aho–Corasick substring matches with offsets
-        for end_index, (idx, sig) in self.automaton.iter(text):
-            length = len(sig['pattern'])
-            start = end_index - length + 1
-            enriched = dict(sig)
-            enriched['start'] = start
-            enriched['end'] = end_index
-            enriched['origin'] = 'aho'
+        for hit in self.match_hits(text):
+            enriched = dict(hit.signature)
+            enriched['start'] = hit.start
+            enriched['end'] = hit.end
+            enriched['origin'] = hit.origin
             results.append(enriched)
-        # Regex matches with first match offsets
-        for sig in self.regex_signatures:
-            m = sig["compiled"].search(text)
-            if m:
-                enriched = dict(sig)
-                enriched['start'] = m.start()
-                enriched['end'] = m.end() - 1
-                enriched['origin'] = 'regex'
-                results.append(enriched)
         return results
 
+    def iter_matches(self, items: Iterable[Union[str, Dict[str, Any]]]) -> Iterator[Tuple[int, str, List[SignatureHit]]]:
+        """Match many commands, yielding ``(position, command, hits)`` lazily.
+
+        ``items`` may be plain command strings or Cowrie JSON events; events
+        without an ``input`` field (logins, connects, ...) are skipped, and
+        ``position`` is the item's index in ``items`` so callers can map back
+        to the source line. One automaton iterator is reset and reused for
+        every command.
+        """
+        searcher = self.automaton.iter("") if self.automaton.kind == ahocorasick.AHOCORASICK else None
+        for position, item in enumerate(items):
+            if isinstance(item, dict):
+                command = item.get("input")
+                if not isinstance(command, str):
+                    continue
+            else:
+                command = item
+            if searcher is not None:
+                searcher.set(command, True)
+            yield position, command, self._scan(command, searcher if searcher is not None else ())
+
+
+ARTIFACT_FORMAT = 1
+
+
+def signatures_digest(signatures: List[Dict[str, Any]], regex_engine: str = "combined", prefilter: bool = True) -> str:
+    """Stable hash of everything a compiled matcher depends on."""
+    rows = [[sig.get(k) for k in ("id", "pattern", "description", "type")] + [bool(sig.get("regex"))] for sig in signatures]
+    payload = json.dumps({
+        "format": ARTIFACT_FORMAT,
+        "python": list(sys.version_info[:2]),
+        "engine": regex_engine,
+        "prefilter": prefilter,
+        "signatures": rows,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def save_matcher_artifact(matcher: SignatureMatcher, path: str, digest: str):
+    """Pickle ``matcher`` to ``path`` atomically (write to a temp file, then rename)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".signatures-", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"format": ARTIFACT_FORMAT, "digest": digest, "matcher": matcher}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_matcher_artifact(path: str, digest: str) -> Optional[SignatureMatcher]:
+    """Load a matcher saved by ``save_matcher_artifact``; None if missing, stale or unreadable.
+
+    The file is memory-mapped and unpickled straight from the mapping. Only
+    load artifacts this process (or its siblings) wrote: it is a pickle.
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            payload = pickle.loads(mm)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"[signature.artifact] ignoring unreadable artifact {path}: {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get("format") != ARTIFACT_FORMAT or payload.get("digest") != digest:
+        return None
+    matcher = payload.get("matcher")
+    return matcher if isinstance(matcher, SignatureMatcher) else None
+
+
+class MatcherSnapshot:
+    """Immutable pairing of a compiled matcher with the signature set it was built from."""
+
+    __slots__ = ("version", "matcher", "signatures", "built_at", "digest")
+
+    def __init__(self, version: int, matcher: SignatureMatcher, signatures: List[Dict[str, Any]], built_at: float,
+                 digest: Optional[str] = None):
+        self.version = version
+        self.matcher = matcher
+        self.signatures = signatures
+        self.built_at = built_at
+        self.digest = digest
+
+
+class MatcherRegistry:
+    """Long-lived holder of the active SignatureMatcher.
+
+    Readers call ``current()`` and get the last published snapshot without taking
+    a lock (rebinding one attribute is atomic). Writers build the new matcher
+    outside the lock and only serialize the swap, so a reload never stalls
+    in-flight matches. ``max_age`` (seconds) lets ``refresh_if_stale`` pick up
+    edits made by other worker processes.
+
+    With ``artifact_dir`` set, compiled matchers are cached on disk under the
+    digest of their signature set, so restarts and sibling workers load the
+    identical automaton instead of rebuilding it.
+    """
+
+    # Older artifacts beyond this many are removed after each save
+    KEEP_ARTIFACTS = 5
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], max_age: Optional[float] = None,
+                 artifact_dir: Optional[str] = None):
+        self._loader = loader
+        self._max_age = max_age
+        self._artifact_dir = artifact_dir
+        self._swap_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_attempt = 0.0
+        self._snapshot = MatcherSnapshot(0, SignatureMatcher([]), [], time.monotonic())
+
+    def current(self) -> MatcherSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def _artifact_path(self, digest: str) -> str:
+        return os.path.join(self._artifact_dir, f"signatures-{digest}.pkl")
+
+    def _build(self, signatures: List[Dict[str, Any]], digest: str) -> SignatureMatcher:
+        if not self._artifact_dir:
+            return SignatureMatcher(signatures)
+        path = self._artifact_path(digest)
+        matcher = load_matcher_artifact(path, digest)
+        if matcher is not None:
+            return matcher
+        matcher = SignatureMatcher(signatures)
+        try:
+            save_matcher_artifact(matcher, path, digest)
+            self._prune_artifacts(keep=path)
+        except Exception as e:
+            logging.warning(f"[signature.artifact] could not write {path}: {e}")
+        return matcher
+
+    def _prune_artifacts(self, keep: str):
+        try:
+            paths = [
+                os.path.join(self._artifact_dir, name)
+                for name in os.listdir(self._artifact_dir)
+                if name.startswith("signatures-") and name.endswith(".pkl")
+            ]
+            paths.sort(key=os.path.getmtime, reverse=True)
+            for stale in paths[self.KEEP_ARTIFACTS:]:
+                if stale != keep:
+                    os.unlink(stale)
+        except OSError:
+            pass
+
+    def publish(self, signatures: List[Dict[str, Any]]) -> MatcherSnapshot:
+        """Compile (or load the cached build of) ``signatures`` and make them the active set.
+
+        An unchanged signature set keeps the current snapshot and version, so
+        periodic reloads do not flush version-keyed caches such as MatchCache.
+        """
+        digest = signatures_digest(signatures)
+        current = self._snapshot
+        if current.version and current.digest == digest:
+            return current
+        matcher = self._build(signatures, digest)
+        with self._swap_lock:
+            if self._snapshot.version and self._snapshot.digest == digest:
+                return self._snapshot
+            snapshot = MatcherSnapshot(self._snapshot.version + 1, matcher, signatures, time.monotonic(), digest)
+            self._snapshot = snapshot
+        return snapshot
+
+    def is_stale(self) -> bool:
+        """True once the snapshot (or the last reload attempt) is older than ``max_age``."""
+        if self._max_age is None:
+            return False
+        return time.monotonic() - max(self._snapshot.built_at, self._last_attempt) >= self._max_age
+
+    def reload(self) -> MatcherSnapshot:
+        """Re-read signatures through the loader and publish them."""
+        self._last_attempt = time.monotonic()
+        return self.publish(self._loader())
+
+    def refresh_if_stale(self) -> MatcherSnapshot:
+        """Return the current snapshot, reloading first if it is older than ``max_age``.
+
+        Only one caller performs the reload; concurrent callers keep serving the
+        existing snapshot. Loader failures are logged and the old snapshot stays live.
+        """
+        snapshot = self._snapshot
+        if not self.is_stale():
+            return snapshot
+        if not self._refresh_lock.acquire(blocking=False):
+            return snapshot
+        try:
+            return self.reload()
+        except Exception as e:
+            logging.warning(f"[signature.registry] refresh failed, keeping v{snapshot.version}: {e}")
+            return snapshot
+        finally:
+            self._refresh_lock.release()
+
+
+class MatchCache:
+    """Bounded LRU of match results keyed on ``(matcher version, command)``.
+
+    Simulation traffic repeats the same handful of commands across lobbies, so
+    most lookups are served without touching the automaton. Commands are keyed
+    verbatim: hit offsets refer to the exact string, so trimming or collapsing
+    whitespace would return wrong ``start``/``end`` values. When a lookup sees
+    a newer matcher version, entries from the old version are dropped.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, Tuple[SignatureHit, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def match_hits(self, snapshot: MatcherSnapshot, command: str) -> Tuple[SignatureHit, ...]:
+        if self.maxsize <= 0:
+            return tuple(snapshot.matcher.match_hits(command))
+        key = (snapshot.version, command)
+        with self._lock:
+            if self._version is None or snapshot.version > self._version:
+                if self._entries:
+                    self._entries.clear()
+                    self.invalidations += 1
+                self._version = snapshot.version
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        result = tuple(snapshot.matcher.match_hits(command))
+        with self._lock:
+            # A caller still holding an older snapshot must not repopulate the cache
+            if snapshot.version == self._version:
+                self._entries[key] = result
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self._version,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
 # Example usage:
 # signatures = [
 #     {"pattern": "nmap", "id": "nmap_scan", "description": "Nmap scan detected"},
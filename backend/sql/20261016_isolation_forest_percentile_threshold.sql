@@ -0,0 +1,15 @@
+-- Migration: percentile ANOMALY threshold for quantile-scaled Isolation Forest models.
+-- `threshold` stays the cut-off for legacy min/max scaled models. `percentile_threshold`
+-- (0-1) flags commands more anomalous than that share of the training data; NULL means
+-- 1 - contamination. Skipped when isolation_forest_config has not been created.
+
+SET @db := DATABASE();
+
+SELECT COUNT(*) INTO @has_table FROM information_schema.tables
+  WHERE table_schema=@db AND table_name='isolation_forest_config';
+SELECT COUNT(*) INTO @exists FROM information_schema.columns
+  WHERE table_schema=@db AND table_name='isolation_forest_config' AND column_name='percentile_threshold';
+SET @sql := IF(@has_table=1 AND @exists=0,
+  'ALTER TABLE isolation_forest_config ADD COLUMN percentile_threshold DECIMAL(4,3) NULL AFTER threshold',
+  'SELECT 1');
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
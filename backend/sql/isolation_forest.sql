@@ -10,6 +10,8 @@ CREATE TABLE IF NOT EXISTS isolation_forest_config (
     contamination DECIMAL(3,2) DEFAULT 0.10,
     sample_size INT DEFAULT 256,
     threshold DECIMAL(3,2) DEFAULT 0.60,
+    -- Quantile-scaled models: flag commands above this percentile of the training data (NULL = 1 - contamination)
+    percentile_threshold DECIMAL(4,3) NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE
@@ -10,6 +10,7 @@ from auth import rbac_required
 
 # DB/config and stdlib imports
 from config import MYSQL_CONFIG, get_db_connection, DEV_MODE
+from db_schema import schema_once, table_columns
 import os
 import uuid
 
@@ -23,6 +24,7 @@ def _audit_log(payload, action, ctx):
     except Exception:
         pass
 
+@schema_once
 def ensure_notifications_table(cursor):
     """Create notifications table if it doesn't exist yet. Mirrors instructor_api schema."""
     cursor.execute(
@@ -53,6 +55,7 @@ def _get_student_name_by_id(cursor, student_id: int) -> str:
         pass
     return f"Student {student_id}"
 
+@schema_once
 def ensure_base_progress_tables(cursor):
         """Create core progress tables if they don't exist yet.
         Safe to call on every request path that touches student progress.
@@ -107,10 +110,13 @@ def ensure_base_progress_tables(cursor):
                         '''
                 )
                 # unit events table (newer schema variant used by runtime)
-                ensure_unit_events_table(cursor)
+                if ensure_unit_events_table(cursor) is False:
+                        return False
         except Exception as e:
                 print(f"[WARN] ensure_base_progress_tables failed (will continue): {e}")
+                return False
 
+@schema_once
 def ensure_users_table_and_migrate_password_hash(cursor):
     """Ensure users table exists and password_hash column can hold long hashes (TEXT).
     On older schemas, this may have been VARCHAR(255); upgrade it in-place if needed.
@@ -139,8 +145,10 @@ def ensure_users_table_and_migrate_password_hash(cursor):
                 cursor.execute('ALTER TABLE users MODIFY COLUMN password_hash TEXT NOT NULL')
     except Exception as e:
         print(f"[WARN] users.password_hash migrate failed or unnecessary: {e}")
+        return False
 
 
+@schema_once
 def ensure_student_profiles_table(cursor):
     """Ensure student_profiles exists to store join_date and avatar_url per student."""
     cursor.execute(
@@ -156,6 +164,7 @@ def ensure_student_profiles_table(cursor):
     )
 
 
+@schema_once
 def ensure_student_settings_table(cursor):
     """Ensure student_settings exists; stores notifications as JSON text for portability."""
     cursor.execute(
@@ -428,6 +437,7 @@ def list_all_rooms_for_student(request: Request):
         cursor.close(); conn.close()
 
 
+@schema_once
 def ensure_simulation_tables(cursor):
     """Ensure simulation room tables exist (kept local to student_api for safety)."""
     cursor.execute(
@@ -1290,6 +1300,59 @@ def student_login(req: StudentLoginRequest):
         # Return a JSON-formatted 500 error to the client
         raise HTTPException(status_code=500, detail='Internal server error during login')
 
+@schema_once
+def ensure_assignments_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assignments (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            instructor_id INT NOT NULL,
+            student_id INT NOT NULL,
+            module_name VARCHAR(255) NOT NULL,
+            module_slug VARCHAR(255) NULL,
+            due_date DATETIME NULL,
+            status ENUM('assigned','in-progress','completed','overdue') DEFAULT 'assigned',
+            notes TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    ''')
+
+@schema_once
+def ensure_feedback_table(cursor):
+    """Create the feedback table and add any columns missing on legacy installs."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            instructor_id INT NULL,
+            student_id INT NULL,
+            submission_id INT NULL,
+            assignment_id INT NULL,
+            message TEXT NULL,
+            created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    ''')
+    ok = True
+    try:
+        existing = table_columns(cursor, 'feedback')
+        required_defs = [
+            ('instructor_id', 'INT NULL'),
+            ('student_id', 'INT NULL'),
+            ('submission_id', 'INT NULL'),
+            ('assignment_id', 'INT NULL'),
+            ('message', 'TEXT NULL'),
+            ('created_at', 'TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP')
+        ]
+        for col, sql_type in required_defs:
+            if col not in existing:
+                try:
+                    cursor.execute(f"ALTER TABLE feedback ADD COLUMN {col} {sql_type}")
+                except Exception as ae:
+                    print(f"[WARN] Could not add missing column {col} to feedback: {ae}")
+                    ok = False
+    except Exception as se:
+        print(f"[WARN] Could not verify/alter feedback schema (student_api): {se}")
+        ok = False
+    return ok
+
 @router.get('/student/assignments')
 def get_student_assignments(request: Request, student_id: int):
     """List assignments for a specific student."""
@@ -1306,19 +1369,7 @@ def get_student_assignments(request: Request, student_id: int):
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS assignments (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                instructor_id INT NOT NULL,
-                student_id INT NOT NULL,
-                module_name VARCHAR(255) NOT NULL,
-                module_slug VARCHAR(255) NULL,
-                due_date DATETIME NULL,
-                status ENUM('assigned','in-progress','completed','overdue') DEFAULT 'assigned',
-                notes TEXT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        ''')
+        ensure_assignments_table(cursor)
         cursor.execute(
             '''
             SELECT id, instructor_id as instructorId, student_id as studentId, module_name as moduleName,
@@ -1407,43 +1458,7 @@ def get_student_feedback(request: Request, student_id: int):
     cursor = conn.cursor(dictionary=True)
     try:
         # Ensure feedback table and columns exist (auto-migrate if legacy)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                instructor_id INT NULL,
-                student_id INT NULL,
-                submission_id INT NULL,
-                assignment_id INT NULL,
-                message TEXT NULL,
-                created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        ''')
-        try:
-            cursor.execute(
-                """
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_schema=%s AND table_name='feedback'
-                """,
-                (MYSQL_CONFIG['database'],)
-            )
-            existing = {row[0] for row in cursor.fetchall()}
-            required_defs = [
-                ('instructor_id', 'INT NULL'),
-                ('student_id', 'INT NULL'),
-                ('submission_id', 'INT NULL'),
-                ('assignment_id', 'INT NULL'),
-                ('message', 'TEXT NULL'),
-                ('created_at', 'TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP')
-            ]
-            for col, sql_type in required_defs:
-                if col not in existing:
-                    try:
-                        cursor.execute(f"ALTER TABLE feedback ADD COLUMN {col} {sql_type}")
-                    except Exception as ae:
-                        print(f"[WARN] Could not add missing column {col} to feedback: {ae}")
-        except Exception as se:
-            print(f"[WARN] Could not verify/alter feedback schema (student_api): {se}")
+        ensure_feedback_table(cursor)
         cursor.execute(
             'SELECT id, instructor_id as instructorId, message, submission_id as submissionId, assignment_id as assignmentId, created_at as createdAt FROM feedback WHERE student_id=%s ORDER BY created_at DESC',
             (student_id,)
@@ -1698,6 +1713,7 @@ def _debug_log_unit_events_columns(cursor):
     except Exception as e:
         print(f"[DEBUG] SHOW COLUMNS student_module_unit_events failed: {e}")
 
+@schema_once
 def _ensure_unit_event_columns(cursor):
     """Ensure student_module_unit_events has all required columns.
 
@@ -1709,6 +1725,7 @@ def _ensure_unit_event_columns(cursor):
       - duration_seconds INT DEFAULT 0
       - created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     """
+    ok = True
     try:
         cursor.execute(
             """
@@ -1735,6 +1752,7 @@ def _ensure_unit_event_columns(cursor):
                 cursor.execute(f"ALTER TABLE student_module_unit_events ADD COLUMN {col} {typ}")
             except Exception as e:
                 print(f"[WARN] Could not add column {col} to student_module_unit_events: {e}")
+                ok = False
         # Relax legacy columns to be nullable so inserts that omit them won't fail
         try:
             if 'module_slug' in cols:
@@ -1762,6 +1780,8 @@ def _ensure_unit_event_columns(cursor):
             pass
     except Exception as e:
         print(f"[WARN] _ensure_unit_event_columns failed: {e}")
+        return False
+    return ok
 
 def _migrate_unit_events_legacy(cursor):
     """Rebuild student_module_unit_events to the expected schema when legacy structure is detected.
@@ -1846,6 +1866,7 @@ def _migrate_unit_events_legacy(cursor):
     except Exception as e:
         print(f"[WARN] _migrate_unit_events_legacy failed: {e}")
 
+@schema_once
 def ensure_unit_events_table(cursor):
     """Create student_module_unit_events table if it does not exist (runtime safety)."""
     try:
@@ -1866,16 +1887,20 @@ def ensure_unit_events_table(cursor):
             '''
         )
         # Also ensure any missing columns on existing legacy tables
-        _ensure_unit_event_columns(cursor)
+        if _ensure_unit_event_columns(cursor) is False:
+            return False
         # If legacy structure persists (missing core cols), rebuild table and copy forward
         _migrate_unit_events_legacy(cursor)
     except Exception as e:
         print(f"[WARN] ensure_unit_events_table failed: {e}")
+        return False
 
+@schema_once
 def _ensure_student_progress_unit_columns(cursor):
     """Idempotently add new unit columns if they do not yet exist (for runtime safety).
     Compatible with both tuple and dict cursors and with MySQL versions that may not support IF NOT EXISTS.
     """
+    ok = True
     try:
         cursor.execute(
             """
@@ -1911,14 +1936,19 @@ def _ensure_student_progress_unit_columns(cursor):
                     cursor.execute(f"ALTER TABLE student_progress ADD COLUMN {col} {sqltype}")
                 except Exception as e2:
                     print(f"[WARN] Could not add column {col} to student_progress: {e2}")
+                    ok = False
         # No explicit commit; caller controls transaction.
     except Exception as e:
         # When called with a dict cursor, a KeyError(0) previously surfaced as '0'; fix by handling above.
         print(f"[WARN] _ensure_student_progress_unit_columns failed: {e}")
+        return False
+    return ok
 
+@schema_once
 def _ensure_student_progress_unique_index(cursor):
     """Ensure (student_id, module_name) is unique. Merge duplicates before adding index.
     Safe to call on every summary request (cheap once index present)."""
+    ok = True
     try:
         cursor.execute("SHOW INDEX FROM student_progress WHERE Key_name='uniq_student_module'")
         if cursor.fetchone():
@@ -1977,13 +2007,17 @@ def _ensure_student_progress_unique_index(cursor):
                     cursor.execute('DELETE FROM student_progress WHERE id=%s', (r[0],))
             except Exception as de:
                 print(f"[WARN] duplicate merge failed for ({student_id},{module_name}): {de}")
+                ok = False
         # Add index last
         try:
             cursor.execute('ALTER TABLE student_progress ADD UNIQUE KEY uniq_student_module (student_id, module_name)')
         except Exception as ie:
             print(f"[WARN] add unique index failed (may already exist): {ie}")
+            ok = False
     except Exception as e:
         print(f"[WARN] _ensure_student_progress_unique_index error: {e}")
+        return False
+    return ok
 
 def _upsert_progress_row(cursor, student_id: int, module_name: str):
     """Ensure a row exists for (student,module) so we can update unit columns safely."""
@@ -2258,6 +2292,7 @@ class SimulationCompletedRequest(BaseModel):
     score: Optional[int] = None
     lobby_code: Optional[str] = None
 
+@schema_once
 def ensure_simulation_sessions_table(cursor):
     """Ensure a simple table exists to record per-student simulation completions and scores."""
     cursor.execute(
@@ -2337,8 +2372,7 @@ def get_student_modules_summary(student_id: int, seed: bool = True, cleanup: boo
         _ensure_student_progress_unique_index(cursor)
         # Defensive: ensure student_progress table exists (in case migration not applied)
         try:
-            cursor.execute("SHOW TABLES LIKE 'student_progress'")
-            if not cursor.fetchone():
+            if not table_columns(cursor, 'student_progress'):
                 print('[WARN] student_progress table missing; returning empty summary list')
                 return []
         except Exception as te:
@@ -2580,11 +2614,7 @@ def debug_student_modules_raw(student_id: int):
         # Determine available optional timestamp columns (created_at / updated_at) safely.
         optional_cols = []
         try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema=%s AND table_name='student_progress' AND column_name IN ('created_at','updated_at')
-            """, (MYSQL_CONFIG['database'],))
-            found = {r['column_name'] if isinstance(r, dict) else r[0] for r in cursor.fetchall() or []}
+            found = table_columns(cursor, 'student_progress')
             if 'created_at' in found: optional_cols.append('created_at')
             if 'updated_at' in found: optional_cols.append('updated_at')
         except Exception as _:
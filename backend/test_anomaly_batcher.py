@@ -0,0 +1,37 @@
+import asyncio
+
+from anomaly_batcher import ScoreBatcher
+
+
+def test_concurrent_requests_are_coalesced():
+    calls = []
+
+    def score_many(commands):
+        calls.append(list(commands))
+        return [c.upper() for c in commands]
+
+    batcher = ScoreBatcher(score_many, max_batch_size=4, max_latency_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.score(f"cmd{i}") for i in range(10)))
+
+    results = asyncio.run(run())
+    assert results == [f"CMD{i}" for i in range(10)]
+    assert [len(c) for c in calls] == [4, 4, 2]
+    stats = batcher.stats()
+    assert stats["batches"] == 3 and stats["items"] == 10 and stats["max_batch_seen"] == 4
+    assert stats["batch_size_histogram"]["<=4"] == 2 and stats["batch_size_histogram"]["<=2"] == 1
+
+
+def test_batch_failure_reaches_every_waiter():
+    def score_many(commands):
+        raise ValueError("model unavailable")
+
+    batcher = ScoreBatcher(score_many, max_batch_size=8, max_latency_ms=1)
+
+    async def run():
+        return await asyncio.gather(batcher.score("a"), batcher.score("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.stats()["failed_batches"] == 1
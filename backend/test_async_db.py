@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import threading
+
+from fastapi.testclient import TestClient
+
+import async_db
+import lobby_ws
+import main
+from async_db import run_db
+
+client = TestClient(main.app)
+
+
+def test_run_db_runs_on_pool_thread_and_records_stats():
+    def work(a, b):
+        return a + b, threading.current_thread().name
+
+    total, thread = asyncio.run(run_db(work, 2, 3, label="test.work"))
+    assert total == 5
+    assert thread.startswith("db")
+    assert async_db.query_stats()["queries"]["test.work"]["calls"] >= 1
+
+
+def test_run_db_label_does_not_collide_with_bound_keywords():
+    def update(name, **fields):
+        return name, fields
+
+    result = asyncio.run(run_db(functools.partial(update, "m", label="x", n=1), label="test.update"))
+    assert result == ("m", {"label": "x", "n": 1})
+
+
+def test_run_db_counts_errors():
+    def boom():
+        raise ValueError("nope")
+
+    before = async_db.query_stats()["queries"].get("test.boom", {}).get("errors", 0)
+    try:
+        asyncio.run(run_db(boom, label="test.boom"))
+    except ValueError:
+        pass
+    assert async_db.query_stats()["queries"]["test.boom"]["errors"] == before + 1
+
+
+def test_update_config_payload_may_contain_label(monkeypatch):
+    seen = {}
+
+    def update_model_config(model_name, **kwargs):
+        seen.update(kwargs, model_name=model_name)
+        return True
+
+    monkeypatch.setattr(main.isolation_forest_db, "update_model_config", update_model_config)
+    r = client.put("/api/isolation-forest/config/default", json={"label": "prod", "contamination": 0.1})
+    assert r.status_code == 200
+    assert seen == {"model_name": "default", "label": "prod", "contamination": 0.1}
+
+
+def test_create_lobby_updates_state_on_loop_and_persists_off_it(monkeypatch):
+    writes = []
+    monkeypatch.setattr(lobby_ws, "require_role", lambda request, role: {"sub": "7"})
+    monkeypatch.setattr(
+        lobby_ws, "_persist_lobby",
+        lambda code, created_by: writes.append((code, created_by, threading.current_thread().name)),
+    )
+    lobby_ws.lobbies.pop("T3ST", None)
+    try:
+        r = client.post("/api/create_lobby/T3ST")
+        assert r.status_code == 200
+        assert lobby_ws.lobbies["T3ST"]["created_by"] == 7
+        assert len(writes) == 1 and writes[0][:2] == ("T3ST", 7)
+        assert writes[0][2].startswith("db")
+    finally:
+        lobby_ws.lobbies.pop("T3ST", None)
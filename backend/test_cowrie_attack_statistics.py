@@ -0,0 +1,88 @@
+from cowrie_integration.attack_statistics import AttackStatistics
+from cowrie_integration.log_parser import CowrieLogParser
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _event(i, command, ip="10.0.0.1"):
+    return {
+        "eventid": "cowrie.command.input",
+        "timestamp": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}",
+        "src_ip": ip,
+        "input": command,
+    }
+
+
+def test_counters_match_full_recount():
+    parser = CowrieLogParser()
+    raw = [
+        _event(0, "wget http://x"),
+        _event(1, "ls", ip="10.0.0.2"),
+        _event(2, "echo hi"),
+        {"eventid": "cowrie.login.failed", "timestamp": "2025-01-01T00:00:03", "src_ip": "10.0.0.3"},
+    ]
+    stats = AttackStatistics(clock=FakeClock())
+    for ev in raw:
+        stats.record(parser.parse_event(ev))
+    expected = parser.get_attack_statistics(raw)
+    got = stats.snapshot()
+    for key in ("total_events", "by_severity", "by_type", "by_source_ip", "recent_attacks"):
+        assert got[key] == expected[key], key
+
+    # Above the source IP limit only the busiest addresses are reported
+    limited = AttackStatistics(clock=FakeClock(), max_source_ips=2)
+    for ev in raw:
+        limited.record(parser.parse_event(ev))
+    assert limited.snapshot()["by_source_ip"] == {"10.0.0.1": 2, "10.0.0.2": 1}
+
+
+def test_source_ip_counter_stays_bounded():
+    parser = CowrieLogParser()
+    stats = AttackStatistics(clock=FakeClock(), max_source_ips=10)
+    heavy = ["198.51.100.1", "198.51.100.2"]
+    for i in range(5000):
+        # A scan from ever-new addresses, interleaved with two persistent attackers
+        stats.record(parser.parse_event(_event(i % 3600, "ls", ip=f"10.{i // 65536}.{i // 256 % 256}.{i % 256}")))
+        stats.record(parser.parse_event(_event(i % 3600, "ls", ip=heavy[i % 2])))
+        assert len(stats._by_source_ip) <= 20
+    top = stats.snapshot()["by_source_ip"]
+    assert len(top) == 10
+    assert top["198.51.100.1"] == top["198.51.100.2"] == 2500
+    assert list(top)[:2] == heavy
+    assert stats.source_ips_pruned >= 5000 - 20
+
+
+def test_recent_attacks_keep_newest_k_by_timestamp():
+    parser = CowrieLogParser()
+    stats = AttackStatistics(recent_attacks=2, clock=FakeClock())
+    for i in (5, 1, 9, 3):
+        stats.record(parser.parse_event(_event(i, "curl http://x")))
+    stats.record(parser.parse_event(_event(20, "echo low")))
+    assert [e["timestamp"] for e in stats.recent_attacks()] == ["2025-01-01T00:00:09", "2025-01-01T00:00:05"]
+
+
+def test_windows_expire_old_buckets():
+    parser = CowrieLogParser()
+    clock = FakeClock()
+    stats = AttackStatistics(clock=clock)
+    stats.record(parser.parse_event(_event(0, "wget http://x")))
+    clock.now += 10 * 60
+    stats.record(parser.parse_event(_event(1, "echo hi")))
+    windows = stats.snapshot()["windows"]
+    assert windows["5m"]["total_events"] == 1
+    assert windows["5m"]["by_severity"] == {"high": 0, "medium": 0, "low": 1}
+    assert windows["1h"]["total_events"] == 2
+    clock.now += 2 * 3600
+    windows = stats.snapshot()["windows"]
+    assert windows["1h"]["total_events"] == 0
+    assert windows["24h"]["total_events"] == 2
+    assert windows["24h"]["by_type"] == {"cowrie.command.input": 2}
+    clock.now += 24 * 3600
+    assert stats.snapshot()["windows"]["24h"]["by_type"] == {}
+    assert stats.snapshot()["total_events"] == 2
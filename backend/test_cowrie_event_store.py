@@ -0,0 +1,60 @@
+import os
+
+from cowrie_integration.event_store import EventStore
+
+
+def _command(i, command="ls"):
+    return {
+        "eventid": "cowrie.command.input",
+        "timestamp": f"2025-01-01T00:00:{i:02d}",
+        "src_ip": "10.0.0.1",
+        "session": "s1",
+        "input": command,
+    }
+
+
+def test_ring_buffer_keeps_newest_events():
+    store = EventStore(capacity=3, spill_path="")
+    for i in range(5):
+        store.append(_command(i, "echo hi"))
+    assert len(store) == 3
+    assert store.total == 5
+    assert store.evicted == 2
+    assert [e["timestamp"] for e in store.recent(10)] == [
+        "2025-01-01T00:00:04",
+        "2025-01-01T00:00:03",
+        "2025-01-01T00:00:02",
+    ]
+    assert store.last_event["timestamp"] == "2025-01-01T00:00:04"
+
+
+def test_recent_attacks_only_returns_medium_and_high():
+    store = EventStore(capacity=10, spill_path="")
+    store.append(_command(0, "wget http://x"))   # high
+    store.append(_command(1, "echo hi"))         # low
+    store.append(_command(2, "cat /etc/passwd"))  # medium
+    attacks = store.recent_attacks(5)
+    assert [e["severity"] for e in attacks] == ["medium", "high"]
+    assert store.recent_attacks(1)[0]["timestamp"] == "2025-01-01T00:00:02"
+
+
+def test_evicted_events_spill_to_segment_file(tmp_path):
+    path = str(tmp_path / "spill" / "events.jsonl")
+    store = EventStore(capacity=2, spill_path=path, spill_max_bytes=0)
+    for i in range(5):
+        store.append(_command(i, "echo hi"))
+    spilled = list(store.spill.read())
+    assert [e["timestamp"] for e in spilled] == [f"2025-01-01T00:00:0{i}" for i in range(3)]
+    assert store.stats()["spilled"] == 3
+
+
+def test_spill_keeps_a_bounded_number_of_rotated_segments(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    store = EventStore(capacity=1, spill_path=path, spill_max_bytes=1, spill_segments=2)
+    for i in range(5):
+        store.append(_command(i, "echo hi"))
+    # Each evicted event fills a segment: 00 and 01 were rotated out of the last two kept
+    assert store.spill.rotations == 4
+    assert store.stats()["spill_dropped_segments"] == 2
+    assert sorted(os.listdir(tmp_path)) == ["events.jsonl", "events.jsonl.1", "events.jsonl.2"]
+    assert [e["timestamp"] for e in store.spill.read()] == ["2025-01-01T00:00:02", "2025-01-01T00:00:03"]
@@ -0,0 +1,120 @@
+import gc
+import threading
+
+import pytest
+from mysql.connector import errors
+
+from db_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+        self.in_transaction = True
+        self.unread_result = False
+
+    def ping(self, reconnect=False):
+        if self.closed:
+            raise errors.InterfaceError("gone")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    created = []
+
+    def connect():
+        created.append(FakeConnection())
+        return created[-1]
+
+    return ConnectionPool({}, connect=connect, **kwargs), created
+
+
+def test_close_returns_connection_for_reuse():
+    pool, created = _pool(size=2, max_overflow=0)
+    conn = pool.connect()
+    conn.close()
+    conn.close()  # idempotent
+    again = pool.connect()
+    assert len(created) == 1 and again._conn is created[0]
+    assert created[0].rollbacks == 1 and not created[0].closed
+    again.close()
+    stats = pool.stats()
+    assert stats["checkouts"] == 2 and stats["created"] == 1 and stats["idle"] == 1
+
+
+def test_overflow_connections_are_closed_and_waiters_time_out():
+    pool, created = _pool(size=1, max_overflow=1, timeout=0.05)
+    a, b = pool.connect(), pool.connect()
+    with pytest.raises(errors.PoolError):
+        pool.connect()
+    a.close()
+    b.close()
+    assert sum(c.closed for c in created) == 1
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, created = _pool(size=1, max_overflow=0, timeout=2)
+    held = pool.connect()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.connect()))
+    t.start()
+    held.close()
+    t.join(2)
+    assert got and got[0]._conn is created[0]
+    assert pool.stats()["waits"] == 1
+
+
+def test_dead_and_stale_connections_are_replaced():
+    pool, created = _pool(size=2, max_overflow=0, pre_ping=0, recycle=0)
+    conn = pool.connect()
+    created[0].closed = True  # server dropped it while idle
+    conn.close()
+    fresh = pool.connect()
+    assert fresh._conn is created[1]
+    assert pool.stats()["ping_failures"] == 1
+
+
+def test_unreleased_connection_in_a_cycle_is_reclaimed_without_deadlock():
+    pool, created = _pool(size=1, max_overflow=0, timeout=2)
+
+    def drop_in_cycle_while_pool_locked():
+        with pool._cond:
+            holder = {"conn": checked_out.pop()}
+            holder["self"] = holder  # only the cyclic collector can free it
+            del holder
+            gc.collect()  # runs PooledConnection.__del__ on this thread, inside the lock
+
+    checked_out = [pool.connect()]
+    gc.disable()
+    try:
+        worker = threading.Thread(target=drop_in_cycle_while_pool_locked, daemon=True)
+        worker.start()
+        worker.join(5)
+        assert not worker.is_alive(), "finalizer deadlocked on the pool lock"
+    finally:
+        gc.enable()
+
+    # The slot comes back on the next checkout; the abandoned connection is closed, not reused
+    again = pool.connect()
+    assert again._conn is created[1] and created[0].closed
+    again.close()
+    assert pool.stats()["abandoned"] == 1 and pool.stats()["checked_out"] == 0
+
+
+def test_waiter_picks_up_slot_of_abandoned_connection():
+    pool, created = _pool(size=1, max_overflow=0, timeout=5)
+    held = [pool.connect()]
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.connect()))
+    t.start()
+    held.pop().__del__()  # what the garbage collector does, without notifying the waiter
+    t.join(3)
+    assert got and got[0]._conn is created[1]
+    assert pool.stats()["abandoned"] == 1
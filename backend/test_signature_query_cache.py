@@ -0,0 +1,103 @@
+import db_schema
+import main
+
+LEGACY_COLUMNS = ["id", "pattern", "rule_name", "category"]
+CURRENT_COLUMNS = ["id", "pattern", "description", "type", "regex", "created_at"]
+
+
+class SignaturesCursor:
+    """Answers the statements load_signatures_from_db issues against a signatures table."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.executed = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(" ".join(sql.split()))
+        if "information_schema.columns" in sql:
+            self._rows = [{"name": c} for c in self.columns]
+        elif sql.startswith("SHOW COLUMNS"):
+            self._rows = [(c, "text" if c == "pattern" else "varchar(255)") for c in self.columns]
+        elif sql.startswith("SELECT COUNT(*)"):
+            self._rows = [(1,)]
+        elif sql.startswith("SELECT id, pattern"):
+            self._rows = [{"id": 1, "pattern": "nmap", "description": "scan", "type": "Recon", "regex": 0}]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+    def count(self, prefix):
+        return sum(1 for sql in self.executed if sql.startswith(prefix))
+
+
+class SignaturesConn:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_select_is_rebuilt_only_after_invalidation():
+    main.invalidate_signature_query_cache()
+    cursor = SignaturesCursor(LEGACY_COLUMNS)
+    query = main._signature_select_query(cursor)
+    assert "COALESCE(rule_name, '') AS description" in query
+    assert "COALESCE(category, 'generic') AS type" in query
+    assert "0 AS regex" in query
+    assert main._signature_select_query(cursor) is query
+    assert cursor.count("SELECT column_name") == 1
+
+    # The table gains the current columns; the cached SELECT is kept until invalidated
+    cursor.columns = CURRENT_COLUMNS
+    assert main._signature_select_query(cursor) is query
+    main.invalidate_signature_query_cache()
+    query = main._signature_select_query(cursor)
+    assert "COALESCE(description, '') AS description" in query
+    assert "COALESCE(type, 'generic') AS type" in query
+    assert "COALESCE(regex, 0) AS regex" in query
+    assert cursor.count("SELECT column_name") == 2
+    main.invalidate_signature_query_cache()
+
+
+def test_steady_state_load_is_a_single_select(monkeypatch):
+    cursor = SignaturesCursor(CURRENT_COLUMNS)
+    monkeypatch.setattr(main, "get_db_connection", lambda: SignaturesConn(cursor))
+    main.invalidate_signature_query_cache()
+    main._ensure_signatures_schema.reset()
+    try:
+        main.load_signatures_from_db()
+        assert cursor.count("CREATE TABLE IF NOT EXISTS signatures") == 1
+        assert cursor.count("SELECT column_name") == 1
+
+        cursor.executed.clear()
+        sigs = main.load_signatures_from_db()
+        assert [s["pattern"] for s in sigs][:1] == ["nmap"] and sigs[0]["regex"] is False
+        assert cursor.executed == [main._SIGNATURE_QUERY_CACHE["query"]]
+
+        # A signature write re-runs the seed check and re-reads the columns once
+        main.invalidate_signature_query_cache()
+        cursor.executed.clear()
+        main.load_signatures_from_db()
+        assert cursor.count("SELECT COUNT(*) FROM signatures") == 1
+        assert cursor.count("CREATE TABLE IF NOT EXISTS signatures") == 0
+        assert cursor.count("SELECT column_name") == 1
+    finally:
+        main.invalidate_signature_query_cache()
+        main._ensure_signatures_schema.reset()
+        db_schema.invalidate_columns()